@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 import cv2
 import threading
 import time
+from src.output_sink import DirectorySink
 
 # Define input and output directories
 input_directory = './import/'
@@ -15,6 +16,10 @@ output_directory = './export/'
 if not os.path.exists(output_directory):
     os.makedirs(output_directory)
 
+# Outputs are written to temp files and renamed into place once they're flushed to disk,
+# in batches, and inputs are only removed after that
+sink = DirectorySink(output_directory)
+
 # List all files in the input directory
 file_list = os.listdir(input_directory)
 
@@ -22,10 +27,8 @@ def process_image(file_name):
     try:
         # Check if the file is an image
         if file_name.lower().endswith(('.png', '.jpg', '.jpeg')):
-            # Create a folder for the image in the output directory
-            image_folder = os.path.join(output_directory, os.path.splitext(file_name)[0])
-            if not os.path.exists(image_folder):
-                os.makedirs(image_folder)
+            # Outputs go in a folder for the image in the output directory
+            image_folder = os.path.splitext(file_name)[0]
 
             # Load the image
             input_image_path = os.path.join(input_directory, file_name)
@@ -34,7 +37,7 @@ def process_image(file_name):
 
             # Save the imported image in the image folder
             imported_image_output_path = os.path.join(image_folder, f'{os.path.splitext(file_name)[0]}_imported.png')
-            image.save(imported_image_output_path)
+            sink.save_image(imported_image_output_path, image)
 
             # Convert to grayscale
             gray_image = cv2.cvtColor(image_np, cv2.COLOR_RGBA2GRAY)
@@ -64,11 +67,11 @@ def process_image(file_name):
             bump_map_output_path = os.path.join(image_folder, f'{os.path.splitext(file_name)[0]}_bump_map_{uuid.uuid4()}.png')
 
             # Save the normal map and bump map in the image folder
-            Image.fromarray(normal_map).save(normal_map_output_path)
-            Image.fromarray(bump_map).save(bump_map_output_path)
+            sink.save_image(normal_map_output_path, Image.fromarray(normal_map))
+            sink.save_image(bump_map_output_path, Image.fromarray(bump_map))
 
-            # Remove the imported image from the input directory
-            os.remove(input_image_path)
+            # Remove the imported image from the input directory, but only once its outputs are safely on disk
+            sink.on_durable(lambda: os.remove(input_image_path))
 
             print(f"Processed {input_image_path}")
 
@@ -86,6 +89,9 @@ for file_name in file_list:
 for thread in threads:
     thread.join()
 
+# Flush the outputs, which also removes the inputs they came from
+sink.commit()
+
 print("Processing completed.")
 
 # Continuously watch the import directory for new images and process them as soon as they are added
@@ -102,4 +108,7 @@ while True:
             thread = threading.Thread(target=process_image, args=(file_name,))
             thread.start()
 
+    # Flush outputs that have been waiting a while, even if no more files arrive
+    sink.commit_if_due()
+
     time.sleep(1)  # Adjust the sleep interval as needed
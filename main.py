@@ -14,6 +14,10 @@ It imports the app from the src directory and runs it.
 import logging
 import sys
 import os
+import time
+
+# When our own code first got to run, in case the process start can't be read
+LAUNCHED = time.time()
 
 # Add the src directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
@@ -26,7 +30,25 @@ def main():
     """Main entry point for the application."""
     try:
         # Import the app here to avoid circular imports
-        from src.texture_processor import processor
+        from src.archive_input import ArchiveReader, is_archive
+        from src.job_queue import JobQueue
+        from src.throughput import ThroughputModel, settings_key, format_duration
+        from src.instrumentation import monitor, compute_rates
+        from src.tracer import tracer
+        from src.cancellation import CancelToken
+        from src.prewarm import Prewarmer, process_start_time
+        from src.gallery import ThumbnailCache, scan_results, visible_rows
+        
+        # OpenCV, NumPy and the processor load in the background while the window comes up
+        processor = plan_batch = format_plan = tuned_serial_threads = set_opencv_threads = None
+        
+        def load_processing():
+            nonlocal processor, plan_batch, format_plan, tuned_serial_threads, set_opencv_threads
+            from src.texture_processor import processor
+            from src.batch_planner import plan_batch, format_plan
+            from src.autotune import tuned_serial_threads, set_opencv_threads
+            
+        prewarmer = Prewarmer(load_processing, started=process_start_time() or LAUNCHED).start()
         
         # Log startup information
         logger.info(f"Texture Normaliser v0.1.7 starting up")
@@ -43,6 +65,235 @@ def main():
         ctk.set_appearance_mode(config.get("theme", "dark"))
         ctk.set_default_color_theme("blue")
         
+        # Queue order dropdown labels, and how many queued files to list
+        QUEUE_ORDER_LABELS = {
+            "Selection Order": "selection",
+            "Smallest First": "smallest_first",
+            "Largest First": "largest_first"
+        }
+        QUEUE_ORDER_NAMES = {order: label for label, order in QUEUE_ORDER_LABELS.items()}
+        QUEUE_VIEW_LIMIT = 500
+        
+        # Least time between two rebuilds of the queue list while it's changing
+        QUEUE_REFRESH_MS = 250
+        
+        # How often the window looks whether the background loading is done
+        PREWARM_POLL_MS = 50
+        
+        # Gallery layout in pixels, and how soon after a change it redraws
+        GALLERY_PADDING = 8
+        GALLERY_LABEL_HEIGHT = 18
+        GALLERY_NAME_WIDTH = 180
+        GALLERY_REDRAW_MS = 16
+        
+        def open_with_system(path):
+            """Open a file or folder with whatever the system opens it with."""
+            if sys.platform == 'win32':
+                os.startfile(path)
+            elif sys.platform == 'darwin':  # macOS
+                import subprocess
+                subprocess.Popen(['open', path])
+            else:  # Linux
+                import subprocess
+                subprocess.Popen(['xdg-open', path])
+        
+        class ResultsGallery(ctk.CTkToplevel):
+            """
+            Window showing every processed texture and its maps as thumbnails.
+            
+            # A canvas that pretends to be as tall as all the rows put together
+            # but only ever draws the ones on screen. Thumbnails come from the
+            # cache, or from its loader thread a moment later, so 20k outputs
+            # scroll like 20 do.
+            """
+            
+            def __init__(self, master, cache, export_dir):
+                """Initialize the gallery and start listing the export folder."""
+                super().__init__(master)
+                self.title("Results Gallery")
+                self.geometry("1000x700")
+                self.minsize(500, 300)
+                
+                self.cache = cache
+                self.export_dir = export_dir
+                self.textures = []
+                self.top = 0
+                self.photos = {}
+                self.redraw_scheduled = False
+                self.thumbnail_size = cache.size
+                self.row_height = cache.size + GALLERY_LABEL_HEIGHT + GALLERY_PADDING * 2
+                self.cell_width = cache.size + GALLERY_PADDING
+                dark = ctk.get_appearance_mode() == "Dark"
+                self.background = "#242424" if dark else "#ebebeb"
+                self.foreground = "#dce4ee" if dark else "#1a1a1a"
+                self.placeholder = "#3a3a3a" if dark else "#d0d0d0"
+                
+                self.toolbar = ctk.CTkFrame(self)
+                self.toolbar.pack(fill=tk.X, padx=10, pady=(10, 5))
+                
+                self.count_label = ctk.CTkLabel(self.toolbar, text="Scanning...")
+                self.count_label.pack(side=tk.LEFT, padx=10)
+                
+                self.refresh_button = ctk.CTkButton(self.toolbar, text="Refresh", width=100, command=self.refresh)
+                self.refresh_button.pack(side=tk.RIGHT, padx=10, pady=5)
+                
+                self.view_frame = ctk.CTkFrame(self)
+                self.view_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+                
+                self.scrollbar = ctk.CTkScrollbar(self.view_frame, command=self._on_scrollbar)
+                self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+                
+                self.canvas = tk.Canvas(self.view_frame, bg=self.background, highlightthickness=0)
+                self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+                self.canvas.bind("<Configure>", lambda event: self._scroll_to(self.top))
+                self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+                self.canvas.bind("<Button-4>", self._on_mouse_wheel)
+                self.canvas.bind("<Button-5>", self._on_mouse_wheel)
+                self.canvas.bind("<Double-Button-1>", self._on_double_click)
+                
+                self.protocol("WM_DELETE_WINDOW", self.close)
+                self.refresh()
+                
+            def refresh(self):
+                """List the export folder again, in the background."""
+                self.count_label.configure(text="Scanning...")
+                # Maps may have been overwritten, the disk cache notices by itself
+                self.cache.clear_memory()
+                self.photos = {}
+                
+                def scan():
+                    try:
+                        textures = scan_results(self.export_dir)
+                    except Exception as e:
+                        logger.exception(f"Error listing results: {e}")
+                        textures = []
+                    try:
+                        self.after(0, lambda: self._set_textures(textures))
+                    except (RuntimeError, tk.TclError):
+                        # Closed while scanning
+                        pass
+                        
+                import threading
+                threading.Thread(target=scan, daemon=True).start()
+                
+            def _set_textures(self, textures):
+                """Show a fresh listing."""
+                self.textures = textures
+                maps = sum(len(texture["maps"]) for texture in textures)
+                self.count_label.configure(text=f"{len(textures)} textures, {maps} maps in {self.export_dir}")
+                self._scroll_to(self.top)
+                
+            def _content_height(self):
+                """Get the height all the rows would have if they were drawn."""
+                return len(self.textures) * self.row_height
+                
+            def _scroll_to(self, top):
+                """Scroll to a pixel offset, kept within the rows."""
+                limit = max(0, self._content_height() - self.canvas.winfo_height())
+                self.top = min(max(0, int(top)), limit)
+                self._schedule_redraw()
+                
+            def _on_scrollbar(self, action, *args):
+                """Follow the scrollbar, which speaks Tk's moveto and scroll commands."""
+                if action == "moveto":
+                    self._scroll_to(float(args[0]) * self._content_height())
+                elif action == "scroll":
+                    step = self.row_height if args[1] == "units" else self.canvas.winfo_height()
+                    self._scroll_to(self.top + int(args[0]) * step)
+                    
+            def _on_mouse_wheel(self, event):
+                """Scroll half a row per wheel notch."""
+                direction = -1 if event.num == 4 or getattr(event, "delta", 0) > 0 else 1
+                self._scroll_to(self.top + direction * self.row_height // 2)
+                
+            def _on_double_click(self, event):
+                """Open the map under the pointer."""
+                row = (self.top + event.y) // self.row_height
+                column = (event.x - GALLERY_NAME_WIDTH) // self.cell_width
+                if event.x < GALLERY_NAME_WIDTH or not 0 <= row < len(self.textures):
+                    return
+                maps = self.textures[row]["maps"]
+                if column < len(maps):
+                    open_with_system(maps[column][1])
+                    
+            def _schedule_redraw(self):
+                """Redraw soon, once however many changes arrive meanwhile."""
+                if not self.redraw_scheduled:
+                    self.redraw_scheduled = True
+                    self.after(GALLERY_REDRAW_MS, self._redraw)
+                    
+            def _on_thumbnail(self, path, image):
+                """Redraw once a thumbnail arrives (called on the loader thread)."""
+                try:
+                    self.after(0, self._schedule_redraw)
+                except (RuntimeError, tk.TclError):
+                    # Closed meanwhile
+                    pass
+                    
+            def _redraw(self):
+                """
+                Draw the rows on screen and ask for the thumbnails they're missing.
+                
+                # Everything is drawn from scratch, it's only ever a few dozen
+                # canvas items. Only the rows on screen keep their PhotoImages.
+                """
+                self.redraw_scheduled = False
+                if not self.winfo_exists():
+                    return
+                    
+                width = self.canvas.winfo_width()
+                height = self.canvas.winfo_height()
+                count = len(self.textures)
+                rows = visible_rows(self.top, height, self.row_height, count)
+                on_screen = visible_rows(self.top, height, self.row_height, count, overscan=0)
+                columns = max(1, (width - GALLERY_NAME_WIDTH) // self.cell_width)
+                
+                self.canvas.delete("all")
+                photos = {}
+                wanted = []
+                # Rows on screen ask first, the ones just off it after
+                for row in sorted(rows, key=lambda row: row not in on_screen):
+                    texture = self.textures[row]
+                    y = row * self.row_height - self.top
+                    self.canvas.create_text(GALLERY_PADDING, y + self.row_height // 2, text=texture["name"], anchor="w",
+                                            width=GALLERY_NAME_WIDTH - GALLERY_PADDING * 2, fill=self.foreground)
+                    for column, (map_name, path) in enumerate(texture["maps"][:columns]):
+                        x = GALLERY_NAME_WIDTH + column * self.cell_width + self.thumbnail_size // 2
+                        middle = y + GALLERY_PADDING + self.thumbnail_size // 2
+                        photo = self.photos.get(path)
+                        if photo is None:
+                            image = self.cache.get(path)
+                            if image is not None:
+                                photo = ImageTk.PhotoImage(image)
+                        if photo is not None:
+                            photos[path] = photo
+                            self.canvas.create_image(x, middle, image=photo)
+                        else:
+                            half = self.thumbnail_size // 2
+                            self.canvas.create_rectangle(x - half, middle - half, x + half, middle + half,
+                                                         fill=self.placeholder, outline="")
+                            if self.cache.unreadable(path):
+                                self.canvas.create_text(x, middle, text="Unreadable", fill=self.foreground)
+                            else:
+                                wanted.append(path)
+                        self.canvas.create_text(x, middle + self.thumbnail_size // 2 + GALLERY_LABEL_HEIGHT // 2,
+                                                text=map_name, fill=self.foreground, width=self.thumbnail_size)
+                                                
+                self.photos = photos
+                self.cache.request(wanted, self._on_thumbnail)
+                
+                total = self._content_height()
+                if total <= height:
+                    self.scrollbar.set(0, 1)
+                else:
+                    self.scrollbar.set(self.top / total, (self.top + height) / total)
+                    
+            def close(self):
+                """Close the gallery, dropping whatever thumbnails it still wanted."""
+                self.cache.request([], None)
+                self.photos = {}
+                self.destroy()
+        
         # Create and run the app
         class TextureNormaliserApp(ctk.CTk):
             """
@@ -64,9 +315,22 @@ def main():
                 # Initialize variables
                 self.is_processing = False
                 self.processing_thread = None
-                self.file_queue = []
+                self.cancel_token = None
+                self.file_queue = JobQueue(config.get("queue_order", "selection"))
+                self.archive_readers = []
                 self.processed_count = 0
                 self.total_count = 0
+                self.processed_pixels = 0
+                self.total_pixels = 0
+                self.current_job = None
+                self.throughput_model = ThroughputModel.from_config()
+                self.dashboard_snapshot = monitor.snapshot()
+                self.thumbnail_cache = None
+                self.gallery = None
+                self.queue_refresh_scheduled = False
+                # Headers are read here, in the order files were picked, never on the Tk thread
+                from concurrent.futures import ThreadPoolExecutor
+                self.queue_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="QueueAdd")
                 
                 # Create the UI
                 self._create_ui()
@@ -77,8 +341,43 @@ def main():
                 # Initialize directories
                 self._initialize_directories()
                 
+                # Start the performance dashboard
+                self._update_dashboard()
+                
+                # Runs once the main loop has drawn the window
+                self.after(0, self._on_window_shown)
+                
                 logger.info("Application initialized")
                 
+            def _on_window_shown(self):
+                """Note when the window first showed, then wait for the background loading."""
+                logger.info(f"Window shown after {prewarmer.mark('window shown'):.2f}s")
+                self._check_prewarm()
+                
+            def _check_prewarm(self):
+                """
+                Enable processing once the background loading is done.
+                
+                # Polled from the main loop so the loading thread never has to
+                # touch Tk itself, it might finish before the window even exists.
+                """
+                if not prewarmer.ready.is_set() and prewarmer.error is None:
+                    self.after(PREWARM_POLL_MS, self._check_prewarm)
+                    return
+                    
+                if prewarmer.error is not None:
+                    self.status_label.configure(text="Status: Failed to load")
+                    messagebox.showerror("Error", f"Could not load the processing modules: {prewarmer.error}")
+                    return
+                    
+                prewarmer.mark("interactive")
+                self.process_button.configure(state="normal", text="Process")
+                self.plan_button.configure(state="normal", text="Plan Batch")
+                self.kernel_size_dropdown.configure(state="normal")
+                if not self.is_processing:
+                    self.status_label.configure(text="Status: Ready")
+                logger.info(f"Startup: {prewarmer.summary()}")
+                
             def _load_logo(self):
                 """
                 Load the application logo.
@@ -211,6 +510,70 @@ def main():
                 )
                 self.ao_roughness_checkbox.pack(anchor=tk.W, padx=10, pady=5)
                 
+                # AO quality option
+                self.ao_quality_frame = ctk.CTkFrame(self.options_frame, fg_color="transparent")
+                self.ao_quality_frame.pack(fill=tk.X, padx=10, pady=5)
+                
+                self.ao_quality_label = ctk.CTkLabel(self.ao_quality_frame, text="AO Quality:")
+                self.ao_quality_label.pack(side=tk.LEFT, padx=(0, 10))
+                
+                self.ao_quality_var = tk.StringVar(value=config.get("ao_quality", "quality").capitalize())
+                self.ao_quality_options = ["Quality", "Fast"]
+                self.ao_quality_dropdown = ctk.CTkOptionMenu(
+                    self.ao_quality_frame, 
+                    values=self.ao_quality_options,
+                    variable=self.ao_quality_var,
+                    command=self._on_ao_quality_changed
+                )
+                self.ao_quality_dropdown.pack(side=tk.LEFT)
+                
+                # Curvature option
+                self.curvature_var = tk.BooleanVar(value=config.get("enable_curvature", False))
+                self.curvature_checkbox = ctk.CTkCheckBox(
+                    self.options_frame, 
+                    text="Enable Curvature", 
+                    variable=self.curvature_var,
+                    command=self._on_curvature_changed
+                )
+                self.curvature_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+                
+                # Cavity option
+                self.cavity_var = tk.BooleanVar(value=config.get("enable_cavity", False))
+                self.cavity_checkbox = ctk.CTkCheckBox(
+                    self.options_frame, 
+                    text="Enable Cavity", 
+                    variable=self.cavity_var,
+                    command=self._on_cavity_changed
+                )
+                self.cavity_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+                
+                # Height map option
+                self.height_map_var = tk.BooleanVar(value=config.get("enable_height_map", False))
+                self.height_map_checkbox = ctk.CTkCheckBox(
+                    self.options_frame, 
+                    text="Enable Height Map", 
+                    variable=self.height_map_var,
+                    command=self._on_height_map_changed
+                )
+                self.height_map_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+                
+                # Height map edge option
+                self.height_boundary_frame = ctk.CTkFrame(self.options_frame, fg_color="transparent")
+                self.height_boundary_frame.pack(fill=tk.X, padx=10, pady=5)
+                
+                self.height_boundary_label = ctk.CTkLabel(self.height_boundary_frame, text="Height Edges:")
+                self.height_boundary_label.pack(side=tk.LEFT, padx=(0, 10))
+                
+                self.height_boundary_var = tk.StringVar(value=config.get("height_boundary", "mirror").capitalize())
+                self.height_boundary_options = ["Mirror", "Periodic"]
+                self.height_boundary_dropdown = ctk.CTkOptionMenu(
+                    self.height_boundary_frame, 
+                    values=self.height_boundary_options,
+                    variable=self.height_boundary_var,
+                    command=self._on_height_boundary_changed
+                )
+                self.height_boundary_dropdown.pack(side=tk.LEFT)
+                
                 # Kernel size option
                 self.kernel_size_frame = ctk.CTkFrame(self.options_frame, fg_color="transparent")
                 self.kernel_size_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -224,10 +587,49 @@ def main():
                     self.kernel_size_frame, 
                     values=self.kernel_size_options,
                     variable=self.kernel_size_var,
-                    command=self._on_kernel_size_changed
+                    command=self._on_kernel_size_changed,
+                    # Needs the processor, enabled with Process once it has loaded
+                    state="disabled"
                 )
                 self.kernel_size_dropdown.pack(side=tk.LEFT)
                 
+                # Kernel sweep option
+                self.kernel_sweep_var = tk.BooleanVar(value=bool(config.get("kernel_sweep", [])))
+                self.kernel_sweep_checkbox = ctk.CTkCheckBox(
+                    self.options_frame, 
+                    text="Sweep Kernel Sizes (3/5/7/9)", 
+                    variable=self.kernel_sweep_var,
+                    command=self._on_kernel_sweep_changed
+                )
+                self.kernel_sweep_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+                
+                # Low-memory option
+                self.low_memory_var = tk.BooleanVar(value=config.get("low_memory", False))
+                self.low_memory_checkbox = ctk.CTkCheckBox(
+                    self.options_frame, 
+                    text="Low Memory Mode", 
+                    variable=self.low_memory_var,
+                    command=self._on_low_memory_changed
+                )
+                self.low_memory_checkbox.pack(anchor=tk.W, padx=10, pady=5)
+                
+                # Output mode option
+                self.output_mode_frame = ctk.CTkFrame(self.options_frame, fg_color="transparent")
+                self.output_mode_frame.pack(fill=tk.X, padx=10, pady=5)
+                
+                self.output_mode_label = ctk.CTkLabel(self.output_mode_frame, text="Output Mode:")
+                self.output_mode_label.pack(side=tk.LEFT, padx=(0, 10))
+                
+                self.output_mode_var = tk.StringVar(value=config.get("output_mode", "separate").capitalize())
+                self.output_mode_options = ["Separate", "Packed"]
+                self.output_mode_dropdown = ctk.CTkOptionMenu(
+                    self.output_mode_frame, 
+                    values=self.output_mode_options,
+                    variable=self.output_mode_var,
+                    command=self._on_output_mode_changed
+                )
+                self.output_mode_dropdown.pack(side=tk.LEFT)
+                
                 # Export directory option
                 self.export_dir_frame = ctk.CTkFrame(self.options_frame)
                 self.export_dir_frame.pack(fill=tk.X, padx=10, pady=10)
@@ -293,13 +695,23 @@ def main():
                 )
                 self.select_folder_button.pack(fill=tk.X, padx=10, pady=5)
                 
+                # Both need the processing modules, they're enabled once those are loaded
                 self.process_button = ctk.CTkButton(
                     self.actions_frame, 
-                    text="Process", 
-                    command=self._start_processing
+                    text="Loading...", 
+                    command=self._start_processing,
+                    state="disabled"
                 )
                 self.process_button.pack(fill=tk.X, padx=10, pady=5)
                 
+                self.plan_button = ctk.CTkButton(
+                    self.actions_frame, 
+                    text="Loading...", 
+                    command=self._plan_queue,
+                    state="disabled"
+                )
+                self.plan_button.pack(fill=tk.X, padx=10, pady=5)
+                
                 self.stop_button = ctk.CTkButton(
                     self.actions_frame, 
                     text="Stop", 
@@ -308,6 +720,14 @@ def main():
                 )
                 self.stop_button.pack(fill=tk.X, padx=10, pady=5)
                 
+                self.pause_button = ctk.CTkButton(
+                    self.actions_frame, 
+                    text="Pause", 
+                    command=self._toggle_pause,
+                    state="disabled"
+                )
+                self.pause_button.pack(fill=tk.X, padx=10, pady=5)
+                
                 self.open_export_button = ctk.CTkButton(
                     self.actions_frame, 
                     text="Open Export Folder", 
@@ -315,6 +735,13 @@ def main():
                 )
                 self.open_export_button.pack(fill=tk.X, padx=10, pady=5)
                 
+                self.gallery_button = ctk.CTkButton(
+                    self.actions_frame, 
+                    text="Results Gallery", 
+                    command=self._open_gallery
+                )
+                self.gallery_button.pack(fill=tk.X, padx=10, pady=5)
+                
                 # Right column - Log and status
                 self.log_frame = ctk.CTkFrame(self.content_frame)
                 self.log_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0), pady=0)
@@ -325,7 +752,7 @@ def main():
                 
                 self.status_label = ctk.CTkLabel(
                     self.status_frame, 
-                    text="Status: Ready", 
+                    text="Status: Loading", 
                     font=ctk.CTkFont(size=14)
                 )
                 self.status_label.pack(side=tk.LEFT, padx=10)
@@ -340,6 +767,64 @@ def main():
                 self.progress_label = ctk.CTkLabel(self.progress_frame, text="0/0 files processed")
                 self.progress_label.pack(padx=10, pady=5)
                 
+                # Performance dashboard
+                self.dashboard_frame = ctk.CTkFrame(self.log_frame)
+                self.dashboard_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+                
+                self.dashboard_throughput_label = ctk.CTkLabel(self.dashboard_frame, text="Throughput: -", anchor="w")
+                self.dashboard_throughput_label.pack(fill=tk.X, padx=10, pady=(5, 0))
+                
+                self.dashboard_workers_label = ctk.CTkLabel(self.dashboard_frame, text="Workers: -", anchor="w")
+                self.dashboard_workers_label.pack(fill=tk.X, padx=10)
+                
+                self.dashboard_stages_label = ctk.CTkLabel(self.dashboard_frame, text="Stages: -", anchor="w", justify="left")
+                self.dashboard_stages_label.pack(fill=tk.X, padx=10, pady=(0, 5))
+                
+                # Queue area
+                self.queue_frame = ctk.CTkFrame(self.log_frame)
+                self.queue_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+                
+                self.queue_header_frame = ctk.CTkFrame(self.queue_frame, fg_color="transparent")
+                self.queue_header_frame.pack(fill=tk.X, padx=10, pady=5)
+                
+                self.queue_label = ctk.CTkLabel(
+                    self.queue_header_frame, 
+                    text="Queue", 
+                    font=ctk.CTkFont(size=16, weight="bold")
+                )
+                self.queue_label.pack(side=tk.LEFT)
+                
+                self.queue_order_var = tk.StringVar(value=QUEUE_ORDER_NAMES[self.file_queue.order])
+                self.queue_order_dropdown = ctk.CTkOptionMenu(
+                    self.queue_header_frame, 
+                    values=list(QUEUE_ORDER_LABELS),
+                    variable=self.queue_order_var,
+                    command=self._on_queue_order_changed
+                )
+                self.queue_order_dropdown.pack(side=tk.RIGHT)
+                
+                self.queue_listbox = tk.Listbox(self.queue_frame, height=6, selectmode=tk.EXTENDED)
+                self.queue_listbox.pack(fill=tk.X, padx=10, pady=(0, 5))
+                self.queue_view_entries = []
+                self.queue_view_rows = []
+                
+                self.queue_buttons_frame = ctk.CTkFrame(self.queue_frame, fg_color="transparent")
+                self.queue_buttons_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+                
+                self.pin_button = ctk.CTkButton(
+                    self.queue_buttons_frame, 
+                    text="Pin Selected", 
+                    command=self._pin_selected
+                )
+                self.pin_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(0, 5))
+                
+                self.unpin_button = ctk.CTkButton(
+                    self.queue_buttons_frame, 
+                    text="Unpin Selected", 
+                    command=lambda: self._pin_selected(False)
+                )
+                self.unpin_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(5, 0))
+                
                 # Log area
                 self.log_label = ctk.CTkLabel(
                     self.log_frame, 
@@ -422,6 +907,36 @@ def main():
                 config.set("enable_ao_roughness", value)
                 logger.info(f"AO/roughness map generation {'enabled' if value else 'disabled'}")
                 
+            def _on_curvature_changed(self):
+                """Handle curvature checkbox change."""
+                value = self.curvature_var.get()
+                config.set("enable_curvature", value)
+                logger.info(f"Curvature map generation {'enabled' if value else 'disabled'}")
+                
+            def _on_cavity_changed(self):
+                """Handle cavity checkbox change."""
+                value = self.cavity_var.get()
+                config.set("enable_cavity", value)
+                logger.info(f"Cavity map generation {'enabled' if value else 'disabled'}")
+                
+            def _on_height_map_changed(self):
+                """Handle height map checkbox change."""
+                value = self.height_map_var.get()
+                config.set("enable_height_map", value)
+                logger.info(f"Height map generation {'enabled' if value else 'disabled'}")
+                
+            def _on_height_boundary_changed(self, value):
+                """Handle height map edge dropdown change."""
+                boundary = value.lower()
+                config.set("height_boundary", boundary)
+                logger.info(f"Height map edges set to {boundary}")
+                
+            def _on_ao_quality_changed(self, value):
+                """Handle AO quality dropdown change."""
+                quality = value.lower()
+                config.set("ao_quality", quality)
+                logger.info(f"AO/roughness quality set to {quality}")
+                
             def _on_kernel_size_changed(self, value):
                 """Handle kernel size dropdown change."""
                 try:
@@ -431,6 +946,24 @@ def main():
                 except ValueError:
                     logger.error(f"Invalid kernel size: {value}")
                     
+            def _on_kernel_sweep_changed(self):
+                """Handle kernel sweep checkbox change."""
+                sweep = [int(size) for size in self.kernel_size_options] if self.kernel_sweep_var.get() else []
+                config.set("kernel_sweep", sweep)
+                logger.info(f"Kernel sweep {'set to ' + ', '.join(map(str, sweep)) if sweep else 'disabled'}")
+                
+            def _on_low_memory_changed(self):
+                """Handle low-memory checkbox change."""
+                value = self.low_memory_var.get()
+                config.set("low_memory", value)
+                logger.info(f"Low-memory mode {'enabled' if value else 'disabled'}")
+                
+            def _on_output_mode_changed(self, value):
+                """Handle output mode dropdown change."""
+                mode = value.lower()
+                config.set("output_mode", mode)
+                logger.info(f"Output mode set to {mode}")
+                
             def _on_theme_changed(self, value):
                 """Handle theme dropdown change."""
                 theme = value.lower()
@@ -461,6 +994,7 @@ def main():
                     title="Select Files",
                     filetypes=(
                         ("Image files", "*.png *.jpg *.jpeg *.bmp *.tiff"),
+                        ("Texture archives", "*.zip *.tar"),
                         ("All files", "*.*")
                     )
                 )
@@ -470,13 +1004,74 @@ def main():
                     last_dir = os.path.dirname(files[0])
                     config.set("last_import_directory", last_dir)
                     
-                    # Add files to the queue
-                    self.file_queue.extend(files)
-                    self.total_count = len(self.file_queue)
+                    # Add files to the queue, archives are expanded into their images
+                    def collect():
+                        sources = []
+                        readers = []
+                        for file_path in files:
+                            if is_archive(file_path):
+                                reader = self._open_archive(file_path)
+                                if reader is not None:
+                                    readers.append(reader)
+                                    sources.extend(reader.members)
+                            else:
+                                sources.append(file_path)
+                        return sources, readers
+                        
+                    self._queue_sources(collect, f"{len(files)} selected files")
                     
-                    # Update UI
-                    self._update_progress()
-                    logger.info(f"Added {len(files)} files to the queue. Total: {self.total_count}")
+            def _queue_sources(self, collect, description):
+                """
+                Add files or archive members to the queue, reading their headers in the background.
+                
+                # The queue reads each header so it knows how many pixels are coming,
+                # which is what the ETA and the smallest-first ordering run on.
+                # 20k headers (and OpenCV's import, the first time) would freeze
+                # the window, so collect() and the reading run on the queue thread.
+                # The entries are handed back here, where the queue gets them.
+                """
+                def read():
+                    try:
+                        sources, readers = collect()
+                        entries = JobQueue.read_entries(sources)
+                    except Exception as e:
+                        logger.exception(f"Error queuing {description}: {e}")
+                        return
+                    self.after(0, lambda: self._entries_read(entries, readers, description))
+                    
+                self.queue_pool.submit(read)
+                
+            def _entries_read(self, entries, readers, description):
+                """Queue entries whose headers were read in the background."""
+                self.archive_readers.extend(readers)
+                count = self.file_queue.add_entries(entries)
+                self.total_count += count
+                self.total_pixels += sum(entry["pixels"] for entry in entries)
+                self._refresh_queue_view()
+                self._update_progress()
+                logger.info(f"Added {count} files from {description} to the queue. Total: {self.total_count}")
+                    
+            def _open_archive(self, archive_path):
+                """
+                Open an archive so its images can be queued without extracting them.
+                
+                # The reader stays open until the queue is done with it.
+                # Compressed tars can only be read front to back, so they're
+                # left to the command line where they can be streamed.
+                """
+                try:
+                    reader = ArchiveReader(archive_path)
+                except Exception as e:
+                    logger.error(f"Could not open archive {archive_path}: {e}")
+                    return None
+                    
+                if reader.streaming:
+                    logger.warning(f"Compressed tar archives can't be queued, use "
+                                   f"'python -m src.texture_processor {archive_path}' instead")
+                    reader.close()
+                    return None
+                    
+                return reader
                     
             def _select_folder(self):
                 """Select folder to process."""
@@ -489,18 +1084,15 @@ def main():
                     # Save the directory for next time
                     config.set("last_import_directory", directory)
                     
-                    # Count image files in the directory
-                    count = 0
-                    for filename in os.listdir(directory):
-                        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-                            self.file_queue.append(os.path.join(directory, filename))
-                            count += 1
-                            
-                    self.total_count = len(self.file_queue)
-                    
-                    # Update UI
-                    self._update_progress()
-                    logger.info(f"Added {count} files from {directory} to the queue. Total: {self.total_count}")
+                    # Queue the image files in the directory, listing it in the background too
+                    def collect():
+                        paths = []
+                        for filename in os.listdir(directory):
+                            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
+                                paths.append(os.path.join(directory, filename))
+                        return paths, []
+                        
+                    self._queue_sources(collect, directory)
                     
             def _start_processing(self):
                 """Start processing the file queue."""
@@ -517,70 +1109,324 @@ def main():
                 
                 # Update UI
                 self.is_processing = True
+                self.cancel_token = CancelToken()
                 self.status_label.configure(text="Status: Processing")
                 self.process_button.configure(state="disabled")
                 self.stop_button.configure(state="normal")
+                self.pause_button.configure(state="normal", text="Pause")
                 
-                # Start processing thread
-                import threading
-                self.processing_thread = threading.Thread(target=self._process_files)
-                self.processing_thread.daemon = True
-                self.processing_thread.start()
+                # The GUI processes one file at a time
+                monitor.set_workers(1)
                 
+                # Process on the thread the startup warm-up already ran on
+                self.processing_thread = prewarmer.submit(self._process_files)
+                
+                self._tick_progress()
                 logger.info("Processing started")
                 
+            def _plan_queue(self):
+                """
+                Plan the queued files without processing them.
+                
+                # The queue already read every header, so this only adds up the
+                # numbers. Still runs in a thread, 100k files is 100k files.
+                """
+                if not self.file_queue:
+                    messagebox.showinfo("No Files", "Please select files or a folder to plan first.")
+                    return
+                    
+                entries = self.file_queue.snapshot()
+                settings = processor.get_settings()
+                export_dir = self.export_dir_var.get()
+                self.plan_button.configure(state="disabled")
+                
+                def plan():
+                    try:
+                        # The GUI processes one file at a time
+                        result = plan_batch([entry["source"] for entry in entries], settings, export_dir, max_workers=1,
+                                            headers=[entry["header"] for entry in entries])
+                        summary = format_plan(result)
+                        logger.info(f"Batch plan:\n{summary}")
+                        self.after(0, lambda: messagebox.showinfo("Batch Plan", summary))
+                    except Exception as e:
+                        logger.exception(f"Error planning batch: {e}")
+                    finally:
+                        self.after(0, lambda: self.plan_button.configure(state="normal"))
+                        
+                import threading
+                threading.Thread(target=plan, daemon=True).start()
+                
             def _process_files(self):
                 """Process files in the queue (run in a separate thread)."""
+                from src.output_sink import create_sink
+                
+                # One sink for the whole run, so archive output ends up in one archive
+                sink = create_sink(config.get("export_directory", "./export/"))
+                
+                # Record a timeline of the batch if tracing is on
+                tracing = config.get("trace_enabled", False) and tracer.start()
+                
                 while self.file_queue and self.is_processing:
                     try:
-                        # Get the next file
-                        file_path = self.file_queue.pop(0)
+                        # Get the next file, pinned and then by the chosen order
+                        entry = self.file_queue.pop_next()
+                        if entry is None:
+                            break
+                        self.after(0, self._schedule_queue_refresh)
                         
-                        # Process the file
-                        result = processor.process_image(file_path)
+                        # Settings are fixed per file, so time it against those settings
+                        settings = processor.get_settings()
+                        key = settings_key(settings)
+                        started = time.perf_counter()
+                        self.current_job = (entry, key, started)
+                        
+                        # One file at a time, so OpenCV gets the threads this machine was tuned to give it
+                        opencv_threads = tuned_serial_threads(entry["pixels"])
+                        previous_threads = set_opencv_threads(opencv_threads) if opencv_threads else None
+                        
+                        # Process the file, Stop and Pause reach into it through the token
+                        try:
+                            result = processor.process_image(entry["source"], settings=settings, sink=sink,
+                                                             cancel=self.cancel_token)
+                        finally:
+                            if previous_threads is not None:
+                                set_opencv_threads(previous_threads)
+                        
+                        # Stopped halfway, its outputs are gone, so it goes back to the front of the queue
+                        if result.get("cancelled"):
+                            self.current_job = None
+                            self.file_queue.push_front(entry)
+                            self.after(0, self._schedule_queue_refresh)
+                            break
+                        
+                        # Teach the ETA model how long that took
+                        if result["success"]:
+                            self.throughput_model.record(key, entry["pixels"], time.perf_counter() - started)
                         
                         # Update progress
+                        self.current_job = None
                         self.processed_count += 1
+                        self.processed_pixels += entry["pixels"]
                         self.after(0, self._update_progress)
                         
                     except Exception as e:
+                        self.current_job = None
                         logger.exception(f"Error processing file: {e}")
                         
+                try:
+                    sink.close()
+                except Exception as e:
+                    logger.exception(f"Error finishing output: {e}")
+                    
+                if tracing:
+                    try:
+                        tracer.stop()
+                    except Exception as e:
+                        logger.exception(f"Error writing trace: {e}")
+                    
                 # Processing complete or stopped
                 self.after(0, self._processing_complete)
                 
             def _processing_complete(self):
                 """Handle processing complete."""
                 self.is_processing = False
+                self.throughput_model.save()
                 self.status_label.configure(text="Status: Ready")
                 self.process_button.configure(state="normal")
                 self.stop_button.configure(state="disabled")
+                self.pause_button.configure(state="disabled", text="Pause")
+                self.cancel_token = None
                 
                 if not self.file_queue:
+                    # Nothing left that needs the archives
+                    for reader in self.archive_readers:
+                        reader.close()
+                    self.archive_readers = []
+                    
                     logger.info("Processing complete")
+                    if self.gallery is not None and self.gallery.winfo_exists():
+                        self.gallery.refresh()
                     messagebox.showinfo("Complete", f"Processed {self.processed_count} files successfully.")
                     self.processed_count = 0
                     self.total_count = 0
+                    self.processed_pixels = 0
+                    self.total_pixels = 0
                     self._update_progress()
                 else:
                     logger.info("Processing stopped")
                     
             def _stop_processing(self):
-                """Stop processing."""
+                """
+                Stop processing.
+                
+                # Cancels the token too, so the file in progress stops at its
+                # next stage or tile instead of running to the end.
+                """
                 if self.is_processing:
                     self.is_processing = False
+                    if self.cancel_token is not None:
+                        self.cancel_token.cancel()
                     logger.info("Processing stopped by user")
                     
+            def _toggle_pause(self):
+                """
+                Pause or resume processing.
+                
+                # The file in progress holds at its next checkpoint and the queue
+                # stays exactly as it is, so resuming carries on where it left off.
+                """
+                if not self.is_processing or self.cancel_token is None:
+                    return
+                if self.cancel_token.paused:
+                    self.cancel_token.resume()
+                    self.status_label.configure(text="Status: Processing")
+                    self.pause_button.configure(text="Pause")
+                else:
+                    self.cancel_token.pause()
+                    self.status_label.configure(text="Status: Paused")
+                    self.pause_button.configure(text="Resume")
+                    
             def _update_progress(self):
-                """Update the progress bar and label."""
+                """
+                Update the progress bar and label.
+                
+                # Progress is measured in pixels, not files, so one 16K texture
+                # counts for what it actually costs. The ETA comes from the
+                # throughput model, minus however long the current file has run.
+                """
                 if self.total_count > 0:
-                    progress = self.processed_count / self.total_count
+                    if self.total_pixels > 0:
+                        progress = self.processed_pixels / self.total_pixels
+                    else:
+                        progress = self.processed_count / self.total_count
                     self.progress_bar.set(progress)
-                    self.progress_label.configure(text=f"{self.processed_count}/{self.total_count} files processed")
+                    
+                    text = f"{self.processed_count}/{self.total_count} files processed"
+                    remaining = self._estimate_remaining_seconds()
+                    if remaining is not None:
+                        text += f" - ETA {format_duration(remaining)}"
+                    self.progress_label.configure(text=text)
                 else:
                     self.progress_bar.set(0)
                     self.progress_label.configure(text="0/0 files processed")
                     
+            def _estimate_remaining_seconds(self):
+                """Estimate the seconds left for the current file and everything queued."""
+                if not self.file_queue and self.current_job is None:
+                    return None
+                if processor is None:
+                    # Files queued while still loading, there's nothing to estimate with yet
+                    return None
+                    
+                key = settings_key(processor.get_settings())
+                remaining = self.throughput_model.estimate_seconds(
+                    key, self.file_queue.remaining_pixels(), len(self.file_queue)
+                )
+                
+                current_job = self.current_job
+                if current_job is not None:
+                    entry, current_key, started = current_job
+                    expected = self.throughput_model.estimate_seconds(current_key, entry["pixels"])
+                    remaining += max(0.0, expected - (time.perf_counter() - started))
+                return remaining
+                
+            def _tick_progress(self):
+                """Refresh the ETA once a second while processing."""
+                if self.is_processing:
+                    self._update_progress()
+                    self.after(1000, self._tick_progress)
+                    
+            def _update_dashboard(self):
+                """
+                Refresh the performance dashboard, then schedule the next refresh.
+                
+                # Runs on a fixed timer instead of per file, so a batch of tiny
+                # textures can't drown the UI thread in label updates. Everything
+                # shown is the difference between this snapshot and the last one.
+                """
+                current = monitor.snapshot()
+                rates = compute_rates(self.dashboard_snapshot, current)
+                self.dashboard_snapshot = current
+                
+                self.dashboard_throughput_label.configure(
+                    text=f"Throughput: {rates['megapixels_per_second']:.1f} MP/s, "
+                         f"{rates['files_per_second']:.2f} files/s, "
+                         f"writing {rates['bytes_written_per_second'] / (1024 * 1024):.1f} MB/s"
+                )
+                
+                rss = rates["rss_bytes"]
+                memory = f"{rss / (1024 * 1024):.0f} MB" if rss is not None else "unknown"
+                self.dashboard_workers_label.configure(
+                    text=f"Workers: {rates['active_jobs']}/{rates['workers']} busy, "
+                         f"{rates['utilisation'] * 100:.0f}% utilised, memory {memory}"
+                )
+                
+                shares = sorted(rates["stage_share"].items(), key=lambda item: item[1], reverse=True)
+                stages = ", ".join(f"{stage} {share * 100:.0f}%" for stage, share in shares) or "-"
+                self.dashboard_stages_label.configure(text=f"Stages: {stages}")
+                
+                self.after(max(250, int(config.get("dashboard_interval_ms", 1000))), self._update_dashboard)
+                
+            def _schedule_queue_refresh(self):
+                """
+                Refresh the queue list soon, once for however many changes arrive meanwhile.
+                
+                # Every finished file changes the queue. A few hundred tiny files
+                # a second would otherwise rebuild the list a few hundred times.
+                """
+                if not self.queue_refresh_scheduled:
+                    self.queue_refresh_scheduled = True
+                    self.after(QUEUE_REFRESH_MS, self._refresh_queue_view)
+                    
+            def _refresh_queue_view(self):
+                """
+                Show the queue in the order it will be processed.
+                
+                # Only the first QUEUE_VIEW_LIMIT entries are listed, because Tk
+                # listboxes don't enjoy 20,000 rows any more than you would.
+                # The list is only rebuilt when those rows actually changed.
+                """
+                self.queue_refresh_scheduled = False
+                entries = self.file_queue.head(QUEUE_VIEW_LIMIT)
+                queued = len(self.file_queue)
+                
+                rows = []
+                for entry in entries:
+                    source = entry["source"]
+                    name = os.path.basename(str(source))
+                    megapixels = entry["pixels"] / 1e6
+                    pin = "[pinned] " if self.file_queue.is_pinned(source) else ""
+                    rows.append(f"{pin}{name} ({megapixels:.1f} MP)")
+                if queued > len(entries):
+                    rows.append(f"... and {queued - len(entries)} more")
+                    
+                self.queue_view_entries = entries
+                if rows == self.queue_view_rows:
+                    return
+                self.queue_view_rows = rows
+                self.queue_listbox.delete(0, tk.END)
+                self.queue_listbox.insert(tk.END, *rows)
+                    
+            def _pin_selected(self, pinned=True):
+                """Pin or unpin the files selected in the queue list."""
+                sources = [
+                    self.queue_view_entries[index]["source"]
+                    for index in self.queue_listbox.curselection()
+                    if index < len(self.queue_view_entries)
+                ]
+                if sources:
+                    self.file_queue.pin(sources, pinned)
+                    self._refresh_queue_view()
+                    logger.info(f"{'Pinned' if pinned else 'Unpinned'} {len(sources)} files")
+                    
+            def _on_queue_order_changed(self, value):
+                """Handle queue order dropdown change."""
+                order = QUEUE_ORDER_LABELS[value]
+                self.file_queue.set_order(order)
+                config.set("queue_order", order)
+                self._refresh_queue_view()
+                logger.info(f"Queue order set to {value.lower()}")
+                    
             def _open_export_folder(self):
                 """Open the export folder in the file explorer."""
                 export_dir = config.get("export_directory", "./export/")
@@ -589,21 +1435,37 @@ def main():
                     os.makedirs(export_dir)
                     
                 # Open the folder in the file explorer
-                if sys.platform == 'win32':
-                    os.startfile(export_dir)
-                elif sys.platform == 'darwin':  # macOS
-                    import subprocess
-                    subprocess.Popen(['open', export_dir])
-                else:  # Linux
-                    import subprocess
-                    subprocess.Popen(['xdg-open', export_dir])
+                open_with_system(export_dir)
                     
                 logger.info(f"Opened export folder: {export_dir}")
+                
+            def _open_gallery(self):
+                """
+                Open the results gallery, or bring it to the front if it's open.
+                
+                # The thumbnail cache outlives the window, so reopening the
+                # gallery doesn't decode everything again.
+                """
+                if self.gallery is not None and self.gallery.winfo_exists():
+                    self.gallery.lift()
+                    self.gallery.focus()
+                    return
+                if self.thumbnail_cache is None:
+                    self.thumbnail_cache = ThumbnailCache()
+                self.gallery = ResultsGallery(self, self.thumbnail_cache, self.export_dir_var.get())
+                logger.info("Opened results gallery")
         
         # Create and run the app
         app = TextureNormaliserApp()
         app.mainloop()
         
+        # Closed mid-batch, the file in progress stops and cleans up before we exit
+        app._stop_processing()
+        prewarmer.shutdown()
+        app.queue_pool.shutdown(wait=False, cancel_futures=True)
+        if app.thumbnail_cache is not None:
+            app.thumbnail_cache.close()
+        
     except Exception as e:
         logger.exception(f"Error starting application: {e}")
         sys.exit(1)
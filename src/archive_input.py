@@ -0,0 +1,273 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import io
+import os
+import mmap
+import struct
+import tarfile
+import zipfile
+import threading
+from PIL import Image
+from src.logger import logger
+
+# Extensions we treat as images, same as the folder scan
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+# Extensions we treat as archives of images
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Magic numbers of gzip, bzip2 and xz streams, which make a tar unseekable
+COMPRESSED_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ")
+
+# Zip local file header: signature, then name and extra lengths at offset 26
+ZIP_LOCAL_HEADER_SIZE = 30
+ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+def is_archive(path):
+    """Check whether a path looks like an archive we can read textures from."""
+    return isinstance(path, str) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+class MappedMemberReader(io.RawIOBase):
+    """
+    Read-only file object over a slice of a memory-mapped archive.
+
+    # Lets PIL read an uncompressed archive member straight out of the page
+    # cache without copying the whole thing into a bytes object first.
+    """
+
+    def __init__(self, mapping, offset, size):
+        """Initialize the reader."""
+        super().__init__()
+        self.view = memoryview(mapping)[offset:offset + size]
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(len(self.view), self.position + size)
+        data = self.view[self.position:end].tobytes()
+        self.position = max(self.position, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+class ArchiveMember:
+    """
+    One image inside a zip or tar archive.
+
+    # Stands in for a file path everywhere process_image expects one. It knows
+    # its size and name and can be opened, which is all anybody asked of a path.
+    """
+
+    __slots__ = ("reader", "name", "size", "data_offset", "buffer")
+
+    def __init__(self, reader, name, size, data_offset=None, buffer=None):
+        """Initialize the member."""
+        self.reader = reader
+        self.name = name
+        self.size = size
+        self.data_offset = data_offset
+        self.buffer = buffer
+
+    def open(self):
+        """Open the member for reading."""
+        if self.buffer is not None:
+            return io.BytesIO(self.buffer)
+        return self.reader.open_member(self)
+
+    def __str__(self):
+        return f"{self.reader.archive_path}!/{self.name}"
+
+    def __repr__(self):
+        return f"ArchiveMember({str(self)!r})"
+
+class ArchiveReader:
+    """
+    Opens a zip or tar archive once and hands out the images inside it.
+
+    # Texture packs come as giant zips. Extracting them just so we can read
+    # them back doubles the disk I/O and the space, so we don't.
+    # Uncompressed members are read through a memory map, compressed ones are
+    # decompressed into memory one member at a time. Compressed tars can't be
+    # seeked, so those only support a single streaming pass.
+    """
+
+    def __init__(self, archive_path, mmap_threshold=4 * 1024 * 1024):
+        """Initialize the reader and index the archive's image members."""
+        self.archive_path = archive_path
+        self.mmap_threshold = mmap_threshold
+        self.lock = threading.Lock()
+        self.zip_file = None
+        self.mapping = None
+        self.file = None
+        self.streaming = False
+
+        if zipfile.is_zipfile(archive_path):
+            self.kind = "zip"
+            self.zip_file = zipfile.ZipFile(archive_path, "r")
+        elif tarfile.is_tarfile(archive_path):
+            self.kind = "tar"
+            with open(archive_path, "rb") as f:
+                self.streaming = f.read(6).startswith(COMPRESSED_MAGIC)
+        else:
+            raise ValueError(f"Not a zip or tar archive: {archive_path}")
+
+        if not self.streaming:
+            self._map_archive()
+
+        self.members = [] if self.streaming else self._list_members()
+        logger.info(f"Opened {self.kind} archive {archive_path}"
+                    + ("" if self.streaming else f" with {len(self.members)} images"))
+
+    def _map_archive(self):
+        """Memory map the archive file, if it isn't empty."""
+        if os.path.getsize(self.archive_path) == 0:
+            return
+        self.file = open(self.archive_path, "rb")
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _zip_data_offset(self, info):
+        """Find where a stored zip member's bytes start by reading its local header."""
+        header = self.mapping[info.header_offset:info.header_offset + ZIP_LOCAL_HEADER_SIZE]
+        if header[:4] != ZIP_LOCAL_HEADER_SIGNATURE:
+            return None
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        return info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+
+    def _list_members(self):
+        """List the image members of a seekable archive."""
+        members = []
+        if self.kind == "zip":
+            for info in self.zip_file.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                data_offset = None
+                if info.compress_type == zipfile.ZIP_STORED and info.flag_bits & 0x1 == 0:
+                    data_offset = self._zip_data_offset(info)
+                members.append(ArchiveMember(self, info.filename, info.file_size, data_offset))
+        else:
+            with tarfile.open(self.archive_path, "r:") as archive:
+                for info in archive:
+                    if info.isfile() and info.name.lower().endswith(IMAGE_EXTENSIONS):
+                        members.append(ArchiveMember(self, info.name, info.size, info.offset_data))
+        return members
+
+    def open_member(self, member):
+        """
+        Open a member for reading.
+
+        # Big uncompressed members come straight out of the memory map.
+        # Everything else is read into a buffer in one go, because PIL likes
+        # to seek around and seeking backwards in a deflate stream means
+        # decompressing it all over again.
+        """
+        if member.data_offset is not None and self.mapping is not None and member.size >= self.mmap_threshold:
+            return MappedMemberReader(self.mapping, member.data_offset, member.size)
+
+        if member.data_offset is not None and self.mapping is not None:
+            return io.BytesIO(self.mapping[member.data_offset:member.data_offset + member.size])
+
+        if self.kind == "zip":
+            # ZipFile shares one file handle between readers, keep them in line
+            with self.lock:
+                return io.BytesIO(self.zip_file.read(member.name))
+
+        raise ValueError(f"Member {member.name} can't be opened directly from a streaming archive")
+
+    def iter_streamed(self):
+        """
+        Yield members in a single pass over the archive.
+
+        # The only way to read a compressed tar without decompressing it over
+        # and over. Each member carries its bytes while it's being processed
+        # and should be dropped before asking for the next one.
+        """
+        if not self.streaming:
+            yield from self.members
+            return
+
+        with tarfile.open(self.archive_path, "r|*") as archive:
+            for info in archive:
+                if not info.isfile() or not info.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                yield ArchiveMember(self, info.name, info.size, buffer=archive.extractfile(info).read())
+
+    def close(self):
+        """Close the archive and release the memory map."""
+        if self.zip_file is not None:
+            self.zip_file.close()
+            self.zip_file = None
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                # A reader still holds a view, the map goes away with it
+                pass
+            self.mapping = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def open_input(source):
+    """
+    Open an input for PIL, whether it's a path, an archive member or a file object.
+
+    Returns:
+        A lazily decoded PIL image
+    """
+    if isinstance(source, ArchiveMember):
+        return Image.open(source.open())
+    return Image.open(source)
+
+def get_input_size(source):
+    """Get the size in bytes of an input path or archive member."""
+    if isinstance(source, ArchiveMember):
+        return source.size
+    return os.path.getsize(source)
+
+def get_input_name(source):
+    """Get the file name of an input path or archive member, without any folders."""
+    if isinstance(source, ArchiveMember):
+        return os.path.basename(source.name)
+    return os.path.basename(source)
+
+def get_output_name(source):
+    """
+    Get the file name the outputs of an input are named after.
+
+    # A path's own file name. An archive member's whole path inside the
+    # archive with its folders joined by underscores, so Brick01/albedo.png
+    # and Brick02/albedo.png end up as Brick01_albedo and Brick02_albedo
+    # instead of writing over each other as two albedos.
+    """
+    if isinstance(source, ArchiveMember):
+        parts = [part for part in source.name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+        return "_".join(parts) or os.path.basename(source.name)
+    return os.path.basename(source)
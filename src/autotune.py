@@ -0,0 +1,290 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import platform
+import tempfile
+import threading
+import statistics
+import cv2
+from src.logger import logger
+from src.config import config
+from src.processing_context import ProcessingSettings
+from src.scheduler import MemoryBudgetScheduler, read_image_header
+from src.batch_planner import read_headers
+
+# Image size classes tuned separately, as (name, most pixels per image). Icons
+# want lots of workers, hero textures want OpenCV's threads inside one image
+SIZE_CLASSES = (
+    ("small", 1024 * 1024),
+    ("medium", 4096 * 4096),
+    ("large", None),
+)
+
+# How many inputs per size class a calibration batch uses
+DEFAULT_SAMPLE_SIZE = 4
+
+# How long each split is timed for, at least one pass over the sample
+DEFAULT_TRIAL_SECONDS = 2.0
+
+# How many inputs a batch looks at to work out its size class
+CLASSIFY_SAMPLE_SIZE = 16
+
+def machine_key():
+    """
+    Get the key tuning results are saved under for this machine.
+
+    # Host name, architecture and core count, so a config.json copied to
+    # another box (or a VM that got more cores) doesn't use the wrong split.
+    """
+    return f"{platform.node() or 'unknown'}|{platform.machine() or 'unknown'}|{os.cpu_count() or 1} cpus"
+
+def size_class(pixels):
+    """Get the size class of an image from its pixel count."""
+    for name, limit in SIZE_CLASSES:
+        if limit is None or pixels <= limit:
+            return name
+    return SIZE_CLASSES[-1][0]
+
+def candidate_splits(cpu_count=None, engine="threads"):
+    """
+    Get the (workers, OpenCV threads per worker) splits worth timing.
+
+    # Every power of two of workers with every power of two of threads that
+    # fits in the cores, plus the all-workers and all-threads corners and one
+    # oversubscribed split, since saving PNGs leaves cores waiting on the disk.
+    # OpenCV's thread count belongs to the process, so worker threads share
+    # one pool: 2 x 2 on threads is really two workers and two OpenCV
+    # threads between them. Only worker processes get a count each, the
+    # thread engine gets either workers or OpenCV threads, never both.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    splits = {(cpu_count, 1), (1, cpu_count), (cpu_count * 2, 1)}
+    workers = 1
+    while workers <= cpu_count:
+        threads = 1
+        while workers * threads <= cpu_count:
+            splits.add((workers, threads))
+            threads *= 2
+        splits.add((workers, cpu_count // workers))
+        workers *= 2
+    if engine != "processes":
+        splits = {(workers, threads) for workers, threads in splits if workers == 1 or threads == 1}
+    return sorted(splits)
+
+def set_opencv_threads(threads):
+    """Set OpenCV's thread count and return the previous one, so it can be put back."""
+    previous = cv2.getNumThreads()
+    cv2.setNumThreads(int(threads))
+    return previous
+
+def get_tuning(pixels):
+    """Get this machine's saved tuning for images of a given size, or None if it hasn't been tuned."""
+    machines = config.get("autotune", {}) or {}
+    return (machines.get(machine_key()) or {}).get(size_class(pixels))
+
+def tuned_split(inputs, engine="threads"):
+    """
+    Get the tuned (workers, OpenCV threads) for a batch, or None.
+
+    # A batch is classed by the median size of a few of its inputs, which is
+    # a handful of header reads. None when autotune_apply is off, or this
+    # machine hasn't been tuned for that size on the engine the batch runs on.
+    """
+    if not config.get("autotune_apply", True) or not config.get("autotune", {}):
+        return None
+    inputs = list(inputs)
+    if not inputs:
+        return None
+    step = max(1, len(inputs) // CLASSIFY_SAMPLE_SIZE)
+    pixels = []
+    for source in inputs[::step][:CLASSIFY_SAMPLE_SIZE]:
+        try:
+            header = read_image_header(source)
+            pixels.append(header["width"] * header["height"])
+        except Exception:
+            continue
+    tuning = get_tuning(statistics.median(pixels)) if pixels else None
+    if tuning is None or tuning.get("engine", "threads") != engine:
+        return None
+    return tuning["workers"], tuning["opencv_threads"]
+
+def tuned_serial_threads(pixels):
+    """
+    Get the tuned OpenCV thread count for processing one image at a time, or None.
+
+    # One worker has OpenCV to itself on either engine, so this one doesn't care which.
+    """
+    if not config.get("autotune_apply", True):
+        return None
+    tuning = get_tuning(pixels)
+    return tuning.get("serial_opencv_threads") if tuning else None
+
+def _pick_sample(headers, sources, sample_size):
+    """Pick a spread of sizes from the inputs of each size class."""
+    classes = {}
+    for source, header in zip(sources, headers):
+        if "error" in header:
+            continue
+        pixels = header["width"] * header["height"]
+        classes.setdefault(size_class(pixels), []).append((pixels, source))
+    sample = {}
+    for name, entries in classes.items():
+        entries.sort(key=lambda entry: entry[0])
+        step = max(1, len(entries) // sample_size)
+        sample[name] = entries[::step][:sample_size]
+    return sample
+
+def time_split(sample, workers, threads, settings, output_dir, trial_seconds=DEFAULT_TRIAL_SECONDS, engine="threads"):
+    """
+    Time one split on a calibration batch.
+
+    # Runs the sample through the real scheduler and process_image, over and
+    # over until the trial has gone on long enough to be worth timing. Every
+    # job in a round writes to its own folder, so two copies of a texture
+    # never race, and the next round overwrites them instead of piling up more.
+    # On the process engine the thread count goes to each worker process as
+    # it starts, and one untimed round lets them import and warm up first.
+
+    Returns:
+        Megapixels per second
+    """
+    # Import here, the processor imports this module
+    from src.texture_processor import processor
+    from src.shm_pipeline import SharedMemoryPipeline
+
+    if engine == "processes":
+        batch = [source for _, source in sample] * max(1, -(-workers // len(sample)))
+        pixels = sum(count for count, _ in sample) * (len(batch) // len(sample))
+        scheduler = MemoryBudgetScheduler(max_workers=workers)
+        with SharedMemoryPipeline.for_batch(batch, output_dir, settings, workers, opencv_threads=threads,
+                                            memory_budget=scheduler.memory_budget) as pipeline:
+            scheduler.reserve(pipeline.ring_bytes)
+            scheduler.run(batch, pipeline.process, settings.enabled_maps(), keep_results=False)
+            done = 0
+            started = time.perf_counter()
+            while True:
+                results = scheduler.run(batch, pipeline.process, settings.enabled_maps())
+                if not all(result["success"] for result in results):
+                    raise RuntimeError(f"Calibration image failed: {[r.get('error') for r in results if not r['success']]}")
+                done += pixels
+                elapsed = time.perf_counter() - started
+                if elapsed >= trial_seconds:
+                    return done / 1e6 / elapsed
+
+    paths = [source for _, source in sample]
+    pixels = sum(count for count, _ in sample)
+    # Enough copies that every worker has something to do
+    batch = paths * max(1, -(-workers // len(paths)))
+    lock = threading.Lock()
+    slots = []
+
+    def job(source):
+        with lock:
+            slot = slots.pop()
+        return processor.process_image(source, os.path.join(output_dir, str(slot)), settings)
+
+    scheduler = MemoryBudgetScheduler(max_workers=workers)
+    previous = set_opencv_threads(threads)
+    try:
+        done = 0
+        started = time.perf_counter()
+        while True:
+            slots[:] = range(len(batch))
+            results = scheduler.run(batch, job, settings.enabled_maps())
+            if not all(result["success"] for result in results):
+                raise RuntimeError(f"Calibration image failed: {[r.get('error') for r in results if not r['success']]}")
+            done += pixels * (len(batch) // len(paths))
+            elapsed = time.perf_counter() - started
+            if elapsed >= trial_seconds:
+                return done / 1e6 / elapsed
+    finally:
+        set_opencv_threads(previous)
+
+def tune(sources, settings=None, sample_size=DEFAULT_SAMPLE_SIZE, trial_seconds=DEFAULT_TRIAL_SECONDS,
+         splits=None, save=True, engine=None):
+    """
+    Find the fastest split of workers and OpenCV threads for each size of input.
+
+    # OpenCV threads inside an image and our workers across images fight over
+    # the same cores. Which split wins depends on the image size and the
+    # machine, so this times every sensible split on a few real inputs of each
+    # size and keeps the fastest. The results are saved per machine in the
+    # config and picked up by batches and the GUI from then on. Splits are
+    # timed on the engine batches run on, batch_engine unless told otherwise.
+
+    Returns:
+        Dict with success, machine, engine, and per size class the chosen workers,
+        opencv_threads, serial_opencv_threads, megapixels_per_second and every trial
+    """
+    # Import here, the processor imports this module
+    from src.texture_processor import processor
+
+    if settings is None:
+        settings = ProcessingSettings.from_config()
+    if engine is None:
+        engine = config.get("batch_engine", "threads")
+    if splits is None:
+        splits = candidate_splits(engine=engine)
+    sources = list(sources)
+    sample = _pick_sample(read_headers(sources), sources, sample_size)
+    if not sample:
+        return {"success": False, "error": "No readable inputs to calibrate on"}
+
+    tuned = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, entries in sample.items():
+            # One untimed image first, so the first split doesn't pay for warming the caches
+            processor.process_image(entries[0][1], os.path.join(temp_dir, "warmup"), settings)
+            trials = []
+            for workers, threads in splits:
+                rate = time_split(entries, workers, threads, settings, temp_dir, trial_seconds, engine)
+                trials.append({"workers": workers, "opencv_threads": threads, "megapixels_per_second": round(rate, 3)})
+                logger.info(f"Autotune {name}: {workers} workers x {threads} OpenCV threads = {rate:.2f} MP/s")
+            best = max(trials, key=lambda trial: trial["megapixels_per_second"])
+            serial = max((trial for trial in trials if trial["workers"] == 1),
+                         key=lambda trial: trial["megapixels_per_second"], default=best)
+            tuned[name] = {
+                "workers": best["workers"],
+                "opencv_threads": best["opencv_threads"],
+                "serial_opencv_threads": serial["opencv_threads"],
+                "engine": engine,
+                "megapixels_per_second": best["megapixels_per_second"],
+                "images": len(entries),
+                "trials": trials
+            }
+
+    machine = machine_key()
+    if save:
+        machines = dict(config.get("autotune", {}) or {})
+        saved = dict(machines.get(machine, {}))
+        saved.update(tuned)
+        machines[machine] = saved
+        config.set("autotune", machines)
+    logger.info(f"Autotuned {machine} on {engine}: " + ", ".join(
+        f"{name} {entry['workers']} workers x {entry['opencv_threads']} threads" for name, entry in tuned.items()))
+    return {
+        "success": True,
+        "machine": machine,
+        "engine": engine,
+        "classes": tuned
+    }
+
+if __name__ == "__main__":
+    # Tune this machine on the images in a directory
+    if len(sys.argv) > 1:
+        input_dir = sys.argv[1]
+        paths = [os.path.join(input_dir, filename) for filename in os.listdir(input_dir)
+                 if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
+        seconds = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TRIAL_SECONDS
+        result = tune(paths, trial_seconds=seconds)
+        for name, entry in result.get("classes", {}).items():
+            print(f"{name}: {entry['workers']} workers x {entry['opencv_threads']} OpenCV threads, "
+                  f"{entry['megapixels_per_second']} MP/s (one at a time: {entry['serial_opencv_threads']} threads)")
+    else:
+        print("Usage: python -m src.autotune <input_directory> [seconds_per_trial]")
@@ -0,0 +1,337 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src.logger import logger
+from src.config import config
+from src.processing_context import ProcessingSettings
+from src.archive_input import get_input_size
+from src.scheduler import MemoryBudgetScheduler, MODE_BYTES, read_image_header, estimate_peak_memory, get_total_memory
+from src.throughput import ThroughputModel, settings_key, format_duration
+
+# Output bytes per pixel for each map, measured on the synthetic corpus with
+# every map on. Calibrating on real textures replaces these.
+DEFAULT_OUTPUT_BYTES_PER_PIXEL = {
+    "normal_map": 1.03,
+    "bump_map": 0.63,
+    "ao_roughness": 0.34,
+    "curvature": 0.66,
+    "cavity": 0.62,
+    "height_map": 0.34,
+    "packed": 0.9,
+    # The original copy of anything that isn't a PNG already, per decoded byte
+    "original": 0.5,
+}
+
+# How many headers each planner thread reads in one go
+HEADER_CHUNK_SIZE = 256
+
+# File extensions a directory is listed for
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+def get_output_coefficients():
+    """Get the output bytes per pixel for each map, calibrated if that's been done."""
+    coefficients = dict(DEFAULT_OUTPUT_BYTES_PER_PIXEL)
+    coefficients.update(config.get("output_bytes_per_pixel", {}) or {})
+    return coefficients
+
+def list_directory(input_dir):
+    """
+    List the images at the top level of a directory, and the folders next to them.
+
+    # Top level only, subfolders aren't walked into. Every output folder is
+    # named after its image's file name alone, so Brick01/albedo.png and
+    # Brick02/albedo.png would write over each other in the one export
+    # directory. The folders are handed back so a plan can say what it left out.
+
+    Returns:
+        (image paths, subfolder names), both sorted
+    """
+    paths = []
+    folders = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                folders.append(entry.name)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(entry.path)
+    return sorted(paths), sorted(folders)
+
+def _read_headers(sources):
+    """Read the header and size of each source, keeping errors instead of raising."""
+    headers = []
+    for source in sources:
+        try:
+            header = dict(read_image_header(source))
+            header["input_bytes"] = get_input_size(source)
+        except Exception as e:
+            header = {"error": str(e)}
+        headers.append(header)
+    return headers
+
+def read_headers(sources, max_workers=None):
+    """
+    Read the headers of many inputs at once.
+
+    # Chunked across threads, because a header read is mostly waiting on the
+    # disk and a thread per file would spend longer being scheduled than reading.
+
+    Returns:
+        One header dict per source, in order, with "error" set for unreadable ones
+    """
+    sources = list(sources)
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    chunks = [sources[start:start + HEADER_CHUNK_SIZE] for start in range(0, len(sources), HEADER_CHUNK_SIZE)]
+    if max_workers <= 1 or len(chunks) <= 1:
+        return [header for chunk in chunks for header in _read_headers(chunk)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [header for headers in executor.map(_read_headers, chunks) for header in headers]
+
+def estimate_output_bytes(header, settings, coefficients=None):
+    """
+    Estimate the bytes process_image writes for one image.
+
+    # PNG in, PNG out, so the original copy is about the size of the input.
+    # Everything else is pixels times what that map has been seen to compress to.
+    """
+    if coefficients is None:
+        coefficients = get_output_coefficients()
+    pixels = header["width"] * header["height"]
+
+    if header.get("format") == "PNG" and "input_bytes" in header:
+        total = header["input_bytes"]
+    else:
+        total = pixels * MODE_BYTES.get(header["mode"], (4, 4))[1] * coefficients["original"]
+
+    for map_name in settings.enabled_maps():
+        if not settings.writes_separately(map_name) and map_name != "packed":
+            continue
+        count = len(settings.normal_map_kernel_sizes()) if map_name == "normal_map" else 1
+        total += count * pixels * coefficients.get(map_name, 1.0)
+    return int(total)
+
+def plan_batch(sources, settings=None, output_dir=None, max_workers=None, memory_budget_mb=None, headers=None):
+    """
+    Plan a batch from the input headers alone, without decoding anything.
+
+    # Answers "how big, how long, will it fit" before you commit the machine
+    # to it for the night. Unreadable files and ones too big for the memory
+    # budget are flagged up front instead of an hour in.
+
+    Args:
+        sources: Paths or archive members to plan
+        settings: Settings snapshot to plan for (defaults to config)
+        output_dir: Where the outputs would go, for the free space check
+        max_workers, memory_budget_mb: Scheduler limits (default to config)
+        headers: Headers already read for the sources (e.g. by the queue), in order
+
+    Returns:
+        Plan dict with per-file estimates, totals and the flagged files
+    """
+    started = time.perf_counter()
+    sources = list(sources)
+    if settings is None:
+        settings = ProcessingSettings.from_config()
+    if output_dir is None:
+        output_dir = config.get("export_directory", "./export/")
+    if headers is None:
+        headers = read_headers(sources)
+
+    scheduler = MemoryBudgetScheduler(memory_budget_mb, max_workers, settings.low_memory)
+    total_memory = get_total_memory()
+    enabled_maps = settings.enabled_maps()
+    coefficients = get_output_coefficients()
+
+    files = []
+    unreadable = []
+    oversized = []
+    for source, header in zip(sources, headers):
+        entry = {"input_path": source}
+        if "error" in header:
+            entry["error"] = header["error"]
+            unreadable.append(entry)
+            files.append(entry)
+            continue
+
+        header = dict(header)
+        if "input_bytes" not in header:
+            try:
+                header["input_bytes"] = get_input_size(source)
+            except OSError:
+                header["input_bytes"] = 0
+        pixels = header["width"] * header["height"]
+        entry.update(header)
+        entry["pixels"] = pixels
+        entry["peak_bytes"] = estimate_peak_memory(header["width"], header["height"], header["mode"], enabled_maps,
+                                                   settings.low_memory)
+        entry["output_bytes"] = estimate_output_bytes(header, settings, coefficients)
+
+        # Too big for the budget runs on its own, too big for PIL or the machine doesn't run at all
+        flags = []
+        if Image.MAX_IMAGE_PIXELS and pixels > 2 * Image.MAX_IMAGE_PIXELS:
+            flags.append("too_many_pixels")
+        if entry["peak_bytes"] > total_memory:
+            flags.append("exceeds_memory")
+        elif entry["peak_bytes"] > scheduler.memory_budget:
+            flags.append("exceeds_budget")
+        if flags:
+            entry["flags"] = flags
+            oversized.append(entry)
+        files.append(entry)
+
+    planned = [entry for entry in files if "pixels" in entry]
+    total_pixels = sum(entry["pixels"] for entry in planned)
+    output_bytes = sum(entry["output_bytes"] for entry in planned)
+    peak_bytes = max((entry["peak_bytes"] for entry in planned), default=0)
+
+    # Runtime from the throughput model, spread over as many workers as the budget lets run at once
+    model = ThroughputModel.from_config()
+    key = settings_key(settings)
+    serial_seconds = model.estimate_seconds(key, total_pixels, len(planned)) if planned else 0.0
+    if planned:
+        typical_peak = sorted(entry["peak_bytes"] for entry in planned)[len(planned) // 2]
+        parallelism = max(1, min(scheduler.max_workers, len(planned), scheduler.memory_budget // max(1, typical_peak)))
+        longest = model.estimate_seconds(key, max(entry["pixels"] for entry in planned))
+        estimated_seconds = max(serial_seconds / parallelism, longest)
+    else:
+        parallelism = 0
+        estimated_seconds = 0.0
+
+    # Free space where the outputs would land, or the nearest folder that exists
+    disk_directory = os.path.abspath(output_dir)
+    while not os.path.isdir(disk_directory) and os.path.dirname(disk_directory) != disk_directory:
+        disk_directory = os.path.dirname(disk_directory)
+    try:
+        disk_free = shutil.disk_usage(disk_directory).free
+    except OSError:
+        disk_free = None
+
+    plan = {
+        "success": True,
+        "output_dir": output_dir,
+        "settings_key": key,
+        "file_count": len(files),
+        "total_pixels": total_pixels,
+        "megapixels": total_pixels / 1e6,
+        "input_bytes": sum(entry["input_bytes"] for entry in planned),
+        "output_bytes": output_bytes,
+        "peak_bytes": peak_bytes,
+        "memory_budget_bytes": scheduler.memory_budget,
+        "workers": scheduler.max_workers,
+        "parallelism": parallelism,
+        "serial_seconds": serial_seconds,
+        "estimated_seconds": estimated_seconds,
+        "disk_free_bytes": disk_free,
+        "fits_on_disk": disk_free is None or output_bytes <= disk_free,
+        "unreadable": unreadable,
+        "oversized": oversized,
+        "files": files,
+        "planning_seconds": time.perf_counter() - started
+    }
+    logger.info(f"Planned {len(files)} files in {plan['planning_seconds']:.2f}s: {format_plan(plan).splitlines()[0]}")
+    return plan
+
+def format_plan(plan):
+    """Describe a plan in a few human lines."""
+    mb = 1024 * 1024
+    lines = [
+        f"{plan['file_count']} files, {plan['megapixels']:.1f} MP, about {plan['output_bytes'] / mb:.0f} MB of output "
+        f"in {format_duration(plan['estimated_seconds'])}",
+        f"Largest image needs {plan['peak_bytes'] / mb:.0f} MB, budget is {plan['memory_budget_bytes'] / mb:.0f} MB "
+        f"({plan['parallelism']} of {plan['workers']} workers busy at once)",
+    ]
+    if plan["disk_free_bytes"] is not None:
+        lines.append(f"{plan['disk_free_bytes'] / mb:.0f} MB free on the export drive"
+                     + ("" if plan["fits_on_disk"] else " - NOT ENOUGH"))
+    if plan.get("skipped_folders"):
+        lines.append(f"Top level of the directory only, {len(plan['skipped_folders'])} subfolders not included: "
+                     + ", ".join(plan["skipped_folders"][:5])
+                     + (" ..." if len(plan["skipped_folders"]) > 5 else ""))
+    if plan["unreadable"]:
+        lines.append(f"{len(plan['unreadable'])} unreadable: "
+                     + ", ".join(str(entry["input_path"]) for entry in plan["unreadable"][:5])
+                     + (" ..." if len(plan["unreadable"]) > 5 else ""))
+    if plan["oversized"]:
+        lines.append(f"{len(plan['oversized'])} oversized: "
+                     + ", ".join(f"{entry['input_path']} ({'/'.join(entry['flags'])})" for entry in plan["oversized"][:5])
+                     + (" ..." if len(plan["oversized"]) > 5 else ""))
+    return "\n".join(lines)
+
+def calibrate(sources, settings=None, sample_size=3):
+    """
+    Calibrate the planner by actually processing a few of the inputs.
+
+    # Output sizes depend on the textures, so a handful of real ones beats
+    # the corpus defaults. Picks a spread of sizes, processes them into a
+    # temporary folder, and saves both the timings (to the throughput model)
+    # and the bytes per pixel of every map.
+
+    Returns:
+        The calibrated output bytes per pixel
+    """
+    # Import here, the processor imports the planner
+    from src.texture_processor import processor
+
+    if settings is None:
+        settings = ProcessingSettings.from_config()
+    sources = list(sources)
+    headers = read_headers(sources)
+    readable = sorted(((header["width"] * header["height"], index) for index, header in enumerate(headers)
+                       if "error" not in header))
+    if not readable:
+        return get_output_coefficients()
+    step = max(1, len(readable) // sample_size)
+    sample = [sources[index] for _, index in readable[::step][:sample_size]]
+
+    model = ThroughputModel.from_config()
+    key = settings_key(settings)
+    map_bytes = {}
+    map_pixels = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for source in sample:
+            header = read_image_header(source)
+            pixels = header["width"] * header["height"]
+            job_started = time.perf_counter()
+            result = processor.process_image(source, temp_dir, settings)
+            if not result["success"]:
+                continue
+            model.record(key, pixels, time.perf_counter() - job_started)
+            for map_name, output_path in result["results"].items():
+                # Sweep outputs all count towards the normal map
+                map_name = "normal_map" if map_name.startswith("normal_map") else map_name
+                map_bytes[map_name] = map_bytes.get(map_name, 0) + os.path.getsize(output_path)
+                map_pixels[map_name] = map_pixels.get(map_name, 0) + pixels
+            if header["format"] != "PNG":
+                decoded = pixels * MODE_BYTES.get(header["mode"], (4, 4))[1]
+                map_bytes["original"] = map_bytes.get("original", 0) + os.path.getsize(result["original"])
+                map_pixels["original"] = map_pixels.get("original", 0) + decoded
+
+    model.save()
+    calibrated = dict(config.get("output_bytes_per_pixel", {}) or {})
+    calibrated.update({name: round(map_bytes[name] / map_pixels[name], 4) for name in map_bytes})
+    config.set("output_bytes_per_pixel", calibrated)
+    logger.info(f"Calibrated on {len(sample)} images: {calibrated}")
+    return get_output_coefficients()
+
+if __name__ == "__main__":
+    # Plan a directory, optionally calibrating on a few of its images first
+    if len(sys.argv) > 1:
+        input_dir = sys.argv[1]
+        paths, folders = list_directory(input_dir)
+        if "--calibrate" in sys.argv:
+            calibrate(paths)
+        plan = plan_batch(paths)
+        plan["skipped_folders"] = folders
+        print(format_plan(plan))
+    else:
+        print("Usage: python -m src.batch_planner <input_directory> [--calibrate]")
@@ -0,0 +1,210 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import time
+import queue
+import threading
+from src.logger import logger
+
+# How many finished records can wait for a slow consumer before the batch waits too
+RESULT_QUEUE_SIZE = 256
+
+# How many error messages a summary keeps, the rest are only counted
+MAX_SUMMARY_ERRORS = 100
+
+# How often a blocked producer checks whether anybody is still listening
+RESULT_POLL_SECONDS = 0.5
+
+class FileResult:
+    """
+    Compact record of one processed file.
+
+    # The full result dict of process_image is a dict of dicts of strings.
+    # This is one small object with fixed slots, made as each file finishes
+    # and gone as soon as the caller is done with it.
+    """
+    __slots__ = ("input_path", "success", "output_dir", "outputs", "error", "duplicate_of", "revised", "cancelled")
+
+    def __init__(self, input_path, success, output_dir=None, outputs=(), error=None, duplicate_of=None, revised=False,
+                 cancelled=False):
+        """Initialize a record, outputs being (map name, location) pairs."""
+        self.input_path = input_path
+        self.success = success
+        self.output_dir = output_dir
+        self.outputs = outputs
+        self.error = error
+        self.duplicate_of = duplicate_of
+        self.revised = revised
+        self.cancelled = cancelled
+
+    @classmethod
+    def from_result(cls, result):
+        """Make a record from a process_image style result dict."""
+        outputs = ()
+        if result["success"]:
+            outputs = tuple(result.get("results", {}).items())
+            if result.get("original"):
+                outputs += (("original", result["original"]),)
+        return cls(str(result["input_path"]), result["success"], result.get("output_dir"), outputs,
+                   result.get("error"), result.get("duplicate_of"), result.get("revised", False),
+                   result.get("cancelled", False))
+
+    def to_dict(self):
+        """Get the record as a plain dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        """Show the record the way you'd want it in a log."""
+        if self.success:
+            return f"FileResult({self.input_path!r}, {len(self.outputs)} outputs)"
+        return f"FileResult({self.input_path!r}, failed: {self.error})"
+
+class BatchSummary:
+    """
+    Running totals of a batch that doesn't keep the per-file records.
+
+    # Counts, not lists. A million files later it's still the same handful
+    # of numbers, plus the first few error messages so you know where to look.
+    """
+
+    def __init__(self):
+        """Initialize empty totals."""
+        self.files = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.cancelled = 0
+        self.outputs = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, record):
+        """Count one record."""
+        if record.revised:
+            # A file already counted as done whose outputs didn't make it to disk after all
+            self.succeeded -= 1
+        else:
+            self.files += 1
+            if record.success:
+                self.succeeded += 1
+                self.outputs += len(record.outputs)
+                if record.duplicate_of is not None:
+                    self.duplicates += 1
+                return
+            if record.cancelled:
+                # Stopped on purpose, not a failure
+                self.cancelled += 1
+                return
+        self.failed += 1
+        if len(self.errors) < MAX_SUMMARY_ERRORS:
+            self.errors.append((record.input_path, record.error))
+
+    def finish(self):
+        """Stop the clock."""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def to_dict(self):
+        """Get the totals as a plain dictionary."""
+        seconds = (self.finished or time.perf_counter()) - self.started
+        return {
+            "files": self.files,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "cancelled": self.cancelled,
+            "outputs": self.outputs,
+            "errors": list(self.errors),
+            "seconds": seconds,
+            "files_per_second": self.files / seconds if seconds > 0 else 0.0
+        }
+
+class ResultStream:
+    """
+    Iterator over the records of a batch, as they finish.
+
+    # The batch runs in a background thread and hands records over through a
+    # small queue. A consumer that falls behind makes the batch wait instead
+    # of letting records pile up. Stop iterating early and the batch still
+    # runs to the end in the background, it just stops reporting.
+    """
+
+    def __init__(self, run, callback=None):
+        """
+        Set up a stream, nothing runs until it's iterated.
+
+        Args:
+            run: Called as run(on_result) in the background, returns the batch's extra summary entries
+            callback: Optional function called with each record before it's yielded
+        """
+        self.run = run
+        self.callback = callback
+        self.summary = BatchSummary()
+        self.batch_info = {}
+        self.started = False
+        self.thread = None
+
+    def __iter__(self):
+        """Run the batch and yield a FileResult for every file."""
+        if self.started:
+            raise RuntimeError("A result stream can only be iterated once")
+        self.started = True
+        records = queue.Queue(maxsize=RESULT_QUEUE_SIZE)
+        closed = threading.Event()
+        done = object()
+
+        def put(item):
+            while not closed.is_set():
+                try:
+                    records.put(item, timeout=RESULT_POLL_SECONDS)
+                    return
+                except queue.Full:
+                    continue
+
+        def background():
+            outcome = done
+            try:
+                self.batch_info = self.run(lambda result: put(FileResult.from_result(result))) or {}
+            except Exception as e:
+                logger.exception(f"Error in streamed batch: {e}")
+                outcome = e
+            put(outcome)
+
+        self.thread = threading.Thread(target=background, name="ResultStream", daemon=True)
+        self.summary = BatchSummary()
+        self.thread.start()
+        try:
+            while True:
+                item = records.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                self.summary.add(item)
+                if self.callback is not None:
+                    self.callback(item)
+                yield item
+        finally:
+            closed.set()
+            self.summary.finish()
+
+    def finish(self):
+        """
+        Run the batch, unless somebody already iterated it, and get the totals.
+
+        # For callers that only want the callbacks and the end result. After
+        # stopping early this waits for the rest of the batch to finish, the
+        # totals only count what was iterated.
+        """
+        if not self.started:
+            for _ in self:
+                pass
+        self.thread.join()
+        # The counts win over the batch's own entries, "cancelled" is a count here
+        result = dict(self.batch_info)
+        result.update(self.summary.to_dict())
+        return result
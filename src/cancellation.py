@@ -0,0 +1,117 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import threading
+from src.logger import logger
+
+class ProcessingCancelled(Exception):
+    """
+    Raised at a checkpoint once processing has been cancelled.
+
+    # Not an error, somebody clicked Stop. Whoever catches it cleans up
+    # and reports the file as cancelled instead of failed.
+    """
+
+class CancelToken:
+    """
+    Cooperative cancel and pause switch shared by everything working on a batch.
+
+    # Python threads can't be killed, and killing them mid-write would be
+    # worse anyway. So the work checks the token between stages and between
+    # tiles: a cancelled token raises there, a paused one blocks there until
+    # it's resumed. Checking is two Event lookups, cheap enough to sprinkle.
+    """
+
+    def __init__(self, cancelled=None, running=None):
+        """
+        Initialize a token that's neither cancelled nor paused.
+
+        Args:
+            cancelled: Event to keep the cancel flag in, multiprocessing ones let worker processes share it
+            running: Event that's set while not paused, shared the same way
+        """
+        self._cancelled = cancelled if cancelled is not None else threading.Event()
+        self._running = running if running is not None else threading.Event()
+        if cancelled is None and running is None:
+            self._running.set()
+
+    @property
+    def cancelled(self):
+        """Check whether cancel was called."""
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        """Check whether the work is paused (and not cancelled)."""
+        return not self._running.is_set()
+
+    def cancel(self):
+        """Cancel the work, waking anything that's paused so it can stop."""
+        if not self._cancelled.is_set():
+            logger.info("Cancelling processing")
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        """Hold the work at its next checkpoint."""
+        if self.cancelled:
+            return
+        self._running.clear()
+        logger.info("Processing paused")
+
+    def resume(self):
+        """Let paused work carry on."""
+        if self.paused:
+            logger.info("Processing resumed")
+        self._running.set()
+
+    def wait(self, timeout=None):
+        """
+        Block while paused.
+
+        Returns:
+            True if the work can carry on, False if it was cancelled or the wait timed out
+        """
+        return self._running.wait(timeout) and not self.cancelled
+
+    def check(self):
+        """Checkpoint: wait out a pause, then raise ProcessingCancelled if cancelled."""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise ProcessingCancelled("Processing was cancelled")
+
+def checkpoint(cancel):
+    """Check a token that may be None, for code where cancelling is optional."""
+    if cancel is not None:
+        cancel.check()
+
+if __name__ == "__main__":
+    # Pause a worker, resume it, then cancel it
+    import time
+
+    token = CancelToken()
+    steps = []
+
+    def work():
+        try:
+            for step in range(100):
+                token.check()
+                steps.append(step)
+                time.sleep(0.01)
+        except ProcessingCancelled:
+            print(f"Cancelled after {len(steps)} steps")
+
+    worker = threading.Thread(target=work)
+    worker.start()
+    time.sleep(0.1)
+    token.pause()
+    held = len(steps)
+    time.sleep(0.2)
+    print(f"Paused for 0.2s, {len(steps) - held} steps ran meanwhile")
+    token.resume()
+    time.sleep(0.1)
+    token.cancel()
+    worker.join()
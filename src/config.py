@@ -19,10 +19,53 @@ class Config:
         "enable_normal_map": True,
         "enable_bump_map": True,
         "enable_ao_roughness": False,
+        "enable_curvature": False,
+        "enable_cavity": False,
+        "enable_height_map": False,
+        "height_boundary": "mirror",
+        "height_tile_size": 2048,
+        "ao_quality": "quality",
+        "output_mode": "separate",
+        "packed_layout": ["ao_roughness", "bump_map", "black"],
         "export_directory": "./export/",
+        "output_sink": "directory",
+        "fsync_batch_size": 64,
+        "fsync_interval_s": 2.0,
+        "stale_temp_age_s": 600,
+        "archive_shard_mb": 0,
+        "archive_name": "",
         "theme": "dark",
         "sobel_kernel_size": 5,
-        "last_import_directory": "./import/"
+        "kernel_sweep": [],
+        "kernel_backend": "auto",
+        "last_import_directory": "./import/",
+        "queue_order": "selection",
+        "throughput_model": {},
+        "output_bytes_per_pixel": {},
+        "dashboard_interval_ms": 1000,
+        "metrics_port": 0,
+        "metrics_textfile": "",
+        "metrics_interval_s": 15,
+        "trace_enabled": False,
+        "trace_sample_rate": 0.1,
+        "trace_full_jobs": 50,
+        "trace_max_events": 200000,
+        "trace_directory": "./logs/traces/",
+        "max_workers": 0,
+        "memory_budget_mb": 0,
+        "low_memory": False,
+        "batch_engine": "threads",
+        "shm_slots": 0,
+        "shm_budget_fraction": 0.25,
+        "autotune_apply": True,
+        "autotune": {},
+        "deduplicate_inputs": False,
+        "dedup_link_mode": "hardlink",
+        "thumbnail_size": 128,
+        "thumbnail_memory_items": 512,
+        "thumbnail_cache_mb": 256,
+        "thumbnail_cache_directory": "./cache/thumbnails/",
+        "kernel_cache_directory": "./cache/kernels/"
     }
     
     def __init__(self, config_file="config.json"):
@@ -0,0 +1,159 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import shutil
+import hashlib
+from src.logger import logger
+from src.archive_input import ArchiveMember, get_input_size
+
+# Read inputs in chunks this big while hashing them
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Linux ioctl that shares extents between two files (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+def hash_input(source):
+    """
+    Hash the contents of an input path or archive member.
+
+    # BLAKE2b, because it's fast and we're not defending against anyone
+    # crafting colliding textures on purpose.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    stream = source.open() if isinstance(source, ArchiveMember) else open(source, 'rb')
+    with stream:
+        while True:
+            chunk = stream.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_duplicates(inputs):
+    """
+    Group inputs with identical contents.
+
+    # File sizes first, because two files of different sizes can't be the
+    # same and stat is way cheaper than reading. Only the files that share
+    # a size with something else get hashed.
+
+    Returns:
+        (unique inputs in original order, dict of unique input -> list of its duplicates)
+    """
+    by_size = {}
+    for source in inputs:
+        try:
+            size = get_input_size(source)
+        except OSError as e:
+            logger.warning(f"Could not stat {source} for deduplication: {e}")
+            size = None
+        by_size.setdefault(size, []).append(source)
+
+    primary_of = {}
+    duplicates = {}
+    for size, group in by_size.items():
+        if size is None or len(group) < 2:
+            continue
+
+        first_with_hash = {}
+        for source in group:
+            try:
+                content_hash = hash_input(source)
+            except OSError as e:
+                logger.warning(f"Could not hash {source} for deduplication: {e}")
+                continue
+            primary = first_with_hash.setdefault(content_hash, source)
+            if primary is not source:
+                primary_of[id(source)] = primary
+                duplicates.setdefault(primary, []).append(source)
+
+    unique = [source for source in inputs if id(source) not in primary_of]
+    return unique, duplicates
+
+def clone_file(source_path, destination_path, mode="hardlink"):
+    """
+    Make destination_path have the same contents as source_path as cheaply as possible.
+
+    # Tries a hardlink, then a reflink, then gives up and copies. You can ask
+    # to skip straight to reflinks or copies if you don't want files sharing
+    # an inode (editing one hardlink edits them all, surprise!).
+
+    Returns:
+        The method that worked: "hardlink", "reflink" or "copy"
+    """
+    if os.path.lexists(destination_path):
+        os.remove(destination_path)
+
+    if mode == "hardlink":
+        try:
+            os.link(source_path, destination_path)
+            return "hardlink"
+        except OSError:
+            pass
+
+    if mode in ("hardlink", "reflink") and sys.platform.startswith("linux"):
+        try:
+            import fcntl
+            with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+            return "reflink"
+        except OSError:
+            if os.path.exists(destination_path):
+                os.remove(destination_path)
+
+    shutil.copyfile(source_path, destination_path)
+    return "copy"
+
+def rename_output(output_name, primary_base, duplicate_base):
+    """Turn one of the primary's output names into the duplicate's equivalent."""
+    filename = output_name.replace("\\", "/").rsplit("/", 1)[-1]
+    if filename.startswith(primary_base):
+        filename = duplicate_base + filename[len(primary_base):]
+    return f"{duplicate_base}/{filename}"
+
+class DedupReport:
+    """
+    Running tally of the work deduplication saved.
+
+    # Mostly here so the log can brag about how many gigabytes of
+    # copy-pasted brick textures we didn't process.
+    """
+
+    def __init__(self):
+        """Initialize an empty report."""
+        self.unique_inputs = 0
+        self.duplicate_inputs = 0
+        self.bytes_skipped = 0
+        self.methods = {}
+
+    def record(self, source, methods):
+        """Record one duplicate that was satisfied from its primary's outputs."""
+        self.duplicate_inputs += 1
+        try:
+            self.bytes_skipped += get_input_size(source)
+        except OSError:
+            pass
+        for method in methods:
+            self.methods[method] = self.methods.get(method, 0) + 1
+
+    def to_dict(self):
+        """Get the report as a plain dictionary."""
+        return {
+            "unique_inputs": self.unique_inputs,
+            "duplicate_inputs": self.duplicate_inputs,
+            "bytes_skipped": self.bytes_skipped,
+            "outputs_by_method": dict(self.methods)
+        }
+
+    def summary(self):
+        """Get a one-line human readable summary."""
+        total = self.unique_inputs + self.duplicate_inputs
+        saved = self.duplicate_inputs / total * 100 if total else 0
+        methods = ", ".join(f"{count} {method}" for method, count in sorted(self.methods.items())) or "none"
+        return (f"Deduplication: {self.duplicate_inputs} of {total} inputs were duplicates ({saved:.1f}% of the work, "
+                f"{self.bytes_skipped / (1024 * 1024):.1f} MB not processed), outputs: {methods}")
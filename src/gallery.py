@@ -0,0 +1,346 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+from src.logger import logger
+from src.config import config
+
+# Order the maps of a texture are shown in, anything else goes after them by name
+MAP_ORDER = ("original", "normal_map", "bump_map", "ao_roughness", "curvature", "cavity", "height_map", "packed")
+
+# Whole-factor reduction stops once the image is within this many times the thumbnail size
+THUMBNAIL_REDUCING_GAP = 2.0
+
+# How many thumbnails get written to the disk cache between checks of its size
+PRUNE_EVERY = 256
+
+def _map_order(map_name):
+    """Sort key putting the known maps first, sweeps right after their normal map."""
+    for index, known in enumerate(MAP_ORDER):
+        if map_name == known or map_name.startswith(f"{known}_k"):
+            return (index, map_name)
+    return (len(MAP_ORDER), map_name)
+
+def scan_results(export_dir):
+    """
+    List the processed textures in an export folder.
+
+    # One folder per texture and one PNG per map, so the folder name tells us
+    # the texture and the rest of the file name tells us the map. scandir
+    # only, no images are opened, so 20k outputs list in well under a second.
+    # Archive output is one file per shard and isn't listed.
+
+    Returns:
+        A list of {"name": texture name, "maps": [(map name, path), ...]} sorted by name
+    """
+    textures = []
+    try:
+        folders = [entry for entry in os.scandir(export_dir) if entry.is_dir()]
+    except FileNotFoundError:
+        return textures
+
+    for folder in folders:
+        prefix = f"{folder.name}_"
+        maps = []
+        try:
+            for entry in os.scandir(folder.path):
+                name, extension = os.path.splitext(entry.name)
+                # Temporary files of a write in progress end in .tmp and are skipped here too
+                if extension.lower() == ".png" and name.startswith(prefix) and entry.is_file():
+                    maps.append((name[len(prefix):], entry.path))
+        except OSError as e:
+            logger.warning(f"Could not list {folder.path}: {e}")
+            continue
+        if maps:
+            maps.sort(key=lambda item: _map_order(item[0]))
+            textures.append({"name": folder.name, "maps": maps})
+
+    textures.sort(key=lambda texture: texture["name"].lower())
+    return textures
+
+def visible_rows(top, height, row_height, count, overscan=1):
+    """
+    Get the rows a viewport shows, plus a few either side.
+
+    # The whole point of the gallery: however many textures there are, only
+    # the handful of rows on screen get drawn and get thumbnails.
+
+    Args:
+        top: Scroll offset of the viewport in pixels
+        height: Height of the viewport in pixels
+        row_height: Height of one row in pixels
+        count: Number of rows there are
+        overscan: Extra rows either side, so scrolling a little shows thumbnails already loaded
+
+    Returns:
+        A range of row indexes
+    """
+    if count <= 0 or row_height <= 0:
+        return range(0)
+    first = max(0, int(top // row_height) - overscan)
+    last = min(count, int((top + max(height, 0)) // row_height) + 1 + overscan)
+    return range(first, max(first, last))
+
+def make_thumbnail(path, size):
+    """
+    Decode a thumbnail of an image, reading as little of it as possible.
+
+    # thumbnail() asks the decoder for a draft first, which makes JPEGs decode
+    # straight at an eighth of the size, then shrinks by whole factors with
+    # reduce() before the final resample. A 16K map never gets resampled at
+    # full size, even if PNG still has to inflate all of it.
+    """
+    with Image.open(path) as image:
+        image.thumbnail((size, size), reducing_gap=THUMBNAIL_REDUCING_GAP)
+        # Already small enough and thumbnail() leaves it undecoded, the file closes below
+        image.load()
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        return image
+
+def thumbnail_key(path, size):
+    """Name a thumbnail in the disk cache, changing whenever the file does."""
+    stat = os.stat(path)
+    identity = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+class ThumbnailCache:
+    """
+    Thumbnails in memory, on disk, and decoded in the background when neither has them.
+
+    # The memory cache is a bounded LRU of decoded thumbnails, so scrolling
+    # back is free and a huge batch can't eat the RAM. The disk cache keeps
+    # them across sessions, keyed by path, modification time and size, so an
+    # overwritten map gets a new thumbnail. One loader thread works through
+    # whatever the gallery asked for last, most wanted first.
+    """
+
+    def __init__(self, cache_dir=None, size=None, memory_items=None, disk_mb=None):
+        """
+        Initialize the cache, the loader thread starts with the first request.
+
+        Args:
+            cache_dir: Folder for the disk cache, defaults to thumbnail_cache_directory from config
+            size: Longest side of a thumbnail in pixels, defaults to thumbnail_size from config
+            memory_items: Thumbnails kept in memory, defaults to thumbnail_memory_items from config
+            disk_mb: Size the disk cache is pruned to, defaults to thumbnail_cache_mb from config, 0 means no disk cache
+        """
+        self.cache_dir = cache_dir or config.get("thumbnail_cache_directory", "./cache/thumbnails/")
+        self.size = max(16, int(size or config.get("thumbnail_size", 128)))
+        self.memory_items = max(1, int(memory_items or config.get("thumbnail_memory_items", 512)))
+        if disk_mb is None:
+            disk_mb = config.get("thumbnail_cache_mb", 256)
+        self.disk_bytes = int(disk_mb * 1024 * 1024)
+        self.lock = threading.Condition()
+        self.memory = OrderedDict()
+        self.failed = set()
+        self.pending = []
+        self.callback = None
+        self.thread = None
+        self.closed = False
+        self.written = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "decoded": 0, "failed": 0}
+
+    def get(self, path):
+        """Get a thumbnail if it's in memory, without touching the disk."""
+        with self.lock:
+            image = self.memory.get(path)
+            if image is not None:
+                self.memory.move_to_end(path)
+                self.stats["memory_hits"] += 1
+            return image
+
+    def load(self, path):
+        """
+        Get a thumbnail from memory, the disk cache or the image itself, in that order.
+
+        Returns:
+            A PIL image no bigger than size on either side, or None if the image can't be read
+        """
+        image = self.get(path)
+        if image is not None:
+            return image
+
+        try:
+            key = thumbnail_key(path, self.size)
+        except OSError as e:
+            logger.warning(f"Could not make a thumbnail of {path}: {e}")
+            self._failed(path)
+            return None
+        cached_path = os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+        image = None
+        if self.disk_bytes > 0:
+            try:
+                with Image.open(cached_path) as cached:
+                    cached.load()
+                    image = cached
+                # Touched so pruning drops the least recently shown first
+                os.utime(cached_path)
+                self._count("disk_hits")
+            except (OSError, ValueError):
+                image = None
+
+        if image is None:
+            try:
+                image = make_thumbnail(path, self.size)
+            except Exception as e:
+                logger.warning(f"Could not make a thumbnail of {path}: {e}")
+                self._failed(path)
+                return None
+            self._count("decoded")
+            if self.disk_bytes > 0:
+                self._store(cached_path, image)
+
+        with self.lock:
+            self.memory[path] = image
+            self.memory.move_to_end(path)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+        return image
+
+    def _count(self, name):
+        """Count a cache outcome."""
+        with self.lock:
+            self.stats[name] += 1
+
+    def _failed(self, path):
+        """Remember a path that couldn't be thumbnailed, so nobody asks again."""
+        with self.lock:
+            self.stats["failed"] += 1
+            self.failed.add(path)
+
+    def unreadable(self, path):
+        """Check whether a path already failed to thumbnail."""
+        with self.lock:
+            return path in self.failed
+
+    def _store(self, cached_path, image):
+        """Write a thumbnail to the disk cache, atomically so a reader never sees half of one."""
+        temp_path = f"{cached_path}.{uuid.uuid4().hex[:12]}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            image.save(temp_path, format="PNG", compress_level=1)
+            os.replace(temp_path, cached_path)
+        except OSError as e:
+            # The cache is a nicety, the thumbnail still shows
+            logger.warning(f"Could not cache thumbnail {cached_path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        self.written += 1
+        if self.written % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """
+        Shrink the disk cache to its size limit, least recently shown first.
+
+        Returns:
+            Number of thumbnails removed
+        """
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"Pruned {removed} thumbnails from {self.cache_dir}")
+        return removed
+
+    def clear_memory(self):
+        """Forget the thumbnails in memory and the failures, the disk cache stays."""
+        with self.lock:
+            self.memory.clear()
+            self.failed.clear()
+
+    def request(self, paths, callback):
+        """
+        Load thumbnails in the background, replacing whatever was asked for before.
+
+        # The gallery asks for what's on screen every time it scrolls. Anything
+        # still pending from the last request has scrolled away, so it's
+        # dropped instead of being decoded ahead of what's visible now.
+
+        Args:
+            paths: Paths to load, most wanted first
+            callback: Called as callback(path, image) on the loader thread, image is None if unreadable
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.pending = [path for path in paths if path not in self.memory and path not in self.failed]
+            self.callback = callback
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loader, name="ThumbnailLoader", daemon=True)
+                self.thread.start()
+            self.lock.notify()
+
+    def _loader(self):
+        """Load requested thumbnails one at a time until closed."""
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.lock.wait()
+                if self.closed:
+                    return
+                path = self.pending.pop(0)
+                callback = self.callback
+            image = self.load(path)
+            if callback is not None:
+                try:
+                    callback(path, image)
+                except Exception as e:
+                    logger.exception(f"Error delivering thumbnail of {path}: {e}")
+
+    def close(self):
+        """Stop the loader thread, once it's done with the thumbnail in hand."""
+        with self.lock:
+            self.closed = True
+            self.pending = []
+            self.lock.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+if __name__ == "__main__":
+    # Thumbnail a whole export folder and show how the caches did
+    import sys
+    import time
+
+    export_dir = sys.argv[1] if len(sys.argv) > 1 else config.get("export_directory", "./export/")
+    started = time.perf_counter()
+    textures = scan_results(export_dir)
+    paths = [path for texture in textures for _, path in texture["maps"]]
+    print(f"Found {len(textures)} textures with {len(paths)} maps in {time.perf_counter() - started:.2f}s")
+
+    cache = ThumbnailCache()
+    started = time.perf_counter()
+    for path in paths:
+        cache.load(path)
+    print(f"Thumbnailed them in {time.perf_counter() - started:.2f}s: {cache.stats}")
@@ -0,0 +1,163 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import numpy as np
+import cv2
+from src.logger import logger
+from src.cancellation import checkpoint
+
+# Boundary handling height_boundary can ask for
+HEIGHT_BOUNDARIES = ("mirror", "periodic")
+
+# Largest side solved in one FFT, bigger images are solved in tiles of this size
+DEFAULT_TILE_SIZE = 2048
+
+# Smallest overlap around each tile, in pixels
+MIN_TILE_MARGIN = 64
+
+def _mirror(plane, negate_x, negate_y):
+    """
+    Mirror a gradient plane into a 2x2 block that's periodic.
+
+    # Mirroring the height flips the sign of the gradient across the mirror,
+    # so x gradients are negated in the left-right copies and y gradients
+    # in the top-bottom ones.
+    """
+    flipped = -plane[:, ::-1] if negate_x else plane[:, ::-1]
+    top = np.concatenate((plane, flipped), axis=1)
+    bottom = -top[::-1] if negate_y else top[::-1]
+    return np.concatenate((top, bottom), axis=0)
+
+def integrate_gradients(sobelx, sobely, boundary="mirror"):
+    """
+    Integrate a gradient field into a height field with a Frankot-Chellappa solve.
+
+    # Projects the gradients onto the nearest integrable surface in the
+    # frequency domain, which is one FFT per gradient plane and one inverse,
+    # O(n log n) instead of thousands of relaxation sweeps. Periodic treats the
+    # texture as tiling, mirror reflects it at the edges so a texture that
+    # doesn't tile doesn't get its left and right sides pulled together.
+
+    Returns:
+        float32 height field, zero mean, in the units of the gradients
+    """
+    if boundary not in HEIGHT_BOUNDARIES:
+        raise ValueError(f"Unknown height boundary: {boundary}")
+    height, width = sobelx.shape
+    sobelx = np.asarray(sobelx, dtype=np.float32)
+    sobely = np.asarray(sobely, dtype=np.float32)
+    if boundary == "mirror":
+        sobelx = _mirror(sobelx, True, False)
+        sobely = _mirror(sobely, False, True)
+    rows, columns = sobelx.shape
+
+    # Angular frequencies, half a spectrum along x since the field is real
+    wx = (2 * np.pi * np.fft.rfftfreq(columns)).astype(np.float32)[np.newaxis, :]
+    wy = (2 * np.pi * np.fft.fftfreq(rows)).astype(np.float32)[:, np.newaxis]
+    denominator = wx * wx + wy * wy
+    denominator[0, 0] = 1.0
+
+    # Z = -j (wx Gx + wy Gy) / (wx^2 + wy^2), built up in place
+    spectrum = np.fft.rfft2(sobelx)
+    spectrum *= wx
+    spectrum_y = np.fft.rfft2(sobely)
+    spectrum_y *= wy
+    spectrum += spectrum_y
+    del spectrum_y, sobelx, sobely
+    spectrum *= -1j
+    spectrum /= denominator
+    spectrum[0, 0] = 0
+
+    return np.fft.irfft2(spectrum, s=(rows, columns))[:height, :width].astype(np.float32, copy=False)
+
+def _lowpass(plane, factor):
+    """Keep only what survives a round trip through a grid factor times coarser."""
+    height, width = plane.shape
+    coarse = cv2.resize(plane, (-(-width // factor), -(-height // factor)), interpolation=cv2.INTER_AREA)
+    return cv2.resize(coarse, (width, height), interpolation=cv2.INTER_LINEAR)
+
+def integrate_gradients_tiled(sobelx, sobely, boundary="mirror", tile_size=DEFAULT_TILE_SIZE, cancel=None):
+    """
+    Integrate a gradient field into a height field with memory bounded by the tile size.
+
+    # An 8K mirrored solve wants gigabytes of complex spectra. Instead the whole
+    # field is solved once at a resolution that fits in a tile, for the broad
+    # shape, and the fine detail is solved tile by tile with an overlap that
+    # gets thrown away. Each tile only contributes what the coarse solve
+    # couldn't see, so the tiles' unknown offsets don't matter and there are
+    # no seams to blend. A cancel token is checked before every tile.
+
+    Returns:
+        float32 height field, in the units of the gradients
+    """
+    if boundary not in HEIGHT_BOUNDARIES:
+        raise ValueError(f"Unknown height boundary: {boundary}")
+    height, width = sobelx.shape
+    if max(height, width) <= tile_size:
+        return integrate_gradients(sobelx, sobely, boundary)
+
+    # Broad shape from gradients averaged down to tile size, scaled to per coarse pixel
+    factor = -(-max(height, width) // tile_size)
+    logger.debug(f"Integrating {width}x{height} height field in tiles of {tile_size}, broad shape at 1/{factor} scale")
+    coarse_size = (-(-width // factor), -(-height // factor))
+    coarse_x = cv2.resize(sobelx, coarse_size, interpolation=cv2.INTER_AREA) * np.float32(factor)
+    coarse_y = cv2.resize(sobely, coarse_size, interpolation=cv2.INTER_AREA) * np.float32(factor)
+    coarse = integrate_gradients(coarse_x, coarse_y, boundary)
+    del coarse_x, coarse_y
+    height_field = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_LINEAR)
+    del coarse
+
+    # Fine detail tile by tile, on a grid that lines up with the coarse one
+    core = max(factor, tile_size // factor * factor)
+    margin = -(-max(MIN_TILE_MARGIN, 4 * factor) // factor) * factor
+    for top in range(0, height, core):
+        for left in range(0, width, core):
+            checkpoint(cancel)
+            bottom = min(top + core, height)
+            right = min(left + core, width)
+            if boundary == "periodic":
+                # Wrap around the edges, the texture tiles
+                rows = np.arange(top - margin, bottom + margin) % height
+                columns = np.arange(left - margin, right + margin) % width
+                tile_x = sobelx[np.ix_(rows, columns)]
+                tile_y = sobely[np.ix_(rows, columns)]
+                offset_y, offset_x = margin, margin
+            else:
+                # Stop at the edges, the mirrored tile solve reflects there like the coarse one
+                row_start, column_start = max(0, top - margin), max(0, left - margin)
+                tile_x = sobelx[row_start:min(height, bottom + margin), column_start:min(width, right + margin)]
+                tile_y = sobely[row_start:min(height, bottom + margin), column_start:min(width, right + margin)]
+                offset_y, offset_x = top - row_start, left - column_start
+
+            tile = integrate_gradients(tile_x, tile_y, "mirror")
+            tile -= _lowpass(tile, factor)
+            height_field[top:bottom, left:right] += tile[offset_y:offset_y + bottom - top,
+                                                         offset_x:offset_x + right - left]
+
+    return height_field
+
+def height_to_image(height_field):
+    """Stretch a height field over the full 8-bit range, mid grey if it's flat."""
+    low, high = float(height_field.min()), float(height_field.max())
+    if high - low <= 0:
+        return np.full(height_field.shape, 127, dtype=np.uint8)
+    scaled = height_field - np.float32(low)
+    scaled *= np.float32(255.0 / (high - low))
+    return scaled.astype(np.uint8)
+
+if __name__ == "__main__":
+    # Integrate an 8K texture, tiled
+    import sys
+    import time
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 8192
+    rng = np.random.default_rng(1)
+    gray_image = cv2.GaussianBlur(rng.integers(0, 256, (size, size), dtype=np.uint8), (0, 0), 4)
+    sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=5)
+    sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=5)
+    for boundary in HEIGHT_BOUNDARIES:
+        started = time.perf_counter()
+        height_map = height_to_image(integrate_gradients_tiled(sobelx, sobely, boundary))
+        print(f"{size}x{size} {boundary}: {time.perf_counter() - started:.2f}s")
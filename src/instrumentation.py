@@ -0,0 +1,267 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from src.tracer import tracer
+
+# Stages of process_image, in the order they run
+STAGES = ("decode", "grayscale", "normal_map", "bump_map", "ao_roughness", "curvature", "cavity", "height_map", "pack", "save")
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def get_rss_bytes():
+    """
+    Get the resident memory of this process in bytes, or None if we can't tell.
+
+    # psutil if it's installed, /proc on Linux, and the Windows API otherwise.
+    # No extra dependency just to print a number in a corner of the window.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except Exception:
+            pass
+    return None
+
+class PerformanceMonitor:
+    """
+    Cheap running totals of what the processor is doing.
+
+    # Every stage of every image adds its time here, which costs a clock read
+    # and a dict update under a lock. Nothing is computed until somebody asks
+    # for a snapshot, and the dashboard only asks once a second or so.
+    # While the tracer is recording, the same timings become trace spans.
+    """
+
+    def __init__(self):
+        """Initialize the monitor with everything at zero."""
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.files_processed = 0
+        self.files_failed = 0
+        self.pixels_processed = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        # Per-bucket (not cumulative) counts, one more than there are bounds
+        self.stage_histograms = {stage: [0] * (len(LATENCY_BUCKETS) + 1) for stage in STAGES}
+        self.job_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queue_depth = 0
+        self.busy_seconds = 0.0
+        self.active_jobs = 0
+        # Sum of the start times of the running jobs, so their busy time so far is one multiply away
+        self.active_started_sum = 0.0
+        self.workers = 1
+
+    def set_workers(self, workers):
+        """Set how many workers are processing, for the utilisation figure."""
+        with self.lock:
+            self.workers = max(1, int(workers))
+
+    def set_queue_depth(self, depth):
+        """Set how many images are waiting for a worker."""
+        self.queue_depth = depth
+
+    @contextmanager
+    def stage(self, name):
+        """Time one stage of processing an image."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            if tracer.active:
+                tracer.record(name, started, ended)
+            elapsed = ended - started
+            bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+            with self.lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+                histogram = self.stage_histograms.get(name)
+                if histogram is None:
+                    histogram = self.stage_histograms[name] = [0] * (len(LATENCY_BUCKETS) + 1)
+                histogram[bucket] += 1
+
+    def job_started(self, key=None):
+        """
+        Mark a worker as busy with an image.
+
+        Args:
+            key: The image being processed, for the tracer's sampling
+
+        Returns:
+            Start time to hand back to job_finished
+        """
+        if tracer.active:
+            tracer.begin_job(key)
+        started = time.perf_counter()
+        with self.lock:
+            self.active_jobs += 1
+            self.active_started_sum += started
+        return started
+
+    def job_finished(self, started, success, pixels=0, bytes_read=0, cancelled=False):
+        """Mark a worker as done with an image, a cancelled one counts as neither processed nor failed."""
+        ended = time.perf_counter()
+        if tracer.active:
+            tracer.record("process_image", started, ended, "job", {"success": success, "pixels": pixels})
+            tracer.end_job()
+        elapsed = ended - started
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+        with self.lock:
+            self.active_jobs -= 1
+            self.active_started_sum -= started
+            self.busy_seconds += elapsed
+            self.job_histogram[bucket] += 1
+            if success:
+                self.files_processed += 1
+                self.pixels_processed += pixels
+                self.bytes_read += bytes_read
+            elif not cancelled:
+                self.files_failed += 1
+
+    def add_bytes_written(self, count):
+        """Count bytes written to the export directory or archive."""
+        with self.lock:
+            self.bytes_written += count
+
+    def add_stages(self, stages):
+        """
+        Add stage timings measured somewhere else, like in a worker process.
+
+        Args:
+            stages: Dict from stage_changes, stage -> (seconds, histogram counts)
+        """
+        with self.lock:
+            for name, (seconds, counts) in stages.items():
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+                histogram = self.stage_histograms.get(name)
+                if histogram is None:
+                    histogram = self.stage_histograms[name] = [0] * (len(LATENCY_BUCKETS) + 1)
+                for bucket, count in enumerate(counts):
+                    histogram[bucket] += count
+
+    def snapshot(self):
+        """
+        Get the running totals right now.
+
+        # Busy time includes the jobs still running, up to this moment, so
+        # utilisation doesn't jump around when a long image finally finishes.
+        """
+        with self.lock:
+            now = time.perf_counter()
+            return {
+                "time": now,
+                "files_processed": self.files_processed,
+                "files_failed": self.files_failed,
+                "pixels_processed": self.pixels_processed,
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "stage_seconds": dict(self.stage_seconds),
+                "stage_histograms": {stage: list(counts) for stage, counts in self.stage_histograms.items()},
+                "job_histogram": list(self.job_histogram),
+                "job_seconds": self.busy_seconds,
+                "queue_depth": self.queue_depth,
+                "busy_seconds": self.busy_seconds + self.active_jobs * now - self.active_started_sum,
+                "active_jobs": self.active_jobs,
+                "workers": self.workers
+            }
+
+def stage_changes(previous, current):
+    """
+    Get the stage timings added between two snapshots, for another monitor's add_stages.
+
+    # Worker processes have a monitor of their own that nobody watches.
+    # This is the small part of it worth sending back with each job.
+
+    Returns:
+        Dict of stage -> (seconds, histogram counts), only stages that ran
+    """
+    changes = {}
+    for stage, counts in current["stage_histograms"].items():
+        before = previous["stage_histograms"].get(stage)
+        delta = [count - (before[bucket] if before else 0) for bucket, count in enumerate(counts)]
+        if any(delta):
+            seconds = current["stage_seconds"].get(stage, 0.0) - previous["stage_seconds"].get(stage, 0.0)
+            changes[stage] = (seconds, delta)
+    return changes
+
+def compute_rates(previous, current):
+    """
+    Turn two snapshots into the rates the dashboard shows.
+
+    Returns:
+        Dict with megapixels_per_second, files_per_second, bytes_written_per_second,
+        utilisation (0-1), stage_share (stage -> fraction of stage time) and rss_bytes
+    """
+    elapsed = max(current["time"] - previous["time"], 1e-9)
+    files = (current["files_processed"] + current["files_failed"]
+             - previous["files_processed"] - previous["files_failed"])
+
+    busy = current["busy_seconds"] - previous["busy_seconds"]
+    stage_delta = {
+        stage: current["stage_seconds"].get(stage, 0.0) - previous["stage_seconds"].get(stage, 0.0)
+        for stage in current["stage_seconds"]
+    }
+    total_stage = sum(stage_delta.values())
+
+    return {
+        "megapixels_per_second": (current["pixels_processed"] - previous["pixels_processed"]) / 1e6 / elapsed,
+        "files_per_second": files / elapsed,
+        "bytes_written_per_second": (current["bytes_written"] - previous["bytes_written"]) / elapsed,
+        "utilisation": min(1.0, busy / (elapsed * current["workers"])),
+        "active_jobs": current["active_jobs"],
+        "workers": current["workers"],
+        "stage_share": {stage: seconds / total_stage for stage, seconds in stage_delta.items()
+                        if total_stage > 0 and seconds > 0},
+        "rss_bytes": get_rss_bytes()
+    }
+
+# Create a global instance of the monitor
+monitor = PerformanceMonitor()
+
+if __name__ == "__main__":
+    # Show what the monitor sees while a directory is processed
+    if len(sys.argv) > 1:
+        from src.texture_processor import processor
+        before = monitor.snapshot()
+        processor.process_directory(sys.argv[1])
+        rates = compute_rates(before, monitor.snapshot())
+        for key, value in rates.items():
+            print(f"{key}: {value}")
+    else:
+        print("Usage: python -m src.instrumentation <input_directory>")
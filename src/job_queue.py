@@ -0,0 +1,186 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import heapq
+import threading
+from collections import deque
+from src.logger import logger
+from src.archive_input import ArchiveMember
+
+# Ways the queue can be ordered, pinned files always go first
+QUEUE_ORDERS = ("selection", "smallest_first", "largest_first")
+
+def source_key(source):
+    """
+    Identify a queued file by what it is rather than which object holds it.
+
+    # Object ids get reused once something is garbage collected, paths don't.
+    # Archive members are their archive's path plus their name inside it.
+    """
+    if isinstance(source, ArchiveMember):
+        return (os.path.normcase(os.path.abspath(source.reader.archive_path)), source.name)
+    return os.path.normcase(os.path.abspath(str(source)))
+
+class JobQueue:
+    """
+    Thread-safe queue of files waiting to be processed, with priorities.
+
+    # A list with opinions. Knows how big every file is (from its header),
+    # which ones the artist pinned, and hands them out pinned first, then in
+    # whatever order was picked. Smallest first gets most textures back soonest.
+    # Kept as a heap, so taking the next file is O(log n) even at 100k files.
+    # Changing the order or a pin rebuilds it, which is O(n) but rare.
+    """
+
+    def __init__(self, order="selection"):
+        """Initialize an empty queue."""
+        self.lock = threading.Lock()
+        self.heap = []
+        # Entries put back after a cancel, handed out before anything else
+        self.front = deque()
+        self.pinned = set()
+        self.sequence = 0
+        self.pixels = 0
+        self.order = order if order in QUEUE_ORDERS else "selection"
+
+    def add(self, sources):
+        """
+        Add files or archive members to the queue.
+
+        # Reads each header for the pixel count. Unreadable files still get
+        # queued (processing will report the real error) but count as zero pixels.
+        # The header (or the error) is kept so the batch planner needn't read it again.
+        """
+        return self.add_entries(self.read_entries(sources))
+
+    @staticmethod
+    def read_entries(sources):
+        """
+        Read the headers of files or archive members into entries, without queuing them.
+
+        # The slow half of add, and it doesn't touch the queue, so a GUI can
+        # run it in the background and hand the entries over with add_entries.
+        """
+        # Import here, the scheduler pulls in OpenCV and the GUI starts without it
+        from src.scheduler import read_image_header
+
+        added = []
+        for source in sources:
+            try:
+                header = read_image_header(source)
+                pixels = header["width"] * header["height"]
+            except Exception as e:
+                logger.warning(f"Could not read image header for {source}: {e}")
+                header = {"error": str(e)}
+                pixels = 0
+            added.append({"source": source, "pixels": pixels, "header": header})
+        return added
+
+    def add_entries(self, added):
+        """Queue entries made by read_entries."""
+        with self.lock:
+            for entry in added:
+                entry["sequence"] = self.sequence
+                self.sequence += 1
+                self.pixels += entry["pixels"]
+                heapq.heappush(self.heap, (self._sort_key(entry), entry["sequence"], entry))
+        return len(added)
+
+    def _sort_key(self, entry):
+        """Get the sort key for an entry under the current order."""
+        pinned = 0 if self.pinned and source_key(entry["source"]) in self.pinned else 1
+        if self.order == "smallest_first":
+            return (pinned, entry["pixels"], entry["sequence"])
+        if self.order == "largest_first":
+            return (pinned, -entry["pixels"], entry["sequence"])
+        return (pinned, entry["sequence"])
+
+    def _rebuild(self):
+        """Re-sort the heap after the order or a pin changed (lock held)."""
+        self.heap = [(self._sort_key(entry), sequence, entry) for _, sequence, entry in self.heap]
+        heapq.heapify(self.heap)
+
+    def set_order(self, order):
+        """Change the order files are handed out in."""
+        if order not in QUEUE_ORDERS:
+            raise ValueError(f"Unknown queue order: {order}")
+        with self.lock:
+            if order != self.order:
+                self.order = order
+                self._rebuild()
+
+    def pin(self, sources, pinned=True):
+        """Pin files so they're processed before everything else, or unpin them."""
+        with self.lock:
+            for source in sources:
+                if pinned:
+                    self.pinned.add(source_key(source))
+                else:
+                    self.pinned.discard(source_key(source))
+            self._rebuild()
+
+    def is_pinned(self, source):
+        """Check whether a file is pinned."""
+        with self.lock:
+            return source_key(source) in self.pinned
+
+    def pop_next(self):
+        """
+        Take the highest priority entry off the queue.
+
+        Returns:
+            The entry dict ({"source", "pixels", "header", "sequence"}) or None when empty
+        """
+        with self.lock:
+            if self.front:
+                entry = self.front.popleft()
+            elif self.heap:
+                entry = heapq.heappop(self.heap)[2]
+            else:
+                return None
+            self.pixels -= entry["pixels"]
+            self.pinned.discard(source_key(entry["source"]))
+            return entry
+
+    def push_front(self, entry):
+        """Put an entry back at the front, for when processing it didn't happen after all."""
+        with self.lock:
+            self.front.appendleft(entry)
+            self.pixels += entry["pixels"]
+
+    def head(self, count):
+        """Get the first count entries in the order they'll be processed."""
+        with self.lock:
+            entries = list(self.front)[:count]
+            if len(entries) < count:
+                entries += [item[2] for item in heapq.nsmallest(count - len(entries), self.heap)]
+            return entries
+
+    def snapshot(self):
+        """Get the queued entries in the order they'll be processed."""
+        with self.lock:
+            return list(self.front) + [item[2] for item in sorted(self.heap)]
+
+    def remaining_pixels(self):
+        """Get the total pixel count of everything still queued."""
+        with self.lock:
+            return self.pixels
+
+    def clear(self):
+        """Empty the queue."""
+        with self.lock:
+            self.heap = []
+            self.front = deque()
+            self.pinned = set()
+            self.pixels = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.heap) + len(self.front)
+
+    def __bool__(self):
+        return len(self) > 0
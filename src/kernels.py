@@ -0,0 +1,223 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import numpy as np
+from src.logger import logger
+from src.config import config
+
+# Backends kernel_backend can ask for, "auto" takes Numba when it works
+KERNEL_BACKENDS = ("auto", "numba", "numpy")
+
+def _scale_for(plane):
+    """Get what a gradient plane is divided by, 1 for a flat image instead of 0."""
+    scale = np.max(np.abs(plane))
+    return scale if scale > 0 else np.float32(1.0)
+
+def normal_map_numpy(sobelx, sobely):
+    """
+    Pack Sobel gradients into an RGB normal map with NumPy.
+
+    # The reference the Numba kernel has to match bit for bit. Works in
+    # place on one float32 temporary per plane and writes the uint8 result
+    # directly, instead of building a float32 RGB map first.
+    """
+    normal_map = np.empty((sobelx.shape[0], sobelx.shape[1], 3), dtype=np.uint8)
+    for channel, plane in enumerate((sobelx, sobely)):
+        pack_normal_channel(plane, _scale_for(plane), normal_map[:, :, channel])
+    normal_map[:, :, 2] = 255
+    return normal_map
+
+def pack_normal_channel(plane, scale, channel):
+    """
+    Write one gradient plane, divided by its scale, into a channel of a normal map.
+
+    # Split out so a normal map can be packed a band at a time with the
+    # scale of the whole image, and still come out byte for byte the same.
+    """
+    plane = plane / scale
+    plane *= np.float32(0.5)
+    plane += np.float32(0.5)
+    plane *= np.float32(255.0)
+    # Same truncation as astype(np.uint8)
+    channel[...] = plane
+
+def invert_numpy(gray_image):
+    """Invert a grayscale image with NumPy."""
+    return 255 - gray_image
+
+def _load_numba():
+    """
+    Compile the Numba kernels.
+
+    # Parallel loops need a threading layer that's safe to call from several
+    # threads at once, because the scheduler runs images in threads. Without
+    # TBB or OpenMP the kernels are compiled serial, still fused into a single
+    # pass and still releasing the GIL, so the worker threads run them side by side.
+    # The compiled code is cached on disk, so worker processes and the writer
+    # load it instead of compiling it all over again each time they start.
+
+    Returns:
+        (normal map function, invert function, description)
+    """
+    import numba
+
+    def build(parallel):
+        # Both variants come from the same source, so they need their own cache
+        # folders or one would be loaded in place of the other
+        previous = numba.config.CACHE_DIR
+        numba.config.CACHE_DIR = os.path.abspath(os.path.join(config.get("kernel_cache_directory", "./cache/kernels/"),
+                                                              "parallel" if parallel else "serial"))
+        try:
+            return compile_kernels(parallel)
+        finally:
+            numba.config.CACHE_DIR = previous
+
+    def compile_kernels(parallel):
+        @numba.njit(parallel=parallel, nogil=True, cache=True)
+        def abs_max(plane):
+            rows, columns = plane.shape
+            row_max = np.zeros(rows, dtype=np.float32)
+            for y in numba.prange(rows):
+                largest = np.float32(0.0)
+                for x in range(columns):
+                    value = abs(plane[y, x])
+                    if value > largest:
+                        largest = value
+                row_max[y] = largest
+            return row_max.max()
+
+        @numba.njit(parallel=parallel, nogil=True, cache=True)
+        def pack(sobelx, sobely, scale_x, scale_y, normal_map):
+            # Defined in here rather than as a kernel of its own, a kernel
+            # pack closed over would change the cache key on every load
+            def to_byte(value, scale):
+                # Round to float32 after every step like NumPy does, or the
+                # result can land a hair under a whole number and truncate to the one below
+                value = np.float32(value / scale)
+                value = np.float32(value * np.float32(0.5) + np.float32(0.5))
+                return np.uint8(np.float32(value * np.float32(255.0)))
+
+            rows, columns = sobelx.shape
+            for y in numba.prange(rows):
+                for x in range(columns):
+                    normal_map[y, x, 0] = to_byte(sobelx[y, x], scale_x)
+                    normal_map[y, x, 1] = to_byte(sobely[y, x], scale_y)
+                    normal_map[y, x, 2] = 255
+
+        @numba.njit(parallel=parallel, nogil=True, cache=True)
+        def invert(gray_image, inverted):
+            rows, columns = gray_image.shape
+            for y in numba.prange(rows):
+                for x in range(columns):
+                    inverted[y, x] = 255 - gray_image[y, x]
+
+        return abs_max, pack, invert
+
+    try:
+        numba.config.THREADING_LAYER = "threadsafe"
+        abs_max, pack, invert = build(True)
+        description = "parallel"
+        _self_test(abs_max, pack, invert)
+    except Exception as e:
+        logger.info(f"Parallel Numba kernels unavailable ({e}), compiling serial ones")
+        numba.config.THREADING_LAYER = "default"
+        abs_max, pack, invert = build(False)
+        description = "serial"
+        _self_test(abs_max, pack, invert)
+
+    def normal_map_numba(sobelx, sobely):
+        """Pack Sobel gradients into an RGB normal map in one parallel pass."""
+        if sobelx.dtype != np.float32 or sobely.dtype != np.float32:
+            return normal_map_numpy(sobelx, sobely)
+        sobelx = np.ascontiguousarray(sobelx)
+        sobely = np.ascontiguousarray(sobely)
+        scale_x = abs_max(sobelx)
+        scale_y = abs_max(sobely)
+        normal_map = np.empty((sobelx.shape[0], sobelx.shape[1], 3), dtype=np.uint8)
+        pack(sobelx, sobely, scale_x if scale_x > 0 else np.float32(1.0),
+             scale_y if scale_y > 0 else np.float32(1.0), normal_map)
+        return normal_map
+
+    def invert_numba(gray_image):
+        """Invert a grayscale image in one parallel pass."""
+        if gray_image.dtype != np.uint8 or gray_image.ndim != 2:
+            return invert_numpy(gray_image)
+        inverted = np.empty_like(gray_image)
+        invert(np.ascontiguousarray(gray_image), inverted)
+        return inverted
+
+    return normal_map_numba, invert_numba, f"numba {numba.__version__} ({description})"
+
+def _self_test(abs_max, pack, invert):
+    """
+    Compile the kernels on a small image and make sure they match NumPy exactly.
+
+    # Runs on cached kernels too, a stale or broken cache fails it the same
+    # way a bad compile does.
+    """
+    rng = np.random.default_rng(0)
+    sobelx = rng.normal(0, 100, (37, 53)).astype(np.float32)
+    sobely = rng.normal(0, 100, (37, 53)).astype(np.float32)
+    # A value that truncates differently if any step skips the float32 rounding
+    sobelx[0, :2] = (-51.21751, 567.84625)
+    normal_map = np.empty((37, 53, 3), dtype=np.uint8)
+    pack(sobelx, sobely, abs_max(sobelx), abs_max(sobely), normal_map)
+    if not np.array_equal(normal_map, normal_map_numpy(sobelx, sobely)):
+        raise RuntimeError("Numba normal map differs from NumPy")
+
+    gray_image = rng.integers(0, 256, (37, 53), dtype=np.uint8)
+    inverted = np.empty_like(gray_image)
+    invert(gray_image, inverted)
+    if not np.array_equal(inverted, invert_numpy(gray_image)):
+        raise RuntimeError("Numba inversion differs from NumPy")
+
+def select_backend(requested=None):
+    """
+    Pick the kernel backend, once, at startup.
+
+    # Numba if it's installed, compiles and agrees with NumPy on a test
+    # image. NumPy otherwise, which is always there and gives the same bytes.
+
+    Returns:
+        (normal map function, invert function, backend name)
+    """
+    if requested is None:
+        requested = config.get("kernel_backend", "auto")
+    if requested not in KERNEL_BACKENDS:
+        logger.warning(f"Unknown kernel backend {requested}, using auto")
+        requested = "auto"
+
+    if requested != "numpy":
+        try:
+            return _load_numba()
+        except ImportError:
+            if requested == "numba":
+                logger.warning("Numba kernels requested but Numba isn't installed, using NumPy")
+        except Exception as e:
+            logger.warning(f"Numba kernels unavailable, using NumPy: {e}")
+    return normal_map_numpy, invert_numpy, "numpy"
+
+# Select the backend once for the whole process
+normal_map_from_gradients, invert_image, backend = select_backend()
+logger.info(f"Using {backend} kernels")
+
+if __name__ == "__main__":
+    # Compare the backends on a 4K image
+    import time
+    rng = np.random.default_rng(1)
+    sobelx = rng.normal(0, 100, (4096, 4096)).astype(np.float32)
+    sobely = rng.normal(0, 100, (4096, 4096)).astype(np.float32)
+    gray_image = rng.integers(0, 256, (4096, 4096), dtype=np.uint8)
+    for name, (normal_map_function, invert_function) in {
+        "numpy": (normal_map_numpy, invert_numpy),
+        backend: (normal_map_from_gradients, invert_image)
+    }.items():
+        started = time.perf_counter()
+        normal_map = normal_map_function(sobelx, sobely)
+        inverted = invert_function(gray_image)
+        print(f"{name}: {time.perf_counter() - started:.3f}s")
+    print(f"Identical: {np.array_equal(normal_map, normal_map_numpy(sobelx, sobely)) and np.array_equal(inverted, invert_numpy(gray_image))}")
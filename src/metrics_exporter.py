@@ -0,0 +1,203 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.logger import logger
+from src.config import config
+from src.instrumentation import monitor, get_rss_bytes, LATENCY_BUCKETS
+
+# Prefix of every metric name we export
+METRIC_PREFIX = "texturenormaliser"
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_value(value):
+    """Format a number the way Prometheus expects."""
+    if isinstance(value, float) and value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def _histogram_lines(name, counts, total, labels=""):
+    """Render one histogram's cumulative buckets, sum and count."""
+    separator = "," if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{_format_value(float(bound))}"}} {cumulative}')
+    label_block = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{label_block} {_format_value(float(total))}")
+    lines.append(f"{name}_count{label_block} {cumulative}")
+    return lines
+
+def render_metrics(snapshot=None):
+    """
+    Render the monitor's totals in the Prometheus text format.
+
+    # Counters, gauges and histograms, hand-rolled because the format is
+    # a dozen lines of string formatting and prometheus_client is a dependency.
+    """
+    if snapshot is None:
+        snapshot = monitor.snapshot()
+
+    lines = []
+
+    def metric(name, kind, help_text, value):
+        full_name = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        lines.append(f"{full_name} {_format_value(value)}")
+
+    metric("files_processed_total", "counter", "Images processed successfully.", snapshot["files_processed"])
+    metric("files_failed_total", "counter", "Images that failed to process.", snapshot["files_failed"])
+    metric("pixels_processed_total", "counter", "Pixels in the images processed successfully.", snapshot["pixels_processed"])
+    metric("input_bytes_total", "counter", "Bytes of input images processed successfully.", snapshot["bytes_read"])
+    metric("output_bytes_total", "counter", "Bytes written to the export directory or archive.", snapshot["bytes_written"])
+    metric("worker_busy_seconds_total", "counter", "Seconds workers spent processing images.", float(snapshot["busy_seconds"]))
+    metric("active_jobs", "gauge", "Images being processed right now.", snapshot["active_jobs"])
+    metric("workers", "gauge", "Workers processing images.", snapshot["workers"])
+    metric("queue_depth", "gauge", "Images waiting for a worker.", snapshot["queue_depth"])
+
+    rss = get_rss_bytes()
+    if rss is not None:
+        metric("resident_memory_bytes", "gauge", "Resident memory of the process.", rss)
+
+    name = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines.append(f"# HELP {name} Time spent in each stage of processing an image.")
+    lines.append(f"# TYPE {name} histogram")
+    for stage, counts in snapshot["stage_histograms"].items():
+        lines.extend(_histogram_lines(name, counts, snapshot["stage_seconds"].get(stage, 0.0), f'stage="{stage}"'))
+
+    name = f"{METRIC_PREFIX}_image_duration_seconds"
+    lines.append(f"# HELP {name} Time spent processing each image.")
+    lines.append(f"# TYPE {name} histogram")
+    lines.extend(_histogram_lines(name, snapshot["job_histogram"], snapshot["job_seconds"]))
+
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path):
+    """
+    Write the metrics to a file for node-exporter's textfile collector.
+
+    # Written next to the target and renamed over it, so the collector never
+    # scrapes a half-written file.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(render_metrics())
+    os.replace(temp_path, path)
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves /metrics, and nothing else."""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Every scrape in the log file would bury the stuff that matters
+        pass
+
+class MetricsExporter:
+    """
+    Exposes the processor's metrics for headless runs.
+
+    # A Prometheus endpoint on localhost for anything that can scrape, and a
+    # .prom file rewritten every few seconds for boxes that only run
+    # node-exporter. Both read the same monitor totals the GUI dashboard uses.
+    """
+
+    def __init__(self, port=None, textfile_path=None, interval=None, host="127.0.0.1"):
+        """Initialize the exporter from arguments, falling back to the configuration."""
+        self.port = config.get("metrics_port", 0) if port is None else port
+        self.textfile_path = config.get("metrics_textfile", "") if textfile_path is None else textfile_path
+        self.interval = config.get("metrics_interval_s", 15) if interval is None else interval
+        self.host = host
+        self.server = None
+        self.server_thread = None
+        self.writer_thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def enabled(self):
+        """Check whether there's anything to export to."""
+        return bool(self.port) or bool(self.textfile_path)
+
+    def start(self):
+        """Start the endpoint and the textfile writer, whichever are configured."""
+        if self.port:
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+            self.server.daemon_threads = True
+            self.port = self.server.server_address[1]
+            self.server_thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+            self.server_thread.start()
+            logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+        if self.textfile_path:
+            self.writer_thread = threading.Thread(target=self._write_periodically, name="MetricsTextfile", daemon=True)
+            self.writer_thread.start()
+            logger.info(f"Writing metrics to {self.textfile_path} every {self.interval}s")
+        return self
+
+    def _write_periodically(self):
+        """Rewrite the textfile until stopped (runs in the writer thread)."""
+        while True:
+            try:
+                write_textfile(self.textfile_path)
+            except OSError as e:
+                logger.error(f"Error writing metrics textfile {self.textfile_path}: {e}")
+            if self.stopping.wait(max(1, self.interval)):
+                return
+
+    def stop(self):
+        """Stop exporting, writing the textfile one last time so it has the final totals."""
+        self.stopping.set()
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+            self.writer_thread = None
+            try:
+                write_textfile(self.textfile_path)
+            except OSError as e:
+                logger.error(f"Error writing metrics textfile {self.textfile_path}: {e}")
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+if __name__ == "__main__":
+    # Print the current metrics, or serve them on a port
+    if len(sys.argv) > 1:
+        exporter = MetricsExporter(port=int(sys.argv[1])).start()
+        print(f"Serving metrics on http://127.0.0.1:{exporter.port}/metrics, press Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            exporter.stop()
+    else:
+        print(render_metrics(), end="")
@@ -0,0 +1,630 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import io
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import tarfile
+import zipfile
+import threading
+from datetime import datetime
+from PIL import Image
+from src.logger import logger
+from src.config import config
+from src.dedup import clone_file
+from src.instrumentation import monitor
+from src.tracer import tracer
+
+# Size of a tar block, everything in a tar is padded to a multiple of this
+TAR_BLOCK_SIZE = 512
+
+# Suffix of outputs that are still being written, they only get their real name once complete
+TEMP_SUFFIX = ".tmp"
+
+# Names temp_path_for makes: <output>.<12 hex digits>.tmp
+TEMP_NAME_PATTERN = re.compile(r"\.[0-9a-f]{12}" + re.escape(TEMP_SUFFIX) + "$")
+
+# Output folders this process already swept for stale temp files
+_swept_dirs = set()
+_swept_lock = threading.Lock()
+
+def fsync_file(path):
+    """Flush a file's data to disk."""
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        # fdatasync skips flushing metadata we don't care about, where it exists
+        getattr(os, "fdatasync", os.fsync)(fd)
+    finally:
+        os.close(fd)
+
+def fsync_directory(directory):
+    """
+    Flush a directory's entries to disk, so renames and new names survive a crash.
+
+    # Windows can't open a directory like this, and NTFS journals renames
+    # anyway, so there it quietly does nothing.
+    """
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def temp_path_for(path):
+    """Get a unique temporary name next to path, for writing it atomically."""
+    return f"{path}.{uuid.uuid4().hex[:12]}{TEMP_SUFFIX}"
+
+def remove_stale_temp_files(directory, max_age=None):
+    """
+    Remove the temp files a crashed or killed run left under a directory.
+
+    # Only names temp_path_for makes, and only ones older than max_age
+    # seconds (stale_temp_age_s), so a batch another process is writing
+    # into the same folder right now keeps its pending outputs.
+
+    Returns:
+        Number of files removed
+    """
+    if max_age is None:
+        max_age = config.get("stale_temp_age_s", 600)
+    cutoff = time.time() - max_age
+    removed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not TEMP_NAME_PATTERN.search(name):
+                continue
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                # Committed or removed by its owner meanwhile
+                continue
+    if removed:
+        logger.info(f"Removed {removed} stale temp file(s) from {directory}")
+    return removed
+
+def sweep_once(directory):
+    """Remove stale temp files under a directory, the first time this process writes there."""
+    key = os.path.abspath(directory)
+    with _swept_lock:
+        if key in _swept_dirs:
+            return 0
+        _swept_dirs.add(key)
+    if not os.path.isdir(directory):
+        return 0
+    return remove_stale_temp_files(directory)
+
+def encode_png(image):
+    """Encode a PIL image to PNG bytes in memory."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class DirectorySink:
+    """
+    Output sink that writes every map to its own file in a directory tree.
+
+    # The classic "one folder per texture, one file per map" layout.
+    # Remembers which folders it already made so it doesn't keep asking the disk.
+    # Maps are written under a temporary name and only renamed to the real
+    # one once their bytes are safely on disk, so a crash can't leave a
+    # truncated PNG that looks finished. Flushing every file on its own is
+    # painfully slow, so they're flushed in batches: every fsync_batch_size
+    # files or fsync_interval_s seconds, whichever comes first, and on close.
+    """
+
+    def __init__(self, output_dir, fsync_batch_size=None, fsync_interval=None):
+        """Initialize the sink."""
+        self.output_dir = output_dir
+        self.created_dirs = set()
+        self.lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+        self.fsync_batch_size = config.get("fsync_batch_size", 64) if fsync_batch_size is None else fsync_batch_size
+        self.fsync_interval = config.get("fsync_interval_s", 2.0) if fsync_interval is None else fsync_interval
+        # Written but not yet durable: (temp path, final path), and what to do once they are
+        self.pending = []
+        self.pending_finals = set()
+        self.pending_dirs = set()
+        self.durable_callbacks = []
+        self.last_commit = time.monotonic()
+        # Clean up after runs that died before they could commit, once per folder and process
+        sweep_once(output_dir)
+
+    def _ensure_dir(self, directory):
+        """Create a directory once, skipping the check if we've made it before."""
+        if directory in self.created_dirs:
+            return
+        if not os.path.exists(directory):
+            # exist_ok because parallel jobs may race us to it
+            os.makedirs(directory, exist_ok=True)
+            logger.info(f"Created output directory: {directory}")
+            # The new folder's own entry has to survive a crash too
+            with self.lock:
+                self.pending_dirs.add(os.path.dirname(directory))
+        with self.lock:
+            self.created_dirs.add(directory)
+
+    def location(self, relative_dir):
+        """Get where a relative output folder ends up."""
+        return os.path.join(self.output_dir, relative_dir)
+
+    @property
+    def durable(self):
+        """Check whether outputs are flushed to disk before they get their real names."""
+        return self.fsync_batch_size > 0
+
+    def save_image(self, relative_path, image):
+        """
+        Save a PIL image under the output directory.
+
+        # The file shows up under its real name when its batch is committed,
+        # straight away if durable writes are off.
+
+        Returns:
+            Path of the written file
+        """
+        output_path = os.path.join(self.output_dir, relative_path)
+        self._ensure_dir(os.path.dirname(output_path))
+
+        temp_path = temp_path_for(output_path)
+        image_format = Image.registered_extensions().get(os.path.splitext(output_path)[1].lower(), "PNG")
+        try:
+            image.save(temp_path, format=image_format)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        monitor.add_bytes_written(os.path.getsize(temp_path))
+        self._stage(temp_path, output_path)
+        return output_path
+
+    def _stage(self, temp_path, output_path):
+        """Queue a finished temp file for its rename, committing if the batch is full or old."""
+        if not self.durable:
+            os.replace(temp_path, output_path)
+            return
+
+        with self.lock:
+            self.pending.append((temp_path, output_path))
+            self.pending_finals.add(output_path)
+            due = (len(self.pending) >= self.fsync_batch_size
+                   or time.monotonic() - self.last_commit >= self.fsync_interval)
+        if due:
+            self.commit()
+
+    def on_durable(self, callback):
+        """
+        Call callback once everything saved so far is safely on disk.
+
+        # For things that must never happen before the outputs exist, like
+        # deleting the input they were made from.
+        """
+        # Waits out a commit in flight, its outputs aren't durable until it's done
+        with self.commit_lock:
+            with self.lock:
+                if self.pending or self.pending_dirs:
+                    self.durable_callbacks.append(callback)
+                    return
+        callback()
+
+    def commit_if_due(self):
+        """Commit the pending batch if it's been waiting longer than the interval."""
+        with self.lock:
+            due = ((self.pending or self.durable_callbacks)
+                   and time.monotonic() - self.last_commit >= self.fsync_interval)
+        if due:
+            self.commit()
+
+    def commit(self):
+        """
+        Make every pending output durable and give it its real name.
+
+        # Flush the data of every temp file, rename them all into place, then
+        # flush each directory once so the renames stick. The rename is what
+        # makes an output "exist", and it only happens after its bytes are safe.
+        """
+        with self.commit_lock:
+            with self.lock:
+                pending, self.pending = self.pending, []
+                finals, self.pending_finals = self.pending_finals, set()
+                directories, self.pending_dirs = self.pending_dirs, set()
+                callbacks, self.durable_callbacks = self.durable_callbacks, []
+                self.last_commit = time.monotonic()
+
+            if self.durable:
+                for temp_path, _ in pending:
+                    fsync_file(temp_path)
+            for temp_path, output_path in pending:
+                os.replace(temp_path, output_path)
+                directories.add(os.path.dirname(output_path))
+            if self.durable:
+                for directory in sorted(directories, key=len, reverse=True):
+                    fsync_directory(directory)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.exception(f"Error running post-commit action: {e}")
+        return len(pending)
+
+    def link(self, existing_path, relative_path, mode="hardlink"):
+        """
+        Make another name for an output that was already written.
+
+        Returns:
+            (path of the new file, method used)
+        """
+        output_path = os.path.join(self.output_dir, relative_path)
+        if os.path.abspath(output_path) == os.path.abspath(existing_path):
+            return output_path, "same"
+        with self.lock:
+            waiting = existing_path in self.pending_finals
+        if waiting:
+            # Can't link to a name that doesn't exist yet
+            self.commit()
+        self._ensure_dir(os.path.dirname(output_path))
+
+        # Links go through a temp name as well, a half-finished copy is still half-finished
+        temp_path = temp_path_for(output_path)
+        try:
+            method = clone_file(existing_path, temp_path, mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._stage(temp_path, output_path)
+        return output_path, method
+
+    def discard(self, paths):
+        """
+        Remove outputs of a file that won't be finished, written or still pending.
+
+        # Pending ones just lose their temp file and never get a real name.
+        # Committed ones are deleted, and their folder too if that empties it.
+        """
+        paths = set(paths)
+        with self.commit_lock:
+            with self.lock:
+                dropped = [entry for entry in self.pending if entry[1] in paths]
+                self.pending = [entry for entry in self.pending if entry[1] not in paths]
+                self.pending_finals -= paths
+            for temp_path, _ in dropped:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            committed = paths - {output_path for _, output_path in dropped}
+            for output_path in committed:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+        for directory in {os.path.dirname(path) for path in paths}:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # Not empty, other outputs live there
+                continue
+            with self.lock:
+                self.created_dirs.discard(directory)
+        logger.info(f"Discarded {len(paths)} partial output(s)")
+
+    def close(self):
+        """Commit whatever is still pending. There's no index for plain files."""
+        self.commit()
+        return None
+
+class ArchiveSink:
+    """
+    Output sink that streams every map into one tar or zip archive per batch.
+
+    # Thousands of tiny files on a network share is how you make a sysadmin cry.
+    # Instead the workers encode PNGs in memory and a single writer thread
+    # appends them to an archive (or a series of shards of a given size), then
+    # writes an index so any member can be read back with a single seek.
+    # Shards are written under temporary names and renamed, flushed, along
+    # with the index when the sink closes. A killed run leaves no archive
+    # that looks complete.
+    """
+
+    def __init__(self, output_dir, archive_format="tar", shard_size_mb=0, archive_name=None, queue_size=64):
+        """Initialize the sink and start the writer thread."""
+        if archive_format not in ("tar", "zip"):
+            raise ValueError(f"Unsupported archive format: {archive_format}")
+
+        if not archive_name:
+            archive_name = f"texturenormaliser_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+            logger.info(f"Created output directory: {output_dir}")
+
+        self.output_dir = output_dir
+        self.archive_format = archive_format
+        self.archive_name = archive_name
+        self.shard_size = int(shard_size_mb * 1024 * 1024) if shard_size_mb else 0
+        self.index_path = os.path.join(output_dir, f"{archive_name}.index.json")
+
+        self.shards = []
+        self.shard_temp_paths = []
+        self.members = {}
+        self.archive = None
+        self.error = None
+        self.closed = False
+
+        # Bounded so fast workers wait for the disk instead of filling RAM with PNGs
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer_thread = threading.Thread(target=self._writer, name="ArchiveSinkWriter", daemon=True)
+        self.writer_thread.start()
+
+        logger.info(f"ArchiveSink writing {archive_format} archive {archive_name} to {output_dir}")
+
+    def location(self, relative_dir):
+        """Get where a relative output folder ends up (its prefix inside the archive)."""
+        return relative_dir.replace(os.sep, "/")
+
+    def save_image(self, relative_path, image):
+        """
+        Encode a PIL image and queue it for the archive writer.
+
+        # The PNG encode happens right here in the worker thread, so it stays
+        # parallel. Only the append to the archive is serialised.
+
+        Returns:
+            Name of the member inside the archive
+        """
+        if self.error is not None:
+            raise RuntimeError(f"Archive writer failed: {self.error}")
+        if self.closed:
+            raise RuntimeError("ArchiveSink is closed")
+
+        member_name = relative_path.replace(os.sep, "/")
+        data = encode_png(image)
+        put_started = time.perf_counter()
+        self.queue.put((member_name, data, None))
+        if tracer.active:
+            # Time spent blocked on a full queue, i.e. waiting for the disk
+            tracer.record("sink_queue_wait", put_started, time.perf_counter(), "queue")
+        return member_name
+
+    def link(self, existing_member, relative_path, mode="hardlink"):
+        """
+        Make another name for a member that was already queued.
+
+        # Tar has real hardlink entries, so the alias costs a 512 byte header.
+        # Zip doesn't, so there the alias only lives in the index.
+
+        Returns:
+            (name of the new member, method used)
+        """
+        if self.error is not None:
+            raise RuntimeError(f"Archive writer failed: {self.error}")
+
+        member_name = relative_path.replace(os.sep, "/")
+        if member_name == existing_member:
+            return member_name, "same"
+        self.queue.put((member_name, None, existing_member))
+        return member_name, "hardlink" if self.archive_format == "tar" else "index"
+
+    def discard(self, members):
+        """
+        Drop members of a file that won't be finished from the index.
+
+        # Bytes already appended can't be taken back out of the shard without
+        # rewriting it, but a member the index doesn't list doesn't exist to
+        # anything reading the archive through it. Queued behind the saves,
+        # so it always lands after them.
+        """
+        for member_name in members:
+            self.queue.put((member_name, None, None))
+
+    def _shard_path(self, shard_number):
+        """Get the path of a shard archive."""
+        if self.shard_size:
+            filename = f"{self.archive_name}_{shard_number:05d}.{self.archive_format}"
+        else:
+            filename = f"{self.archive_name}.{self.archive_format}"
+        return os.path.join(self.output_dir, filename)
+
+    def _open_shard(self):
+        """Start a new archive shard."""
+        shard_path = self._shard_path(len(self.shards))
+        temp_path = temp_path_for(shard_path)
+        if self.archive_format == "tar":
+            self.archive = tarfile.open(temp_path, "w", format=tarfile.PAX_FORMAT)
+        else:
+            # PNGs are already compressed, storing keeps members seekable too
+            self.archive = zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self.shards.append(os.path.basename(shard_path))
+        self.shard_temp_paths.append(temp_path)
+        logger.info(f"Opened archive shard: {shard_path}")
+
+    def _close_shard(self):
+        """Finish the current archive shard."""
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def _shard_bytes(self):
+        """Get the number of bytes written to the current shard."""
+        if self.archive_format == "tar":
+            return self.archive.fileobj.tell()
+        return self.archive.fp.tell()
+
+    def _append(self, member_name, data, link_target=None):
+        """Append one member to the current shard and record where its bytes live."""
+        if link_target is not None:
+            self._append_link(member_name, link_target)
+            return
+        if data is None:
+            # Discarded, see discard
+            self.members.pop(member_name, None)
+            return
+
+        if self.archive is None or (self.shard_size and self._shard_bytes() >= self.shard_size):
+            self._close_shard()
+            self._open_shard()
+
+        if self.archive_format == "tar":
+            info = tarfile.TarInfo(member_name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self.archive.addfile(info, io.BytesIO(data))
+            # The data sits right before the padding at the end of what we just wrote
+            padded_size = -(-len(data) // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+            offset = self.archive.fileobj.tell() - padded_size
+        else:
+            info = zipfile.ZipInfo(member_name, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self.archive.writestr(info, data)
+            # Stored members are written as-is and end where the next header starts
+            offset = self.archive.fp.tell() - len(data)
+        monitor.add_bytes_written(len(data))
+
+        self.members[member_name] = {
+            "shard": len(self.shards) - 1,
+            "offset": offset,
+            "size": len(data)
+        }
+
+    def _append_link(self, member_name, link_target):
+        """Record a member that shares the bytes of one written earlier."""
+        target = self.members[link_target]
+        if self.archive_format == "tar" and target["shard"] == len(self.shards) - 1:
+            info = tarfile.TarInfo(member_name)
+            info.type = tarfile.LNKTYPE
+            info.linkname = link_target
+            info.mtime = time.time()
+            self.archive.addfile(info)
+        self.members[member_name] = dict(target)
+
+    def _writer(self):
+        """
+        Write queued members to the archive (runs in the writer thread).
+
+        # Keeps draining the queue even after a failure, so workers blocked on
+        # a full queue don't hang forever. They get the error on their next save.
+        """
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    append_started = time.perf_counter()
+                    self._append(*item)
+                    if tracer.active and tracer.sample():
+                        tracer.record("archive_append", append_started, time.perf_counter(), "io",
+                                      {"member": item[0]}, force=True)
+            except Exception as e:
+                logger.exception(f"Error writing to archive: {e}")
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        """
+        Flush everything to disk, finish the archive and write the index.
+
+        Returns:
+            Path of the index file
+        """
+        if self.closed:
+            return self.index_path
+        self.closed = True
+
+        self.queue.put(None)
+        self.writer_thread.join()
+        self._close_shard()
+
+        # Flush every shard, then give them their real names, then the index last
+        for temp_path in self.shard_temp_paths:
+            fsync_file(temp_path)
+        for shard, temp_path in zip(self.shards, self.shard_temp_paths):
+            os.replace(temp_path, os.path.join(self.output_dir, shard))
+
+        index = {
+            "format": self.archive_format,
+            "shards": self.shards,
+            "members": self.members
+        }
+        temp_path = temp_path_for(self.index_path)
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.index_path)
+        fsync_directory(self.output_dir)
+
+        logger.info(f"Wrote {len(self.members)} members to {len(self.shards)} archive shard(s), "
+                    f"index saved to {self.index_path}")
+
+        if self.error is not None:
+            raise RuntimeError(f"Archive writer failed: {self.error}")
+        return self.index_path
+
+def load_archive_index(index_path):
+    """Load an archive index written by ArchiveSink."""
+    with open(index_path, 'r') as f:
+        return json.load(f)
+
+def read_archive_member(index_path, member_name, index=None):
+    """
+    Read one member's bytes straight out of an archive using its index.
+
+    # No scanning through a 20 GB tar to find one PNG. The index tells us
+    # exactly where the bytes are, so it's one seek and one read.
+    """
+    if index is None:
+        index = load_archive_index(index_path)
+
+    entry = index["members"][member_name]
+    shard_path = os.path.join(os.path.dirname(index_path), index["shards"][entry["shard"]])
+    with open(shard_path, 'rb') as f:
+        f.seek(entry["offset"])
+        return f.read(entry["size"])
+
+def create_sink(output_dir=None):
+    """
+    Create the output sink configured in config.json.
+
+    # "directory" gives the usual folder tree, "tar" or "zip" streams
+    # everything into archives instead.
+    """
+    if output_dir is None:
+        output_dir = config.get("export_directory", "./export/")
+
+    sink_type = config.get("output_sink", "directory")
+    if sink_type in ("tar", "zip"):
+        return ArchiveSink(
+            output_dir,
+            archive_format=sink_type,
+            shard_size_mb=config.get("archive_shard_mb", 0),
+            archive_name=config.get("archive_name", "")
+        )
+    return DirectorySink(output_dir)
+
+if __name__ == "__main__":
+    # Read a member back out of an archive
+    import sys
+
+    if len(sys.argv) == 2:
+        for name, entry in sorted(load_archive_index(sys.argv[1])["members"].items()):
+            print(f"{name}: shard {entry['shard']}, {entry['size']} bytes")
+    elif len(sys.argv) == 4:
+        with open(sys.argv[3], 'wb') as f:
+            f.write(read_archive_member(sys.argv[1], sys.argv[2]))
+        print(f"Extracted {sys.argv[2]} to {sys.argv[3]}")
+    else:
+        print("Usage: python -m src.output_sink <index.json> [<member> <output_path>]")
@@ -0,0 +1,151 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import time
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.logger import logger
+
+# Modules processing can't start without, heaviest first
+HEAVY_MODULES = ("numpy", "cv2", "src.texture_processor", "src.batch_planner", "src.autotune")
+
+def process_start_time():
+    """
+    Get the wall-clock time this process started, or None if it can't be told.
+
+    # Linux keeps it in /proc to the hundredth of a second, psutil knows it
+    # everywhere else. Without either the caller falls back to whenever its
+    # own code first got to run, which misses the interpreter's startup.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        # Field 22 of the stat line, counted from the one after the command name
+        age = uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.time() - age
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # Import here, psutil is optional
+        import psutil
+        return psutil.Process().create_time()
+    except Exception:
+        return None
+
+class Prewarmer:
+    """
+    Loads and warms up the processing side in the background while the window comes up.
+
+    # OpenCV, NumPy and the processor take a good while to import on a cold
+    # disk, and the first run of every filter pays again. None of that has
+    # to happen before the window shows. The work runs on the one-thread pool
+    # the GUI processes files on, so that thread's OpenCV and CLAHE state is
+    # warm by the time the artist's first texture arrives.
+    """
+
+    def __init__(self, load=None, started=None, warm_up=True):
+        """
+        Initialize a prewarmer, nothing runs until start.
+
+        Args:
+            load: Optional function run once the heavy modules are imported, to bind them for the caller
+            started: Wall-clock time startup began, defaults to now
+            warm_up: Whether to run every generator once after importing
+        """
+        self.load = load
+        self.started = started if started is not None else time.time()
+        self.warm_up = warm_up
+        self.milestones = {}
+        self.timings = {}
+        self.error = None
+        self.imported = threading.Event()
+        self.ready = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Processing")
+
+    def mark(self, name):
+        """
+        Note a startup milestone, the first time only.
+
+        Returns:
+            Seconds from the start of startup to the milestone
+        """
+        self.milestones.setdefault(name, time.time() - self.started)
+        return self.milestones[name]
+
+    def start(self):
+        """Start importing and warming up in the background."""
+        self.pool.submit(self._run)
+        return self
+
+    def _run(self):
+        """Import the heavy modules, then warm them up."""
+        try:
+            for name in HEAVY_MODULES:
+                started = time.perf_counter()
+                importlib.import_module(name)
+                self.timings[f"import {name}"] = time.perf_counter() - started
+            if self.load is not None:
+                self.load()
+            self.mark("imported")
+        except Exception as e:
+            logger.exception(f"Error loading the processing modules: {e}")
+            self.error = e
+            self.ready.set()
+            return
+        finally:
+            self.imported.set()
+
+        try:
+            if self.warm_up:
+                from src.texture_processor import processor
+                self.timings.update(processor.warm_up())
+        except Exception as e:
+            # Cold but working, the first texture just pays for it
+            logger.warning(f"Warm-up failed: {e}")
+        finally:
+            self.mark("ready")
+            self.ready.set()
+
+    def wait_for_imports(self, timeout=None):
+        """
+        Block until the heavy modules are imported.
+
+        Returns:
+            True once they're usable, False if importing failed or the wait timed out
+        """
+        return self.imported.wait(timeout) and self.error is None
+
+    def submit(self, function, *args):
+        """Run a function on the warmed-up processing thread, after the warm-up."""
+        return self.pool.submit(function, *args)
+
+    def summary(self):
+        """Describe the startup milestones in one line."""
+        return ", ".join(f"{name} after {seconds:.2f}s" for name, seconds in
+                         sorted(self.milestones.items(), key=lambda item: item[1]))
+
+    def shutdown(self, wait=False):
+        """Let the processing thread go once it runs out of work."""
+        self.pool.shutdown(wait=wait)
+
+if __name__ == "__main__":
+    # Measure how long this machine takes to get ready from a cold start
+    import sys
+
+    prewarmer = Prewarmer(started=process_start_time(), warm_up="--no-warm-up" not in sys.argv)
+    prewarmer.mark("interpreter")
+    prewarmer.start()
+    prewarmer.ready.wait()
+    prewarmer.shutdown(wait=True)
+    if prewarmer.error is not None:
+        sys.exit(1)
+    for name, seconds in sorted(prewarmer.timings.items(), key=lambda item: -item[1]):
+        print(f"{name:32s} {seconds * 1000:9.2f} ms")
+    print(f"Startup: {prewarmer.summary()}")
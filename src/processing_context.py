@@ -0,0 +1,180 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import threading
+from dataclasses import dataclass, replace
+import cv2
+from src.config import config
+
+# Where each packed channel source comes from, as (map name, channel index).
+# A channel index of None means the whole single-channel map.
+PACKED_CHANNEL_SOURCES = {
+    "bump_map": ("bump_map", None),
+    "ao_roughness": ("ao_roughness", None),
+    "curvature": ("curvature", None),
+    "cavity": ("cavity", None),
+    "height_map": ("height_map", None),
+    "normal_x": ("normal_map", 0),
+    "normal_y": ("normal_map", 1),
+    "black": (None, 0),
+    "white": (None, 255),
+}
+
+# Kernel sizes cv2.Sobel is happy with
+MAX_KERNEL_SIZE = 31
+
+def clean_kernel_sizes(sizes):
+    """Keep the valid kernel sizes (odd, 3 to 31) from a list, in order and without repeats."""
+    cleaned = []
+    for size in sizes or ():
+        size = int(size)
+        if size % 2 == 1 and 3 <= size <= MAX_KERNEL_SIZE and size not in cleaned:
+            cleaned.append(size)
+    return tuple(cleaned)
+
+@dataclass(frozen=True)
+class ProcessingSettings:
+    """
+    Immutable snapshot of the settings used to process one image.
+
+    # Grabbed once when a job starts, so flipping a checkbox or changing the
+    # kernel size halfway through an image can't give you a Frankenstein texture.
+    """
+    kernel_size: int = 5
+    enable_normal_map: bool = True
+    enable_bump_map: bool = True
+    enable_ao_roughness: bool = False
+    enable_curvature: bool = False
+    enable_cavity: bool = False
+    enable_height_map: bool = False
+    height_boundary: str = "mirror"
+    height_tile_size: int = 2048
+    ao_quality: str = "quality"
+    output_mode: str = "separate"
+    packed_layout: tuple = ("ao_roughness", "bump_map", "black")
+    kernel_sweep: tuple = ()
+    low_memory: bool = False
+
+    @classmethod
+    def from_config(cls, **overrides):
+        """Create a settings snapshot from the current configuration."""
+        settings = cls(
+            kernel_size=int(config.get("sobel_kernel_size", 5)),
+            enable_normal_map=bool(config.get("enable_normal_map", True)),
+            enable_bump_map=bool(config.get("enable_bump_map", True)),
+            enable_ao_roughness=bool(config.get("enable_ao_roughness", False)),
+            enable_curvature=bool(config.get("enable_curvature", False)),
+            enable_cavity=bool(config.get("enable_cavity", False)),
+            enable_height_map=bool(config.get("enable_height_map", False)),
+            height_boundary=config.get("height_boundary", "mirror"),
+            height_tile_size=int(config.get("height_tile_size", 2048)),
+            ao_quality=config.get("ao_quality", "quality"),
+            output_mode=config.get("output_mode", "separate"),
+            packed_layout=tuple(config.get("packed_layout", ["ao_roughness", "bump_map", "black"])),
+            kernel_sweep=clean_kernel_sizes(config.get("kernel_sweep", [])),
+            low_memory=bool(config.get("low_memory", False))
+        )
+        if "kernel_sweep" in overrides:
+            overrides["kernel_sweep"] = clean_kernel_sizes(overrides["kernel_sweep"])
+        return replace(settings, **overrides) if overrides else settings
+
+    @property
+    def sweeping(self):
+        """Whether normal maps are made for several kernel sizes."""
+        return bool(self.kernel_sweep)
+
+    def normal_map_kernel_sizes(self):
+        """
+        Get the kernel sizes normal map files are written for.
+
+        # Just the one kernel size normally. When sweeping, every size in the
+        # sweep, each written with a _k<size> suffix so they sit side by side.
+        """
+        return self.kernel_sweep if self.sweeping else (self.kernel_size,)
+
+    @property
+    def packed(self):
+        """Whether single-channel maps are packed into one image."""
+        return self.output_mode == "packed"
+
+    def packed_sources(self):
+        """Get the set of maps the packed layout reads from."""
+        sources = set()
+        for channel in self.packed_layout:
+            if channel not in PACKED_CHANNEL_SOURCES:
+                raise ValueError(f"Unknown packed channel source: {channel}")
+            map_name = PACKED_CHANNEL_SOURCES[channel][0]
+            if map_name is not None:
+                sources.add(map_name)
+        return sources
+
+    def generates(self, map_name):
+        """
+        Check whether a map needs to be generated at all.
+
+        # In packed mode the layout decides which single-channel maps get made,
+        # whatever their checkboxes say. The normal map checkbox still controls
+        # the separate normal map file.
+        """
+        if self.packed and map_name in self.packed_sources():
+            return True
+        return self.writes_separately(map_name)
+
+    def writes_separately(self, map_name):
+        """Check whether a map is written to its own file."""
+        if map_name == "normal_map":
+            return self.enable_normal_map
+        if self.packed:
+            return False
+        if map_name == "bump_map":
+            return self.enable_bump_map
+        if map_name == "ao_roughness":
+            return self.enable_ao_roughness
+        if map_name == "curvature":
+            return self.enable_curvature
+        if map_name == "cavity":
+            return self.enable_cavity
+        if map_name == "height_map":
+            return self.enable_height_map
+        return False
+
+    def enabled_maps(self):
+        """Get the list of map types these settings will generate."""
+        enabled = [name for name in ("normal_map", "bump_map", "ao_roughness", "curvature", "cavity", "height_map") if self.generates(name)]
+        if self.packed:
+            enabled.append("packed")
+        return enabled
+
+class ProcessorContext:
+    """
+    Per-thread cache of reusable OpenCV objects.
+
+    # OpenCV objects like CLAHE aren't safe to share between threads and aren't
+    # free to build either, so every worker thread gets its own little stash.
+    """
+
+    def __init__(self):
+        """Initialize an empty context."""
+        self.clahe_cache = {}
+
+    def get_clahe(self, clip_limit=2.0, tile_grid_size=(8, 8)):
+        """Get a cached CLAHE object for the given parameters."""
+        key = (clip_limit, tile_grid_size)
+        clahe = self.clahe_cache.get(key)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+            self.clahe_cache[key] = clahe
+        return clahe
+
+_thread_state = threading.local()
+
+def get_context():
+    """Get the processor context for the calling thread, creating it on first use."""
+    context = getattr(_thread_state, "context", None)
+    if context is None:
+        context = ProcessorContext()
+        _thread_state.context = context
+    return context
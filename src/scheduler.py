@@ -0,0 +1,457 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src.logger import logger
+from src.config import config
+from src.processing_context import ProcessingSettings
+from src.archive_input import open_input
+from src.instrumentation import monitor, get_rss_bytes
+from src.tracer import tracer
+from src.height_field import DEFAULT_TILE_SIZE, MIN_TILE_MARGIN
+
+# Bytes per pixel for each PIL mode as (PIL internal storage, NumPy array).
+# PIL pads 3-band images to 4 bytes per pixel internally, NumPy doesn't.
+MODE_BYTES = {
+    "1": (1, 1),
+    "L": (1, 1),
+    "P": (1, 1),
+    "LA": (4, 2),
+    "PA": (4, 2),
+    "La": (4, 2),
+    "RGB": (4, 3),
+    "YCbCr": (4, 3),
+    "LAB": (4, 3),
+    "HSV": (4, 3),
+    "RGBA": (4, 4),
+    "RGBa": (4, 4),
+    "RGBX": (4, 4),
+    "CMYK": (4, 4),
+    "I;16": (2, 2),
+    "I;16B": (2, 2),
+    "I;16L": (2, 2),
+    "I;16N": (2, 2),
+    "I": (4, 4),
+    "F": (4, 4),
+}
+
+# Peak bytes per pixel held by each generator while it runs, and the bytes
+# per pixel of the result it leaves behind until process_image returns.
+MAP_PEAK_BYTES = {
+    # sobelx + sobely (float32), one float32 normalisation temporary (none
+    # with the Numba kernels) and the final uint8 RGB map
+    "normal_map": 4 + 4 + 4 + 3,
+    # equalizeHist output
+    "bump_map": 1,
+    # inverted + filtered + CLAHE output
+    "ao_roughness": 3,
+    # sobelx + sobely kept from the normal map, the divergence, one float32
+    # Sobel temporary and the uint8 result, cavity has the same shape
+    "curvature": 4 + 4 + 4 + 4 + 1,
+    "cavity": 4 + 4 + 4 + 4 + 1,
+    # sobelx + sobely kept from the normal map, the float32 height field, its
+    # coarse upsample and the uint8 result. The FFT solve is counted separately
+    "height_map": 4 + 4 + 4 + 4 + 1,
+    # up to four packed uint8 channels
+    "packed": 4,
+}
+
+# Bytes per pixel of the region a map solves in one go, which never grows
+# past one tile however big the image is. The height map's mirrored solve is
+# four times the region's pixels, as float32 planes and complex64 spectra
+MAP_TILE_BYTES = {
+    "height_map": 56,
+}
+MAP_RESULT_BYTES = {
+    "normal_map": 3,
+    "bump_map": 1,
+    "ao_roughness": 1,
+    "curvature": 1,
+    "cavity": 1,
+    "height_map": 1,
+    "packed": 4,
+}
+
+# Fixed per-job overhead for codec buffers, the interpreter frame and friends
+JOB_OVERHEAD_BYTES = 8 * 1024 * 1024
+
+# A PNG starts with its signature and then the IHDR chunk, which is all we need
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_HEADER_BYTES = 33
+
+# The PIL mode a PNG opens as, by IHDR colour type (and bit depth for grayscale)
+PNG_COLOUR_MODES = {
+    2: "RGB",
+    3: "P",
+    4: "LA",
+    6: "RGBA",
+}
+
+def get_total_memory():
+    """
+    Get the amount of physical memory on this machine in bytes.
+
+    # Asks the OS how much RAM we have. Falls back to a conservative 4 GB
+    # if the OS refuses to tell us, which is its right I suppose.
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("sullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return int(status.ullTotalPhys)
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except Exception as e:
+        logger.warning(f"Could not detect physical memory, assuming 4 GB: {e}")
+        return 4 * 1024 ** 3
+
+def get_enabled_maps():
+    """Get the list of map types enabled in the configuration."""
+    return ProcessingSettings.from_config().enabled_maps()
+
+def read_png_header(input_path):
+    """
+    Read the dimensions and mode of a PNG file straight from its IHDR chunk.
+
+    # One 33 byte read and a struct.unpack. PIL's lazy open is cheap, but not
+    # "100,000 files before you finish blinking" cheap.
+
+    Returns:
+        Header dict, or None if the file isn't a PNG we can read this way
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read(PNG_HEADER_BYTES)
+    if len(data) < PNG_HEADER_BYTES or not data.startswith(PNG_SIGNATURE) or data[12:16] != b"IHDR":
+        return None
+
+    width, height, bit_depth, colour_type = struct.unpack(">IIBB", data[16:26])
+    if colour_type == 0:
+        mode = "I;16" if bit_depth == 16 else ("1" if bit_depth == 1 else "L")
+    else:
+        mode = PNG_COLOUR_MODES.get(colour_type)
+    if mode is None or not width or not height:
+        return None
+
+    return {
+        "width": width,
+        "height": height,
+        "mode": mode,
+        "format": "PNG"
+    }
+
+def read_image_header(input_path):
+    """
+    Read the dimensions and mode of an image without decoding its pixels.
+
+    # PIL only parses the header until you actually ask for pixels,
+    # so this is cheap even for a 16K monster. Plain PNG files skip PIL
+    # altogether and just have their IHDR chunk unpacked.
+    """
+    if isinstance(input_path, (str, os.PathLike)):
+        header = read_png_header(input_path)
+        if header is not None:
+            return header
+
+    with open_input(input_path) as image:
+        return {
+            "width": image.size[0],
+            "height": image.size[1],
+            "mode": image.mode,
+            "format": image.format
+        }
+
+def get_tile_pixels():
+    """Get the pixels in the biggest region solved in one go, a tile plus its overlap."""
+    tile_size = int(config.get("height_tile_size", DEFAULT_TILE_SIZE) or DEFAULT_TILE_SIZE) + 2 * MIN_TILE_MARGIN
+    return tile_size * tile_size
+
+def estimate_peak_memory(width, height, mode, enabled_maps=None, low_memory=None):
+    """
+    Estimate the peak memory in bytes process_image needs for one image.
+
+    # Adds up every array process_image keeps alive at its worst moment:
+    # the decoded PIL image, its NumPy copy, the grayscale plane, every
+    # finished map, plus the biggest temporary any single generator makes.
+    # In low-memory mode there's no NumPy copy, the PIL image is gone before
+    # the first generator runs, and only maps waiting to be packed stay.
+    """
+    if enabled_maps is None:
+        enabled_maps = get_enabled_maps()
+    if low_memory is None:
+        low_memory = config.get("low_memory", False)
+
+    pixels = width * height
+    pil_bytes, numpy_bytes = MODE_BYTES.get(mode, (4, 4))
+    if low_memory:
+        return estimate_low_memory_peak(pixels, pil_bytes, enabled_maps)
+
+    # Decoded image, NumPy copy and the grayscale plane (which may be a view)
+    peak = pixels * (pil_bytes + numpy_bytes + 1)
+
+    # Results stay alive until the function returns, the temporaries don't
+    retained = 0
+    transient = 0
+    tiled = 0
+    for map_name in enabled_maps:
+        transient = max(transient, retained + MAP_PEAK_BYTES.get(map_name, 0))
+        retained += MAP_RESULT_BYTES.get(map_name, 0)
+        if map_name in MAP_TILE_BYTES:
+            tiled = max(tiled, min(pixels, get_tile_pixels()) * MAP_TILE_BYTES[map_name])
+
+    return peak + pixels * max(transient, retained) + tiled + JOB_OVERHEAD_BYTES
+
+def estimate_low_memory_peak(pixels, pil_bytes, enabled_maps):
+    """
+    Estimate the peak memory of a low-memory process_image.
+
+    # The decoded image and the grayscale plane overlap only while the plane
+    # is converted band by band. After that it's the grayscale plane, the
+    # maps kept for packing and whichever generator is running. The normal
+    # map is made in bands too, unless another map wants its gradient planes.
+    """
+    keep_for_packing = "packed" in enabled_maps
+    banded_normals = not any(map_name in enabled_maps for map_name in ("curvature", "cavity", "height_map"))
+    retained = 0
+    transient = 0
+    tiled = 0
+    for map_name in enabled_maps:
+        if map_name == "normal_map" and banded_normals:
+            map_peak = MAP_RESULT_BYTES[map_name]
+        else:
+            map_peak = MAP_PEAK_BYTES.get(map_name, 0)
+        transient = max(transient, retained + map_peak)
+        if keep_for_packing:
+            retained += MAP_RESULT_BYTES.get(map_name, 0)
+        if map_name in MAP_TILE_BYTES:
+            tiled = max(tiled, min(pixels, get_tile_pixels()) * MAP_TILE_BYTES[map_name])
+
+    peak = max(pil_bytes + 1, 1 + max(transient, retained))
+    return pixels * peak + tiled + JOB_OVERHEAD_BYTES
+
+class MemoryBudgetScheduler:
+    """
+    Scheduler that runs jobs in parallel while keeping their estimated memory under a budget.
+
+    # Reads image headers, guesses how much RAM each job will eat, and only lets
+    # jobs into the pool while the total fits. Big jobs go first and small jobs
+    # get squeezed into whatever room is left, like packing a car for a holiday.
+    # In low-memory mode guesses aren't enough: a job only joins the others if
+    # the process's real resident memory plus its estimate fits as well.
+    """
+
+    def __init__(self, memory_budget_mb=None, max_workers=None, low_memory=None):
+        """Initialize the scheduler."""
+        if memory_budget_mb is None:
+            memory_budget_mb = config.get("memory_budget_mb", 0)
+        if max_workers is None:
+            max_workers = config.get("max_workers", 0)
+        if low_memory is None:
+            low_memory = config.get("low_memory", False)
+        self.low_memory = bool(low_memory)
+
+        # Zero means "work it out for me"
+        if memory_budget_mb and memory_budget_mb > 0:
+            self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        else:
+            self.memory_budget = get_total_memory() // 2
+
+        if max_workers and max_workers > 0:
+            self.max_workers = int(max_workers)
+        else:
+            self.max_workers = os.cpu_count() or 1
+
+        self.lock = threading.Lock()
+        self.memory_in_use = 0
+        self.peak_memory_in_use = 0
+
+        logger.info(f"MemoryBudgetScheduler initialized with {self.max_workers} workers and "
+                    f"a {self.memory_budget // (1024 * 1024)} MB memory budget")
+
+    def reserve(self, reserved_bytes):
+        """
+        Take memory held for the whole batch out of the budget.
+
+        # Shared memory slots and the like are allocated up front and never
+        # handed back mid-batch, so the jobs only get what's left.
+        """
+        with self.lock:
+            self.memory_budget = max(1, self.memory_budget - int(reserved_bytes))
+            logger.info(f"Reserved {reserved_bytes / (1024 * 1024):.1f} MB, "
+                        f"{self.memory_budget // (1024 * 1024)} MB left for jobs")
+
+    def plan_job(self, input_path, enabled_maps=None):
+        """
+        Build a job description for an input file from its header.
+
+        # If we can't read the header we can't guess the memory, so the job is
+        # marked as unknown and will be run on its own to be safe.
+        """
+        job = {
+            "input_path": input_path,
+            "estimated_bytes": None
+        }
+
+        try:
+            header = read_image_header(input_path)
+            job.update(header)
+            job["estimated_bytes"] = estimate_peak_memory(
+                header["width"], header["height"], header["mode"], enabled_maps, self.low_memory
+            )
+        except Exception as e:
+            logger.warning(f"Could not read image header for {input_path}: {e}")
+
+        return job
+
+    def _job_cost(self, job):
+        """Get the memory a job is charged against the budget."""
+        if job["estimated_bytes"] is None:
+            return self.memory_budget
+        return job["estimated_bytes"]
+
+    def _rss_fits(self, cost):
+        """Check a job fits next to what this process really has resident, in low-memory mode."""
+        if not self.low_memory:
+            return True
+        rss = get_rss_bytes()
+        return rss is None or rss + cost <= self.memory_budget
+
+    def _run_job(self, job_function, input_path, queued_at):
+        """Run one job in a worker thread, tracing how long it sat in the queue."""
+        if tracer.active and tracer.sample(input_path):
+            tracer.record("queue_wait", queued_at, time.perf_counter(), "queue", {"input": str(input_path)}, force=True)
+        return job_function(input_path)
+
+    def run(self, input_paths, job_function, enabled_maps=None, callback=None, keep_results=True, cancel=None):
+        """
+        Run a job function over input files without exceeding the memory budget.
+
+        # Jobs are admitted largest first. When the next big job doesn't fit we
+        # look for smaller ones that do, so the cores don't sit around waiting.
+        # A job bigger than the whole budget still runs, just on its own.
+        # Waiting jobs are kept as just their cost and path, smallest first,
+        # so a million of them stay small and taking the next one is cheap.
+        # A paused cancel token stops new jobs from starting, the waiting ones
+        # stay queued as they were. A cancelled one reports every job that
+        # hadn't started yet as cancelled.
+
+        Args:
+            input_paths: Paths of the images to process
+            job_function: Called as job_function(input_path) in a worker thread
+            enabled_maps: Map types to estimate memory for (defaults to config)
+            callback: Optional function called with each result as it completes
+            keep_results: Collect the results to return, False if the callback is all you need
+            cancel: Optional CancelToken to pause or cancel the batch with
+
+        Returns:
+            List of job_function results in completion order, or None without keep_results
+        """
+        pending = []
+        for path in input_paths:
+            job = self.plan_job(path, enabled_maps)
+            pending.append((self._job_cost(job), job["input_path"]))
+        # Reversed before the stable sort, so equal jobs still start in input order from the end
+        pending.reverse()
+        pending.sort(key=lambda entry: entry[0])
+        queued_at = time.perf_counter()
+
+        results = [] if keep_results else None
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if cancel is not None:
+                    if not running and pending:
+                        # Nothing in flight to wait on, so wait on the pause itself
+                        cancel.wait()
+                    if cancel.cancelled:
+                        for _, input_path in reversed(pending):
+                            result = {
+                                "success": False,
+                                "input_path": input_path,
+                                "cancelled": True,
+                                "error": "Cancelled before it started"
+                            }
+                            if keep_results:
+                                results.append(result)
+                            if callback is not None:
+                                callback(result)
+                        pending.clear()
+                        if not running:
+                            break
+                        
+                # Admit every job that fits, biggest (last) first
+                index = len(pending) - 1
+                while index >= 0 and len(running) < self.max_workers and not (cancel is not None and cancel.paused):
+                    cost, input_path = pending[index]
+
+                    with self.lock:
+                        fits = not running or (self.memory_in_use + cost <= self.memory_budget
+                                               and self._rss_fits(cost))
+                        if fits:
+                            self.memory_in_use += cost
+                            self.peak_memory_in_use = max(self.peak_memory_in_use, self.memory_in_use)
+
+                    if fits:
+                        pending.pop(index)
+                        future = executor.submit(self._run_job, job_function, input_path, queued_at)
+                        running[future] = (cost, input_path)
+                    index -= 1
+
+                monitor.set_queue_depth(len(pending))
+
+                # Wait for something to finish and hand its memory back
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cost, input_path = running.pop(future)
+                    with self.lock:
+                        self.memory_in_use -= cost
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.exception(f"Error in scheduled job {input_path}: {e}")
+                        result = {
+                            "success": False,
+                            "input_path": input_path,
+                            "error": str(e)
+                        }
+
+                    if keep_results:
+                        results.append(result)
+                    if callback is not None:
+                        callback(result)
+
+        monitor.set_queue_depth(0)
+        return results
+
+if __name__ == "__main__":
+    # Test the scheduler
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            job = MemoryBudgetScheduler(max_workers=1).plan_job(path)
+            print(f"{path}: {job}")
+    else:
+        print("Usage: python -m src.scheduler <image_path> [<image_path> ...]")
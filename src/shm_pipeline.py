@@ -0,0 +1,494 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import queue
+import pickle
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import numpy as np
+import cv2
+from PIL import Image
+from src.logger import logger
+from src.config import config
+from src.output_sink import DirectorySink
+from src.instrumentation import monitor, stage_changes
+from src.scheduler import MODE_BYTES, MAP_RESULT_BYTES, get_total_memory
+
+# Modes that come back out of Image.fromarray exactly as they went into np.asarray.
+# Anything else (palettes, 1-bit, CMYK...) is pickled as a PIL image instead.
+SLOT_MODES = ("L", "LA", "RGB", "RGBA", "I;16")
+
+# Arrays start on a cache line inside a slot
+SLOT_ALIGNMENT = 64
+
+# How often a worker waiting for a free slot checks whether the writer died
+SLOT_POLL_SECONDS = 0.5
+
+# How often a cancel token's state is passed on to the worker processes
+CANCEL_POLL_SECONDS = 0.1
+
+def job_output_bytes(header, settings):
+    """
+    Get the slot space one image's outputs need, from its header.
+
+    # The decoded original plus every map written for it, as raw arrays.
+    """
+    pixels = header["width"] * header["height"]
+    total = pixels * MODE_BYTES.get(header["mode"], (4, 4))[1] + SLOT_ALIGNMENT
+    for map_name in settings.enabled_maps():
+        if map_name == "normal_map" and settings.writes_separately("normal_map"):
+            count = len(settings.normal_map_kernel_sizes())
+        elif map_name == "packed" or settings.writes_separately(map_name):
+            count = 1
+        else:
+            continue
+        total += count * (pixels * MAP_RESULT_BYTES[map_name] + SLOT_ALIGNMENT)
+    return total
+
+class SlotSink:
+    """
+    Worker-side sink that puts outputs into a shared memory slot.
+
+    # Looks like any other sink to process_image, except nothing gets
+    # encoded here. Arrays are copied straight into the slot and only a
+    # little description of where they are goes to the writer. Without a
+    # slot (or when the slot is full) the image itself gets pickled, which
+    # is exactly the expensive thing the slots are there to avoid.
+    """
+
+    def __init__(self, output_dir, buffer=None):
+        """Initialize a sink for one image, writing into buffer if there is one."""
+        self.output_dir = output_dir
+        self.buffer = buffer
+        self.offset = 0
+        self.entries = []
+        self.shared_bytes = 0
+
+    def location(self, relative_dir):
+        """Get where a relative output folder ends up."""
+        return os.path.join(self.output_dir, relative_dir)
+
+    def save_image(self, relative_path, image):
+        """
+        Hand a PIL image to the writer.
+
+        Returns:
+            Path the writer will save it to
+        """
+        if self.buffer is not None and image.mode in SLOT_MODES:
+            array = np.asarray(image)
+            end = self.offset + array.nbytes
+            if end <= len(self.buffer):
+                target = np.ndarray(array.shape, array.dtype, buffer=self.buffer, offset=self.offset)
+                target[...] = array
+                del target
+                self.entries.append({
+                    "path": relative_path,
+                    "shape": array.shape,
+                    "dtype": array.dtype.str,
+                    "offset": self.offset
+                })
+                self.offset = -(-end // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+                self.shared_bytes += array.nbytes
+                return os.path.join(self.output_dir, relative_path)
+
+        self.entries.append({"path": relative_path, "image": image})
+        return os.path.join(self.output_dir, relative_path)
+
+    def discard(self, paths):
+        """
+        Drop the outputs of a cancelled image before the writer ever sees them.
+
+        # Nothing is on disk yet, so there's nothing to delete, the writer
+        # just gets an empty list and hands the slot straight back.
+        """
+        paths = set(paths)
+        self.entries = [entry for entry in self.entries
+                        if os.path.join(self.output_dir, entry["path"]) not in paths]
+
+    def close(self):
+        """Nothing to flush, the writer owns the files."""
+        return None
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+def _init_worker(output_dir, settings, slot_names, free_slots, writer_queue, writer_gone, opencv_threads=None,
+                 cancel_events=None):
+    """Attach a compute worker process to the slots and queues, and to the batch's cancel token."""
+    # Import here, the processor imports this module
+    from src.cancellation import CancelToken
+
+    if opencv_threads is not None:
+        cv2.setNumThreads(int(opencv_threads))
+    _worker["cancel"] = CancelToken(*cancel_events) if cancel_events is not None else None
+    _worker["output_dir"] = output_dir
+    _worker["settings"] = settings
+    _worker["slots"] = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    _worker["free_slots"] = free_slots
+    _worker["writer_queue"] = writer_queue
+    _worker["writer_gone"] = writer_gone
+
+def _acquire_slot():
+    """Wait for a free slot, which is where the backpressure comes from."""
+    while True:
+        try:
+            return _worker["free_slots"].get(timeout=SLOT_POLL_SECONDS)
+        except queue.Empty:
+            if _worker["writer_gone"].is_set():
+                raise RuntimeError("The writer process is gone")
+
+def _process_job(source, use_slot=True):
+    """
+    Process one image in a worker process.
+
+    # Images too big for a slot don't wait for one, their maps are pickled.
+    # A cancelled image stops at its next checkpoint like it would on a
+    # thread, and the maps it had already made never reach the writer.
+    # The stages ran on this process's monitor, so their timings go back
+    # with the job stats for the parent's dashboard and metrics.
+
+    Returns:
+        (process_image result, job stats)
+    """
+    # Import here, the processor imports this module
+    from src.texture_processor import processor
+
+    slot = _acquire_slot() if use_slot and _worker["slots"] else None
+    sink = SlotSink(_worker["output_dir"], _worker["slots"][slot].buf if slot is not None else None)
+    before = monitor.snapshot()
+    try:
+        result = processor.process_image(source, _worker["output_dir"], _worker["settings"], sink, _worker["cancel"])
+    finally:
+        sink.buffer = None
+        payload = pickle.dumps({"slot": slot, "input_path": source, "entries": sink.entries},
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        _worker["writer_queue"].put(payload)
+    after = monitor.snapshot()
+
+    return result, {
+        "message_bytes": len(payload),
+        "shared_bytes": sink.shared_bytes,
+        "pixels": after["pixels_processed"] - before["pixels_processed"],
+        "bytes_read": after["bytes_read"] - before["bytes_read"],
+        "stages": stage_changes(before, after)
+    }
+
+def _writer_main(output_dir, slot_names, free_slots, writer_queue, stats_queue, writer_gone):
+    """
+    Encode and save everything the workers put in the slots (runs in the writer process).
+
+    # Arrays are wrapped around the shared memory as they are, no copy,
+    # and handed to the sink. A slot goes back on the free list as soon as
+    # its image is saved. The bytes written and the time spent writing go
+    # back to the parent after every image, on the stats queue.
+    """
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    sink = DirectorySink(output_dir)
+    stats = {"writes": 0, "failed_inputs": []}
+    try:
+        while True:
+            payload = writer_queue.get()
+            if payload is None:
+                break
+            message = pickle.loads(payload)
+            before = monitor.snapshot()
+            try:
+                for entry in message["entries"]:
+                    if "image" in entry:
+                        image = entry["image"]
+                    else:
+                        array = np.ndarray(entry["shape"], np.dtype(entry["dtype"]),
+                                           buffer=slots[message["slot"]].buf, offset=entry["offset"])
+                        image = Image.fromarray(array)
+                    with monitor.stage("write"):
+                        sink.save_image(entry["path"], image)
+                    stats["writes"] += 1
+                    array = image = None
+            except Exception as e:
+                logger.exception(f"Error writing outputs of {message['input_path']}: {e}")
+                stats["failed_inputs"].append(message["input_path"])
+            finally:
+                if message["slot"] is not None:
+                    free_slots.put(message["slot"])
+                after = monitor.snapshot()
+                stats_queue.put({"progress": True, "bytes_written": after["bytes_written"] - before["bytes_written"],
+                                 "stages": stage_changes(before, after)})
+        sink.close()
+    finally:
+        writer_gone.set()
+        stats_queue.put(stats)
+        for slot in slots:
+            slot.close()
+
+class SharedMemoryPipeline:
+    """
+    Process pool plus a writer process, with outputs handed over in shared memory.
+
+    # Threads share the GIL with the Python parts of every job, processes
+    # don't. But returning a 4K normal map from a process means pickling 48 MB
+    # and copying it through a pipe, twice if it then goes to a writer. So
+    # workers write their maps into a ring of shared memory slots instead and
+    # only send the writer a description of where they are. When every slot
+    # is waiting to be written, the workers wait too, so a slow disk can't
+    # let finished maps pile up in memory.
+    """
+
+    def __init__(self, output_dir, settings, max_workers, slot_bytes, slot_count=None, shared=True, opencv_threads=None,
+                 oversized=None, cancel=None):
+        """
+        Start the workers and the writer.
+
+        Args:
+            slot_bytes: Size of each slot
+            slot_count: Number of slots (defaults to shm_slots, or two more than the workers)
+            shared: Hand outputs over in shared memory, False pickles them instead (for comparison)
+            opencv_threads: OpenCV threads in each worker process, OpenCV's default if None
+            oversized: Inputs whose outputs don't fit a slot, they're pickled without waiting for one
+            cancel: Optional CancelToken, passed on to the worker processes so they pause and stop mid-image
+        """
+        if slot_count is None:
+            slot_count = config.get("shm_slots", 0) or max_workers + 2
+        # Spawned, not forked: forking a process whose scheduler threads and
+        # Numba thread pool are busy can leave the children stuck on their locks
+        context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.slots = [shared_memory.SharedMemory(create=True, size=max(1, slot_bytes)) for _ in range(slot_count)] if shared else []
+        slot_names = [slot.name for slot in self.slots]
+
+        self.free_slots = context.Queue()
+        for index in range(len(self.slots)):
+            self.free_slots.put(index)
+        # Without slots the queue itself has to push back
+        self.writer_queue = context.Queue(maxsize=0 if shared else slot_count)
+        self.stats_queue = context.Queue()
+        self.writer_gone = context.Event()
+        # The token's two events, mirrored into ones the worker processes can see
+        self.cancel = cancel
+        cancel_events = (context.Event(), context.Event()) if cancel is not None else None
+        self.cancel_events = cancel_events
+        self._sync_cancel()
+
+        self.writer = context.Process(target=_writer_main, name="TextureWriter", daemon=True,
+                                      args=(output_dir, slot_names, self.free_slots, self.writer_queue,
+                                            self.stats_queue, self.writer_gone))
+        self.writer.start()
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker,
+                                            initargs=(output_dir, settings, slot_names, self.free_slots,
+                                                      self.writer_queue, self.writer_gone, opencv_threads,
+                                                      cancel_events))
+        self.oversized = set(oversized or ())
+        self.writer_stats = None
+        self.ring_bytes = sum(slot.size for slot in self.slots)
+        self.closed = False
+        self.stats = {
+            "workers": max_workers,
+            "slots": len(self.slots),
+            "slot_bytes": slot_bytes if shared else 0,
+            "ring_bytes": self.ring_bytes,
+            "jobs": 0,
+            "unshared_jobs": 0,
+            "ipc_bytes": 0,
+            "shared_bytes": 0,
+            "writes": 0,
+            "failed_inputs": []
+        }
+        logger.info(f"Started {max_workers} worker processes and a writer"
+                    + (f" with {len(self.slots)} slots of {slot_bytes / (1024 * 1024):.1f} MB" if shared else ""))
+
+    @classmethod
+    def for_batch(cls, inputs, output_dir, settings, max_workers, shared=True, opencv_threads=None, memory_budget=None,
+                  cancel=None):
+        """
+        Start a pipeline with slots sized for a batch, within a share of the memory budget.
+
+        # Every slot is as big as the largest image's outputs, but the whole
+        # ring gets at most shm_budget_fraction of the budget. One 16K texture
+        # in a folder of 1K ones would otherwise make max_workers + 2 slots of
+        # several GB each. Images that don't fit the capped slots go the
+        # pickled way instead, and the caller takes ring_bytes off the budget.
+
+        Args:
+            memory_budget: Memory budget of the batch in bytes, half the machine's RAM if None
+            cancel: Optional CancelToken for the worker processes to check
+        """
+        # Import here, the planner imports the processor which imports this module
+        from src.batch_planner import read_headers
+        inputs = list(inputs)
+        sizes = {}
+        for source, header in zip(inputs, read_headers(inputs)):
+            if "error" not in header:
+                sizes[source] = job_output_bytes(header, settings)
+
+        slot_count = config.get("shm_slots", 0) or max_workers + 2
+        if memory_budget is None:
+            memory_budget = get_total_memory() // 2
+        ring_budget = int(memory_budget * min(1.0, max(0.0, config.get("shm_budget_fraction", 0.25))))
+        slot_bytes = max(SLOT_ALIGNMENT, min(max(sizes.values(), default=SLOT_ALIGNMENT), ring_budget // slot_count))
+        oversized = [source for source, size in sizes.items() if size > slot_bytes]
+        if oversized and shared:
+            logger.info(f"{len(oversized)} images are too big for the {slot_bytes / (1024 * 1024):.1f} MB slots "
+                        f"and will be pickled instead")
+        return cls(output_dir, settings, max_workers, slot_bytes, slot_count, shared=shared,
+                   opencv_threads=opencv_threads, oversized=oversized, cancel=cancel)
+
+    def process(self, source):
+        """
+        Process one image in a worker process and wait for it.
+
+        # Called from the scheduler's threads, which are now just waiting
+        # around, so the memory budget still decides what runs when.
+        """
+        started = monitor.job_started(source)
+        use_slot = source not in self.oversized
+        future = self.executor.submit(_process_job, source, use_slot)
+        poll_seconds = CANCEL_POLL_SECONDS if self.cancel is not None else SLOT_POLL_SECONDS
+        while True:
+            self._sync_cancel()
+            try:
+                result, job_stats = future.result(timeout=poll_seconds)
+                break
+            except FutureTimeoutError:
+                if not self.writer.is_alive():
+                    self.writer_gone.set()
+                    monitor.job_finished(started, False)
+                    raise RuntimeError("The writer process exited")
+            except Exception:
+                monitor.job_finished(started, False)
+                raise
+
+        monitor.add_stages(job_stats["stages"])
+        monitor.job_finished(started, result["success"], job_stats["pixels"], job_stats["bytes_read"],
+                             cancelled=result.get("cancelled", False))
+        self._read_writer_stats()
+        with self.lock:
+            self.stats["jobs"] += 1
+            if self.slots and not use_slot:
+                self.stats["unshared_jobs"] += 1
+            self.stats["ipc_bytes"] += job_stats["message_bytes"] + len(pickle.dumps(source)) + len(pickle.dumps(result))
+            self.stats["shared_bytes"] += job_stats["shared_bytes"]
+        return result
+
+    def _sync_cancel(self):
+        """Pass the cancel token's pause and cancel on to the worker processes."""
+        if self.cancel is None:
+            return
+        cancelled, running = self.cancel_events
+        if self.cancel.cancelled:
+            cancelled.set()
+        if self.cancel.paused:
+            running.clear()
+        else:
+            running.set()
+
+    def _read_writer_stats(self, timeout=None):
+        """
+        Pass what the writer reported so far on to the monitor.
+
+        Returns:
+            The writer's final stats once it has sent them, otherwise None
+        """
+        while self.writer_stats is None:
+            try:
+                if timeout is None:
+                    stats = self.stats_queue.get_nowait()
+                else:
+                    stats = self.stats_queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if not stats.get("progress"):
+                self.writer_stats = stats
+                break
+            monitor.add_bytes_written(stats["bytes_written"])
+            monitor.add_stages(stats["stages"])
+        return self.writer_stats
+
+    def close(self):
+        """
+        Wait for every job and every write to finish, then free the slots.
+
+        Returns:
+            Stats dict, including the inputs whose outputs failed to write
+        """
+        if self.closed:
+            return self.stats
+        self.closed = True
+        self.executor.shutdown(wait=True)
+        if self.writer.is_alive():
+            self.writer_queue.put(None)
+
+        writer_stats = None
+        while writer_stats is None:
+            writer_stats = self._read_writer_stats(SLOT_POLL_SECONDS)
+            if writer_stats is None:
+                if not self.writer.is_alive():
+                    logger.error(f"The writer process exited with code {self.writer.exitcode}")
+                    writer_stats = {"writes": 0, "failed_inputs": []}
+        self.writer.join()
+
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+        self.stats["writes"] = writer_stats["writes"]
+        self.stats["failed_inputs"] = writer_stats["failed_inputs"]
+        logger.info(f"Handed {self.stats['shared_bytes'] / (1024 * 1024):.1f} MB over in shared memory, "
+                    f"{self.stats['ipc_bytes'] / (1024 * 1024):.2f} MB through pipes")
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def run_benchmark(input_dir, max_workers=None):
+    """
+    Process a directory with and without shared memory and compare the IPC bytes.
+
+    # Both runs use the same worker processes and the same writer, the only
+    # difference is whether the maps travel through slots or get pickled.
+
+    Returns:
+        Dict with the stats and seconds of both runs
+    """
+    import tempfile
+    from src.processing_context import ProcessingSettings
+    from src.scheduler import MemoryBudgetScheduler
+
+    paths = [os.path.join(input_dir, filename) for filename in sorted(os.listdir(input_dir))
+             if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
+    settings = ProcessingSettings.from_config()
+
+    report = {"files": len(paths)}
+    for name, shared in (("pickled", False), ("shared_memory", True)):
+        scheduler = MemoryBudgetScheduler(max_workers=max_workers)
+        with tempfile.TemporaryDirectory() as output_dir:
+            started = time.perf_counter()
+            with SharedMemoryPipeline.for_batch(paths, output_dir, settings, scheduler.max_workers, shared=shared,
+                                                memory_budget=scheduler.memory_budget) as pipeline:
+                scheduler.reserve(pipeline.ring_bytes)
+                scheduler.run(paths, pipeline.process, settings.enabled_maps())
+            report[name] = dict(pipeline.stats, seconds=time.perf_counter() - started)
+    return report
+
+if __name__ == "__main__":
+    # Compare IPC bytes with and without shared memory on a directory
+    if len(sys.argv) > 1:
+        report = run_benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        for name in ("pickled", "shared_memory"):
+            stats = report[name]
+            print(f"{name:>14}: {stats['ipc_bytes'] / (1024 * 1024):9.2f} MB through pipes, "
+                  f"{stats['shared_bytes'] / (1024 * 1024):9.2f} MB in shared memory, {stats['seconds']:.2f}s")
+        print(f"IPC bytes cut by {report['pickled']['ipc_bytes'] / max(1, report['shared_memory']['ipc_bytes']):.0f}x "
+              f"over {report['files']} files")
+    else:
+        print("Usage: python -m src.shm_pipeline <input_directory> [<workers>]")
@@ -5,12 +5,49 @@
 # ---
 
 import os
+import time
 import uuid
 from PIL import Image
 import numpy as np
 import cv2
 from src.logger import logger
 from src.config import config
+from src.scheduler import MemoryBudgetScheduler
+from src.output_sink import DirectorySink, create_sink, encode_png
+from src.dedup import DedupReport, find_duplicates, rename_output
+from src.archive_input import ArchiveReader, is_archive, open_input, get_input_size, get_output_name
+from src.processing_context import ProcessingSettings, PACKED_CHANNEL_SOURCES, get_context
+from src.instrumentation import monitor
+from src.tracer import tracer
+from src.batch_planner import plan_batch, list_directory
+from src.shm_pipeline import SharedMemoryPipeline
+from src.kernels import normal_map_from_gradients, invert_image, pack_normal_channel
+from src.height_field import integrate_gradients_tiled, height_to_image, DEFAULT_TILE_SIZE
+from src.autotune import tuned_split, set_opencv_threads
+from src.batch_results import ResultStream
+from src.cancellation import ProcessingCancelled, checkpoint
+
+# Steps in the lost detail bigger than this (in grey levels) are treated as edges
+AO_FAST_EDGE_SIGMA = 37.5
+
+# Edge gate for the fast AO filter, indexed by detail + 255
+_detail = np.arange(-255, 256, dtype=np.float32)
+AO_FAST_EDGE_LUT = np.rint(
+    _detail * (1.0 - np.exp(-(_detail * _detail) / (2.0 * AO_FAST_EDGE_SIGMA ** 2)))
+).astype(np.int16)
+del _detail
+
+# Roughly how many pixels the curvature normalisation percentile looks at
+CURVATURE_SCALE_SAMPLES = 250000
+
+# Rows the AO bilateral filter does between cancel checks
+AO_BAND_ROWS = 1024
+
+# Rows converted to grayscale or turned into a normal map at a time in low-memory mode
+LOW_MEMORY_BAND_ROWS = 128
+
+# Side of the synthetic image warm_up runs every generator on
+WARM_UP_SIZE = 64
 
 class TextureProcessor:
     """
@@ -36,120 +73,409 @@ class TextureProcessor:
             logger.error(f"Invalid kernel size: {size}. Must be odd and >= 3")
             return False
             
-    def process_image(self, input_path, output_dir=None):
+    def get_settings(self, **overrides):
+        """
+        Get an immutable snapshot of the current processing settings.
+        
+        # Anything passed in overrides the config, so callers can run jobs
+        # with different settings side by side without touching config.json.
+        """
+        overrides.setdefault("kernel_size", self.kernel_size)
+        return ProcessingSettings.from_config(**overrides)
+            
+    def process_image(self, input_path, output_dir=None, settings=None, sink=None, cancel=None):
         """
         Process an image to generate normal map, bump map, and AO/roughness map.
         
         # Takes an image, applies some filters, and spits out some other images.
         # It's like Instagram, but for game developers who don't know how to use Substance.
+        # The settings are bound once up front, so it's safe to run many of these
+        # in threads while someone fiddles with the options. Maps go to the sink,
+        # which is a plain folder tree unless somebody hands us an archive.
+        # A cancel token is checked between stages and between tiles. When it
+        # fires, the outputs already written for this image are removed again.
+        # Low-memory mode never makes a NumPy copy of the whole decoded image,
+        # drops the image once it's grayscale, and drops every map once it's
+        # saved unless it's waiting to be packed.
         """
         if output_dir is None:
             output_dir = config.get("export_directory", "./export/")
             
+        if settings is None:
+            settings = self.get_settings()
+            
+        # A sink we made ourselves is ours to commit before returning
+        own_sink = sink is None
+        if own_sink:
+            sink = DirectorySink(output_dir)
+            
+        job_started = monitor.job_started(input_path)
+        original_output_path = None
+        results = {}
         try:
-            # Ensure output directory exists
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-                logger.info(f"Created output directory: {output_dir}")
-                
             # Load the image
+            checkpoint(cancel)
             logger.info(f"Processing image: {input_path}")
-            image = Image.open(input_path)
-            image_np = np.array(image)
+            with monitor.stage("decode"):
+                image = open_input(input_path)
+                if settings.low_memory:
+                    image.load()
+                    image_np = None
+                else:
+                    image_np = np.array(image)
+            checkpoint(cancel)
             
             # Get image details
-            image_size = os.path.getsize(input_path)
+            image_size = get_input_size(input_path)
             image_dimensions = image.size
             logger.info(f"Image size: {image_size} bytes, dimensions: {image_dimensions}")
             
             # Create a folder for the output using the base filename
-            base_filename = os.path.splitext(os.path.basename(input_path))[0]
-            image_output_dir = os.path.join(output_dir, base_filename)
-            if not os.path.exists(image_output_dir):
-                os.makedirs(image_output_dir)
+            base_filename = os.path.splitext(get_output_name(input_path))[0]
+            image_output_dir = sink.location(base_filename)
                 
             # Save a copy of the original image
-            original_output_path = os.path.join(image_output_dir, f"{base_filename}_original.png")
-            image.save(original_output_path)
+            with monitor.stage("save"):
+                original_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_original.png"), image)
             logger.info(f"Saved original image to: {original_output_path}")
             
             # Convert to grayscale
-            if len(image_np.shape) == 3 and image_np.shape[2] >= 3:
-                if image_np.shape[2] == 4:  # RGBA
-                    gray_image = cv2.cvtColor(image_np, cv2.COLOR_RGBA2GRAY)
-                else:  # RGB
-                    gray_image = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-            else:  # Already grayscale
-                gray_image = image_np
-                
-            results = {}
-                
-            # Generate Normal Map if enabled
-            if config.get("enable_normal_map", True):
-                normal_map = self._generate_normal_map(gray_image)
-                normal_map_output_path = os.path.join(image_output_dir, f"{base_filename}_normal_map.png")
-                Image.fromarray(normal_map).save(normal_map_output_path)
-                logger.info(f"Saved normal map to: {normal_map_output_path}")
-                results["normal_map"] = normal_map_output_path
+            checkpoint(cancel)
+            with monitor.stage("grayscale"):
+                if settings.low_memory:
+                    gray_image = self._grayscale_in_bands(image)
+                    image.close()
+                    image = None
+                else:
+                    gray_image = self._to_grayscale(image_np)
+                    
+            maps = {}
+            image_shape = gray_image.shape[:2]
+            
+            # Maps the packed layout reads stay until packing, the rest can go once they're saved
+            packed_sources = settings.packed_sources() if settings.packed else set()
+            def release(map_name):
+                if settings.low_memory and map_name not in packed_sources:
+                    maps.pop(map_name, None)
+                
+            # Curvature, cavity and height reuse the Sobel planes of the main kernel size
+            needs_divergence = settings.generates("curvature") or settings.generates("cavity")
+            keep_gradients = needs_divergence or settings.generates("height_map")
+            gradients = None
+                
+            # Generate Normal Map if enabled, one per kernel size when sweeping
+            if settings.generates("normal_map"):
+                if settings.writes_separately("normal_map"):
+                    for kernel_size in settings.normal_map_kernel_sizes():
+                        checkpoint(cancel)
+                        with monitor.stage("normal_map"):
+                            if settings.low_memory and not (keep_gradients and kernel_size == settings.kernel_size):
+                                # Nobody needs the full gradient planes afterwards, so never make them
+                                sweep_gradients = None
+                                normal_map = self._generate_normal_map_in_bands(gray_image, kernel_size)
+                            else:
+                                sweep_gradients = self._compute_gradients(gray_image, kernel_size)
+                                normal_map = self._generate_normal_map(gray_image, kernel_size, sweep_gradients)
+                        if kernel_size == settings.kernel_size:
+                            maps["normal_map"] = normal_map
+                            if keep_gradients:
+                                gradients = sweep_gradients
+                        sweep_gradients = None
+                        map_name = f"normal_map_k{kernel_size}" if settings.sweeping else "normal_map"
+                        with monitor.stage("save"):
+                            normal_map_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_{map_name}.png"), Image.fromarray(normal_map))
+                        logger.info(f"Saved normal map (kernel size {kernel_size}) to: {normal_map_output_path}")
+                        results[map_name] = normal_map_output_path
+                        normal_map = None
+                    release("normal_map")
+                        
+                # Packing wants the normal map at the main kernel size, even if the sweep skipped it
+                if "normal_map" not in maps and settings.packed and "normal_map" in settings.packed_sources():
+                    checkpoint(cancel)
+                    with monitor.stage("normal_map"):
+                        gradients = self._compute_gradients(gray_image, settings.kernel_size)
+                        maps["normal_map"] = self._generate_normal_map(gray_image, settings.kernel_size, gradients)
+                    if not keep_gradients:
+                        gradients = None
+                
+            # Generate Curvature and Cavity Maps if enabled, from one divergence
+            if needs_divergence:
+                checkpoint(cancel)
+                with monitor.stage("curvature" if settings.generates("curvature") else "cavity"):
+                    if gradients is None:
+                        gradients = self._compute_gradients(gray_image, settings.kernel_size)
+                    divergence, divergence_scale = self._compute_divergence(*gradients)
+                    if not settings.generates("height_map"):
+                        gradients = None
+                for map_name, generate in (("curvature", self._generate_curvature_map),
+                                           ("cavity", self._generate_cavity_map)):
+                    if not settings.generates(map_name):
+                        continue
+                    checkpoint(cancel)
+                    with monitor.stage(map_name):
+                        maps[map_name] = generate(divergence, divergence_scale)
+                    if settings.writes_separately(map_name):
+                        with monitor.stage("save"):
+                            map_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_{map_name}.png"), Image.fromarray(maps[map_name]))
+                        logger.info(f"Saved {map_name} map to: {map_output_path}")
+                        results[map_name] = map_output_path
+                    release(map_name)
+                divergence = None
+                
+            # Generate Height Map if enabled, by integrating the gradients
+            if settings.generates("height_map"):
+                checkpoint(cancel)
+                with monitor.stage("height_map"):
+                    if gradients is None:
+                        gradients = self._compute_gradients(gray_image, settings.kernel_size)
+                    maps["height_map"] = self._generate_height_map(gradients, settings.height_boundary,
+                                                                   settings.height_tile_size, cancel)
+                    gradients = None
+                if settings.writes_separately("height_map"):
+                    with monitor.stage("save"):
+                        height_map_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_height_map.png"), Image.fromarray(maps["height_map"]))
+                    logger.info(f"Saved height map to: {height_map_output_path}")
+                    results["height_map"] = height_map_output_path
+                release("height_map")
                 
             # Generate Bump Map if enabled
-            if config.get("enable_bump_map", True):
-                bump_map = self._generate_bump_map(gray_image)
-                bump_map_output_path = os.path.join(image_output_dir, f"{base_filename}_bump_map.png")
-                Image.fromarray(bump_map).save(bump_map_output_path)
-                logger.info(f"Saved bump map to: {bump_map_output_path}")
-                results["bump_map"] = bump_map_output_path
+            if settings.generates("bump_map"):
+                checkpoint(cancel)
+                with monitor.stage("bump_map"):
+                    maps["bump_map"] = self._generate_bump_map(gray_image)
+                if settings.writes_separately("bump_map"):
+                    with monitor.stage("save"):
+                        bump_map_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_bump_map.png"), Image.fromarray(maps["bump_map"]))
+                    logger.info(f"Saved bump map to: {bump_map_output_path}")
+                    results["bump_map"] = bump_map_output_path
+                release("bump_map")
                 
             # Generate AO/Roughness Map if enabled
-            if config.get("enable_ao_roughness", False):
-                ao_roughness_map = self._generate_ao_roughness_map(gray_image)
-                ao_roughness_output_path = os.path.join(image_output_dir, f"{base_filename}_ao_roughness.png")
-                Image.fromarray(ao_roughness_map).save(ao_roughness_output_path)
-                logger.info(f"Saved AO/roughness map to: {ao_roughness_output_path}")
-                results["ao_roughness"] = ao_roughness_output_path
+            if settings.generates("ao_roughness"):
+                checkpoint(cancel)
+                with monitor.stage("ao_roughness"):
+                    maps["ao_roughness"] = self._generate_ao_roughness_map(gray_image, settings.ao_quality, cancel)
+                if settings.low_memory:
+                    # AO is the last thing that reads the grayscale plane
+                    gray_image = None
+                if settings.writes_separately("ao_roughness"):
+                    with monitor.stage("save"):
+                        ao_roughness_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_ao_roughness.png"), Image.fromarray(maps["ao_roughness"]))
+                    logger.info(f"Saved AO/roughness map to: {ao_roughness_output_path}")
+                    results["ao_roughness"] = ao_roughness_output_path
+                release("ao_roughness")
+                    
+            # Pack the single-channel maps into one image if requested
+            if settings.packed:
+                checkpoint(cancel)
+                if settings.low_memory:
+                    gray_image = None
+                with monitor.stage("pack"):
+                    packed_map = self._pack_channels(settings.packed_layout, maps, image_shape)
+                with monitor.stage("save"):
+                    packed_output_path = sink.save_image(os.path.join(base_filename, f"{base_filename}_packed.png"), Image.fromarray(packed_map))
+                logger.info(f"Saved packed map ({'/'.join(settings.packed_layout)}) to: {packed_output_path}")
+                results["packed"] = packed_output_path
+                
+            if own_sink:
+                sink.close()
                 
             logger.info(f"Successfully processed image: {input_path}")
+            monitor.job_finished(job_started, True, image_dimensions[0] * image_dimensions[1], image_size)
             return {
                 "success": True,
                 "input_path": input_path,
                 "output_dir": image_output_dir,
+                "original": original_output_path,
                 "results": results
             }
+            
+        except ProcessingCancelled:
+            logger.info(f"Cancelled processing image: {input_path}")
+            # Half a set of maps is worse than none, it looks done
+            written = list(results.values()) + ([original_output_path] if original_output_path else [])
+            try:
+                if written:
+                    sink.discard(written)
+                if own_sink:
+                    sink.close()
+            except Exception as e:
+                logger.exception(f"Error removing partial outputs of {input_path}: {e}")
+            monitor.job_finished(job_started, False, cancelled=True)
+            return {
+                "success": False,
+                "input_path": input_path,
+                "cancelled": True,
+                "error": "Cancelled"
+            }
                 
         except Exception as e:
             logger.exception(f"Error processing image {input_path}: {e}")
+            if own_sink:
+                # Keep whatever did get written, it's complete even if the set isn't
+                try:
+                    sink.close()
+                except Exception as close_error:
+                    logger.exception(f"Error committing outputs of {input_path}: {close_error}")
+            monitor.job_finished(job_started, False)
             return {
                 "success": False,
                 "input_path": input_path,
                 "error": str(e)
             }
             
-    def _generate_normal_map(self, gray_image):
+    def _to_grayscale(self, image_np):
+        """
+        Convert a decoded array to 8-bit grayscale.
+        
+        # RGB and RGBA are converted, gray is already as gray as it gets.
+        # 16-bit gray (I;16, or I from some TIFFs) is scaled down to 8 bits,
+        # equalizeHist and the 255 - x inversion only work on uint8.
+        """
+        if len(image_np.shape) == 3 and image_np.shape[2] >= 3:
+            if image_np.shape[2] == 4:  # RGBA
+                return cv2.cvtColor(image_np, cv2.COLOR_RGBA2GRAY)
+            return cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+        if image_np.dtype != np.uint8 and np.issubdtype(image_np.dtype, np.integer):
+            # Rounded to the nearest of 255 levels, so an 8-bit value v stored as v * 257 comes back as v
+            return cv2.convertScaleAbs(image_np, alpha=255.0 / 65535.0)
+        return image_np
+        
+    def _grayscale_in_bands(self, image):
+        """
+        Convert a PIL image to a grayscale array a band of rows at a time.
+        
+        # np.array(image) of a 16K RGBA texture is another gigabyte on top of
+        # the one PIL already holds. Band by band, the only full-size array is
+        # the grayscale plane. Same pixels as converting the whole thing.
+        """
+        width, height = image.size
+        gray_image = None
+        for top in range(0, height, LOW_MEMORY_BAND_ROWS):
+            bottom = min(top + LOW_MEMORY_BAND_ROWS, height)
+            band = self._to_grayscale(np.asarray(image.crop((0, top, width, bottom))))
+            if gray_image is None:
+                gray_image = np.empty((height,) + band.shape[1:], dtype=band.dtype)
+            gray_image[top:bottom] = band
+        return gray_image
+        
+    def _compute_gradients(self, gray_image, kernel_size=None):
+        """
+        Compute the Sobel x and y gradient planes of a grayscale image.
+        
+        # The expensive part of the normal map, kept around so curvature and
+        # cavity don't have to pay for it a second time.
+        """
+        if kernel_size is None:
+            kernel_size = self.kernel_size
+            
+        sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=kernel_size)
+        sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=kernel_size)
+        return sobelx, sobely
+        
+    def _generate_normal_map(self, gray_image, kernel_size=None, gradients=None):
         """
         Generate a normal map from a grayscale image.
         
         # Applies the Sobel operator to create a normal map.
         # It's basically just calculating derivatives, but we'll pretend it's magic.
+        # Pass in gradients from _compute_gradients to skip the Sobel pass.
         """
         # Generate Normal Map using Sobel filter
-        sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=self.kernel_size)
-        sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=self.kernel_size)
+        if gradients is None:
+            gradients = self._compute_gradients(gray_image, kernel_size)
+        sobelx, sobely = gradients
         
-        # Normalize Sobel results to get x and y gradients
-        sobelx = sobelx / np.max(np.abs(sobelx)) * 0.5 + 0.5
-        sobely = sobely / np.max(np.abs(sobely)) * 0.5 + 0.5
+        # Normalize the gradients to 0-255 and pack them as red (x) and green (y),
+        # with a constant blue (z), in one pass on the selected kernel backend
+        normal_map = normal_map_from_gradients(sobelx, sobely)
         
-        # Create Normal Map with x, y gradients and constant z component
-        normal_map = np.zeros((gray_image.shape[0], gray_image.shape[1], 3), dtype=np.float32)
-        normal_map[:, :, 0] = sobelx  # Red channel for x
-        normal_map[:, :, 1] = sobely  # Green channel for y
-        normal_map[:, :, 2] = 1.0     # Blue channel for z
+        return normal_map
         
-        # Normalize to 0-255 and convert to uint8
-        normal_map = (normal_map * 255).astype(np.uint8)
+    def _generate_normal_map_in_bands(self, gray_image, kernel_size=None):
+        """
+        Generate a normal map a band of rows at a time, without full-size gradient planes.
         
+        # The two float32 Sobel planes are 8 bytes a pixel, more than the
+        # normal map itself. Banded, one pass finds the scale of each plane
+        # and a second one packs the bands with it. Twice the Sobel work,
+        # same bytes as _generate_normal_map.
+        """
+        if kernel_size is None:
+            kernel_size = self.kernel_size
+            
+        height = gray_image.shape[0]
+        reach = kernel_size // 2
+        
+        def bands():
+            for top in range(0, height, LOW_MEMORY_BAND_ROWS):
+                bottom = min(top + LOW_MEMORY_BAND_ROWS, height)
+                start, end = max(0, top - reach), min(height, bottom + reach)
+                sobelx, sobely = self._compute_gradients(gray_image[start:end], kernel_size)
+                yield top, bottom, sobelx[top - start:bottom - start], sobely[top - start:bottom - start]
+                
+        scale_x = scale_y = np.float32(0.0)
+        for _, _, sobelx, sobely in bands():
+            scale_x = max(scale_x, np.max(np.abs(sobelx)))
+            scale_y = max(scale_y, np.max(np.abs(sobely)))
+            
+        normal_map = np.empty((height, gray_image.shape[1], 3), dtype=np.uint8)
+        for top, bottom, sobelx, sobely in bands():
+            pack_normal_channel(sobelx, scale_x if scale_x > 0 else np.float32(1.0), normal_map[top:bottom, :, 0])
+            pack_normal_channel(sobely, scale_y if scale_y > 0 else np.float32(1.0), normal_map[top:bottom, :, 1])
+        normal_map[:, :, 2] = 255
         return normal_map
         
+    def _compute_divergence(self, sobelx, sobely):
+        """
+        Compute the divergence of the gradient field, and the scale to normalise it by.
+        
+        # d(sobelx)/dx + d(sobely)/dy, a Laplacian of the height with the Sobel
+        # smoothing already baked in. Two small 3x3 passes over planes we already
+        # have, instead of decoding the normal map and differentiating it again.
+        # The scale is the 99.5th percentile of its magnitude on a subsample, so
+        # a few extreme pixels don't wash the whole map out to grey.
+        """
+        divergence = cv2.Sobel(sobelx, cv2.CV_32F, 1, 0, ksize=3)
+        divergence += cv2.Sobel(sobely, cv2.CV_32F, 0, 1, ksize=3)
+        
+        step = max(1, int(np.sqrt(divergence.size / CURVATURE_SCALE_SAMPLES)))
+        scale = float(np.percentile(np.abs(divergence[::step, ::step]), 99.5))
+        return divergence, scale if scale > 0 else 1.0
+        
+    def _generate_curvature_map(self, divergence, scale):
+        """
+        Generate a curvature map from the divergence of the gradients.
+        
+        # Mid grey is flat, convex bumps and ridges go bright, concave
+        # dents and grooves go dark. Edge wear masks in one texture.
+        """
+        curvature = divergence * np.float32(-127.5 / scale)
+        curvature += np.float32(127.5)
+        return np.clip(curvature, 0, 255, out=curvature).astype(np.uint8)
+        
+    def _generate_cavity_map(self, divergence, scale):
+        """
+        Generate a cavity map from the divergence of the gradients.
+        
+        # White everywhere except the concave bits, which go dark the deeper
+        # they are. Multiply it over the albedo and dirt collects in the cracks.
+        """
+        cavity = divergence * np.float32(-255.0 / scale)
+        cavity += np.float32(255.0)
+        return np.clip(cavity, 0, 255, out=cavity).astype(np.uint8)
+        
+    def _generate_height_map(self, gradients, boundary="mirror", tile_size=DEFAULT_TILE_SIZE, cancel=None):
+        """
+        Generate a height map by integrating the gradients.
+        
+        # Unlike the bump map, which is the grayscale image with the contrast
+        # cranked, this is the surface the normal map actually describes.
+        # Solved with FFTs in tiles, so 8K takes seconds and memory stays put.
+        """
+        sobelx, sobely = gradients
+        return height_to_image(integrate_gradients_tiled(sobelx, sobely, boundary, tile_size, cancel))
+        
     def _generate_bump_map(self, gray_image):
         """
         Generate a bump map from a grayscale image.
@@ -163,7 +489,7 @@ class TextureProcessor:
         
         return bump_map
         
-    def _generate_ao_roughness_map(self, gray_image):
+    def _generate_ao_roughness_map(self, gray_image, ao_quality="quality", cancel=None):
         """
         Generate an ambient occlusion / roughness map from a grayscale image.
         
@@ -171,23 +497,148 @@ class TextureProcessor:
         # But we'll call it "AO/roughness" to sound fancy and technical.
         """
         # Invert the grayscale image for AO effect
-        inverted = 255 - gray_image
+        inverted = invert_image(gray_image)
         
         # Apply bilateral filter to smooth while preserving edges
-        filtered = cv2.bilateralFilter(inverted, 9, 75, 75)
+        if ao_quality == "fast":
+            filtered = self._fast_bilateral_filter(inverted)
+        else:
+            filtered = self._bilateral_filter(inverted, cancel)
+        inverted = None
+        checkpoint(cancel)
         
-        # Apply adaptive histogram equalization
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        # Apply adaptive histogram equalization (CLAHE is cached per thread)
+        clahe = get_context().get_clahe(2.0, (8, 8))
         ao_roughness = clahe.apply(filtered)
         
         return ao_roughness
         
-    def process_directory(self, input_dir, output_dir=None):
+    def _pack_channels(self, layout, maps, shape):
+        """
+        Pack single-channel maps into the channels of one image.
+        
+        # One PNG instead of three means one encode, one write and one inode.
+        # Engines want ORM-style packed textures anyway, so everybody wins.
+        """
+        if len(layout) not in (3, 4):
+            raise ValueError(f"Packed layout needs 3 or 4 channels, got {len(layout)}")
+            
+        packed = np.empty((shape[0], shape[1], len(layout)), dtype=np.uint8)
+        for index, channel in enumerate(layout):
+            map_name, source = PACKED_CHANNEL_SOURCES[channel]
+            if map_name is None:
+                packed[:, :, index] = source
+            elif source is None:
+                packed[:, :, index] = maps[map_name]
+            else:
+                packed[:, :, index] = maps[map_name][:, :, source]
+                
+        return packed
+        
+    def _bilateral_filter(self, image, cancel=None):
+        """
+        Run cv2.bilateralFilter(image, 9, 75, 75), in bands of rows when it can be cancelled.
+        
+        # On a 16K texture this one call is most of the AO time, and a call
+        # into OpenCV can't be interrupted. Each band takes the 4 rows the
+        # 9 pixel filter reaches past it along and throws them away, so the
+        # result is the same as filtering the whole image at once.
+        """
+        height = image.shape[0]
+        if cancel is None or height <= AO_BAND_ROWS:
+            return cv2.bilateralFilter(image, 9, 75, 75)
+            
+        reach = 9 // 2
+        filtered = np.empty_like(image)
+        for top in range(0, height, AO_BAND_ROWS):
+            cancel.check()
+            bottom = min(top + AO_BAND_ROWS, height)
+            start, end = max(0, top - reach), min(height, bottom + reach)
+            band = cv2.bilateralFilter(image[start:end], 9, 75, 75)
+            filtered[top:bottom] = band[top - start:bottom - start]
+        return filtered
+        
+    def _fast_bilateral_filter(self, image):
+        """
+        Approximate cv2.bilateralFilter(image, 9, 75, 75) at a fraction of the cost.
+        
+        # Filters a half-resolution copy, upsamples it, then adds back the detail
+        # the downsample lost wherever it looks like an edge the full filter would
+        # have kept. Edges that differ from their surroundings by much more than
+        # AO_FAST_EDGE_SIGMA come back at full resolution, noise below it stays smoothed.
+        #
+        # Error bound versus the quality mode, measured on the final AO/roughness
+        # map (after CLAHE): mean absolute error under 4 grey levels (about 2 on
+        # photographic textures, 99th percentile under 8). Thin high-contrast
+        # lines one or two pixels wide are where the largest differences show up.
+        # It's about 4-5x faster on 4K and larger inputs.
+        """
+        height, width = image.shape[:2]
+        if height < 4 or width < 4:
+            return cv2.bilateralFilter(image, 9, 75, 75)
+            
+        # Filter at half resolution with the same reach in full-resolution pixels
+        small = cv2.resize(image, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+        filtered = cv2.bilateralFilter(small, 5, 75, 37.5)
+        filtered = cv2.resize(filtered, (width, height), interpolation=cv2.INTER_LINEAR)
+        
+        # Detail lost by the downsample, gated so only edge-sized steps survive
+        base = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+        detail = cv2.subtract(image, base, dtype=cv2.CV_16S)
+        detail += 255
+        result = AO_FAST_EDGE_LUT[detail]
+        result += filtered
+        
+        return np.clip(result, 0, 255).astype(np.uint8)
+        
+    def warm_up(self, size=WARM_UP_SIZE):
+        """
+        Run every generator once on a tiny synthetic image, writing nothing.
+        
+        # The first call of anything pays extra: OpenCV starts its thread pool
+        # and picks its optimized code paths, Numba compiles, the thread gets
+        # its CLAHE. Better paid at startup than on the artist's first texture.
+        
+        Returns:
+            Seconds each step took, by step name
+        """
+        timings = {}
+        def timed(name, function, *args):
+            started = time.perf_counter()
+            value = function(*args)
+            timings[name] = time.perf_counter() - started
+            return value
+            
+        noise = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+        image_np = cv2.GaussianBlur(noise, (0, 0), 2)
+        gray_image = timed("grayscale", self._to_grayscale, image_np)
+        gradients = timed("gradients", self._compute_gradients, gray_image)
+        maps = {"normal_map": timed("normal_map", self._generate_normal_map, gray_image, None, gradients)}
+        timed("normal_map_bands", self._generate_normal_map_in_bands, gray_image)
+        divergence, divergence_scale = timed("divergence", self._compute_divergence, *gradients)
+        maps["curvature"] = timed("curvature", self._generate_curvature_map, divergence, divergence_scale)
+        maps["cavity"] = timed("cavity", self._generate_cavity_map, divergence, divergence_scale)
+        maps["height_map"] = timed("height_map", self._generate_height_map, gradients)
+        maps["bump_map"] = timed("bump_map", self._generate_bump_map, gray_image)
+        timed("ao_roughness_fast", self._generate_ao_roughness_map, gray_image, "fast")
+        maps["ao_roughness"] = timed("ao_roughness", self._generate_ao_roughness_map, gray_image, "quality")
+        packed_map = timed("pack", self._pack_channels, ("normal_x", "normal_y", "ao_roughness", "bump_map"), maps,
+                           gray_image.shape)
+        timed("encode", encode_png, Image.fromarray(packed_map))
+        return timings
+        
+    def process_directory(self, input_dir, output_dir=None, max_workers=None, memory_budget_mb=None, settings=None,
+                          deduplicate=None, dry_run=False, cancel=None):
         """
         Process all images in a directory.
         
         # Processes a whole directory of images at once.
         # Because doing them one at a time is for people with patience.
+        # Images run in parallel, but only as many as fit in the memory budget.
+        # Only the images at the top level, subfolders aren't walked into.
+        # A dry run only reads the headers and returns the batch plan instead,
+        # its skipped_folders lists the subfolders that were left out.
+        # A cancel token pauses or stops the whole batch, see _process_batch.
         """
         if output_dir is None:
             output_dir = config.get("export_directory", "./export/")
@@ -206,24 +657,30 @@ class TextureProcessor:
                     "error": f"Input directory does not exist: {input_dir}"
                 }
                 
-            # Process each image in the directory
-            for filename in os.listdir(input_dir):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-                    input_path = os.path.join(input_dir, filename)
-                    result = self.process_image(input_path, output_dir)
+            # Collect each image at the top level of the directory
+            input_paths, folders = list_directory(input_dir)
+            if folders:
+                logger.info(f"Skipping {len(folders)} subfolders of {input_dir}, only its top level is processed")
+                    
+            if dry_run:
+                plan = plan_batch(input_paths, settings, output_dir, max_workers, memory_budget_mb)
+                plan["input_dir"] = input_dir
+                plan["skipped_folders"] = folders
+                return plan
                     
-                    if result["success"]:
-                        results["success"].append(result)
-                    else:
-                        results["failed"].append(result)
+            # Process them in parallel within the memory budget
+            batch_info = self._process_batch(input_paths, output_dir, results, max_workers, memory_budget_mb, settings,
+                                             deduplicate=deduplicate, cancel=cancel)
                         
             logger.info(f"Processed {len(results['success'])} images successfully, {len(results['failed'])} failed")
-            return {
+            summary = {
                 "success": True,
                 "input_dir": input_dir,
                 "output_dir": output_dir,
                 "results": results
             }
+            summary.update(batch_info)
+            return summary
                 
         except Exception as e:
             logger.exception(f"Error processing directory {input_dir}: {e}")
@@ -232,6 +689,291 @@ class TextureProcessor:
                 "input_dir": input_dir,
                 "error": str(e)
             }
+            
+    def iter_directory(self, input_dir, output_dir=None, max_workers=None, memory_budget_mb=None, settings=None,
+                       deduplicate=None, callback=None, cancel=None):
+        """
+        Process all images in a directory, handing back a record for each as it finishes.
+        
+        # process_directory keeps every result until the very end, which is
+        # fine for a folder and not for a million files. This returns a
+        # ResultStream instead: iterate it for compact FileResult records as
+        # they come in, read its summary for running totals, or call finish()
+        # to just run it and get the totals. Nothing per file is kept around.
+        # Top level only, like process_directory.
+        """
+        if output_dir is None:
+            output_dir = config.get("export_directory", "./export/")
+        if not os.path.isdir(input_dir):
+            raise FileNotFoundError(f"Input directory does not exist: {input_dir}")
+            
+        def run(on_result):
+            batch_info = self._process_batch(self._list_images(input_dir), output_dir, None, max_workers,
+                                             memory_budget_mb, settings, deduplicate=deduplicate, on_result=on_result,
+                                             cancel=cancel)
+            batch_info.update({"input_dir": input_dir, "output_dir": output_dir})
+            return batch_info
+            
+        return ResultStream(run, callback)
+        
+    def _list_images(self, input_dir):
+        """Get the paths of the images at the top level of a directory, subfolders aren't included."""
+        return list_directory(input_dir)[0]
+        
+    def process_archive(self, archive_path, output_dir=None, max_workers=None, memory_budget_mb=None, settings=None,
+                        deduplicate=None, cancel=None):
+        """
+        Process all images inside a zip or tar archive without extracting it.
+        
+        # Same as process_directory, except the "directory" is a zip file.
+        # Compressed tars can only be read front to back, so those are done
+        # one image at a time as they stream past.
+        """
+        if output_dir is None:
+            output_dir = config.get("export_directory", "./export/")
+            
+        results = {
+            "success": [],
+            "failed": []
+        }
+        
+        try:
+            # Ensure input archive exists
+            if not os.path.isfile(archive_path):
+                logger.error(f"Input archive does not exist: {archive_path}")
+                return {
+                    "success": False,
+                    "error": f"Input archive does not exist: {archive_path}"
+                }
+                
+            reader = ArchiveReader(archive_path)
+            try:
+                if reader.streaming:
+                    batch_info = self._process_batch(reader.iter_streamed(), output_dir, results,
+                                                     settings=settings, streaming=True, cancel=cancel)
+                else:
+                    batch_info = self._process_batch(reader.members, output_dir, results,
+                                                     max_workers, memory_budget_mb, settings, deduplicate=deduplicate,
+                                                     cancel=cancel)
+            finally:
+                reader.close()
+                
+            logger.info(f"Processed {len(results['success'])} images successfully, {len(results['failed'])} failed")
+            summary = {
+                "success": True,
+                "input_archive": archive_path,
+                "output_dir": output_dir,
+                "results": results
+            }
+            summary.update(batch_info)
+            return summary
+            
+        except Exception as e:
+            logger.exception(f"Error processing archive {archive_path}: {e}")
+            return {
+                "success": False,
+                "input_archive": archive_path,
+                "error": str(e)
+            }
+            
+    def _process_batch(self, inputs, output_dir, results, max_workers=None, memory_budget_mb=None,
+                       settings=None, streaming=False, deduplicate=None, on_result=None, cancel=None):
+        """
+        Process a batch of inputs into one sink, sorting results into success and failed.
+        
+        # Everything in a batch shares one settings snapshot and one sink.
+        # Streaming inputs are processed in order as they arrive instead of
+        # being planned up front, so only one of them is in memory at a time.
+        # With deduplication on, identical inputs are only processed once and
+        # the copies get links to the first one's outputs. The process engine
+        # runs the jobs in worker processes that hand their maps to a writer
+        # process in shared memory, for plain files going to a directory.
+        # Unless somebody picked the worker count, a machine that's been
+        # autotuned gets its tuned split of workers and OpenCV threads.
+        # With on_result, every result goes straight to it instead of into
+        # results, and only the ones with duplicates waiting are held on to.
+        # A cancel token pauses or stops the batch between files and inside
+        # them, worker processes included.
+        
+        Returns:
+            Extra summary entries: "archive_index" for archive output, "dedup" when deduplicating,
+            "trace" when tracing, "ipc" with the process engine, "autotune" with a tuned split,
+            "cancelled" when the batch was cancelled
+        """
+        if settings is None:
+            settings = self.get_settings()
+        if deduplicate is None:
+            deduplicate = config.get("deduplicate_inputs", False)
+            
+        batch_info = {}
+        duplicates = {}
+        tracing = config.get("trace_enabled", False) and tracer.start()
+        if deduplicate and not streaming:
+            inputs, duplicates = find_duplicates(list(inputs))
+            report = DedupReport()
+            report.unique_inputs = len(inputs)
+            
+        primaries = []
+        def collect(result):
+            if result["input_path"] in duplicates:
+                primaries.append(result)
+            if on_result is not None:
+                on_result(result)
+            elif result["success"]:
+                results["success"].append(result)
+            else:
+                results["failed"].append(result)
+                
+        sink = create_sink(output_dir)
+        opencv_threads = previous_threads = None
+        try:
+            if streaming:
+                for source in inputs:
+                    if cancel is not None and not cancel.wait():
+                        break
+                    collect(self.process_image(source, output_dir, settings, sink, cancel))
+            else:
+                inputs = list(inputs)
+                use_processes = self._use_process_engine(inputs, sink)
+                if max_workers is None and not config.get("max_workers", 0):
+                    split = tuned_split(inputs, "processes" if use_processes else "threads")
+                    if split is not None:
+                        max_workers, opencv_threads = split
+                        batch_info["autotune"] = {"workers": max_workers, "opencv_threads": opencv_threads}
+                        logger.info(f"Using the autotuned {max_workers} workers x {opencv_threads} OpenCV threads")
+                scheduler = MemoryBudgetScheduler(memory_budget_mb, max_workers, settings.low_memory)
+                monitor.set_workers(scheduler.max_workers)
+                # The count is per process, worker processes set their own as they start
+                if opencv_threads is not None and not use_processes:
+                    previous_threads = set_opencv_threads(opencv_threads)
+                if use_processes:
+                    # The scheduler's threads only wait on the processes, so the memory budget still applies
+                    with SharedMemoryPipeline.for_batch(inputs, output_dir, settings, scheduler.max_workers,
+                                                        opencv_threads=opencv_threads,
+                                                        memory_budget=scheduler.memory_budget,
+                                                        cancel=cancel) as pipeline:
+                        # The slots are held all batch long, so the jobs get what's left
+                        scheduler.reserve(pipeline.ring_bytes)
+                        scheduler.run(inputs, pipeline.process, settings.enabled_maps(), callback=collect,
+                                      keep_results=False, cancel=cancel)
+                    batch_info["ipc"] = pipeline.stats
+                    self._fail_unwritten(results, pipeline.stats["failed_inputs"], on_result)
+                else:
+                    job = lambda source: self.process_image(source, output_dir, settings, sink, cancel)
+                    scheduler.run(inputs, job, settings.enabled_maps(), callback=collect, keep_results=False,
+                                  cancel=cancel)
+                
+            # Hand the copies the outputs of the texture they duplicate
+            if duplicates:
+                link_mode = config.get("dedup_link_mode", "hardlink")
+                for primary_result in primaries:
+                    for duplicate in duplicates.get(primary_result["input_path"], []):
+                        result = self._link_duplicate(primary_result, duplicate, sink, link_mode)
+                        collect(result)
+                        if result["success"]:
+                            report.record(duplicate, result["link_methods"])
+        finally:
+            if previous_threads is not None:
+                set_opencv_threads(previous_threads)
+            archive_index = sink.close()
+            if tracing:
+                batch_info["trace"] = tracer.stop()
+            
+        if archive_index is not None:
+            batch_info["archive_index"] = archive_index
+        if cancel is not None and cancel.cancelled:
+            batch_info["cancelled"] = True
+        if deduplicate and not streaming:
+            logger.info(report.summary())
+            batch_info["dedup"] = report.to_dict()
+        return batch_info
+        
+    def _use_process_engine(self, inputs, sink):
+        """
+        Check whether a batch runs on the process engine.
+        
+        # Worker processes need inputs they can open by path, and the writer
+        # process writes plain files, so archives in or out stay on threads.
+        """
+        if config.get("batch_engine", "threads") != "processes":
+            return False
+        if not isinstance(sink, DirectorySink) or not all(isinstance(source, str) for source in inputs):
+            logger.info("The process engine only handles files going to a directory, using threads")
+            return False
+        return len(inputs) > 0
+        
+    def _fail_unwritten(self, results, failed_inputs, on_result=None):
+        """
+        Move results whose outputs the writer process couldn't save over to failed.
+        
+        # Streamed results are long gone by then, so those get a revised
+        # failure record for the same input instead.
+        """
+        failed_inputs = set(failed_inputs)
+        if on_result is not None:
+            for input_path in failed_inputs:
+                on_result({
+                    "success": False,
+                    "input_path": input_path,
+                    "error": "The writer process could not save its outputs",
+                    "revised": True
+                })
+            return
+        for result in [result for result in results["success"] if result["input_path"] in failed_inputs]:
+            results["success"].remove(result)
+            results["failed"].append({
+                "success": False,
+                "input_path": result["input_path"],
+                "error": "The writer process could not save its outputs"
+            })
+        
+    def _link_duplicate(self, primary_result, duplicate, sink, link_mode="hardlink"):
+        """
+        Satisfy a duplicate input from the outputs of the identical input that was processed.
+        
+        # Every output of the primary gets a new name following the duplicate's
+        # filename, made with a hardlink, reflink or copy (or an archive alias).
+        """
+        if not primary_result["success"]:
+            return {
+                "success": False,
+                "input_path": duplicate,
+                "duplicate_of": primary_result["input_path"],
+                "error": primary_result.get("error", "Processing the identical input failed")
+            }
+            
+        try:
+            primary_base = os.path.splitext(get_output_name(primary_result["input_path"]))[0]
+            duplicate_base = os.path.splitext(get_output_name(duplicate))[0]
+            
+            outputs = dict(primary_result["results"])
+            outputs["original"] = primary_result["original"]
+            
+            linked = {}
+            methods = []
+            for map_name, location in outputs.items():
+                linked[map_name], method = sink.link(location, rename_output(location, primary_base, duplicate_base), link_mode)
+                methods.append(method)
+                
+            logger.info(f"Linked outputs of {primary_result['input_path']} for duplicate input {duplicate}")
+            return {
+                "success": True,
+                "input_path": duplicate,
+                "output_dir": sink.location(duplicate_base),
+                "original": linked.pop("original"),
+                "results": linked,
+                "duplicate_of": primary_result["input_path"],
+                "link_methods": methods
+            }
+            
+        except Exception as e:
+            logger.exception(f"Error linking outputs for duplicate {duplicate}: {e}")
+            return {
+                "success": False,
+                "input_path": duplicate,
+                "duplicate_of": primary_result["input_path"],
+                "error": str(e)
+            }
 
 # Create a global processor instance
 processor = TextureProcessor()
@@ -239,17 +981,37 @@ processor = TextureProcessor()
 if __name__ == "__main__":
     # Test the processor
     import sys
+    from src.metrics_exporter import MetricsExporter
+    from src.batch_planner import format_plan
     
     if len(sys.argv) > 1:
         input_path = sys.argv[1]
-        if os.path.isfile(input_path):
-            result = processor.process_image(input_path)
-            print(f"Processing result: {result['success']}")
-        elif os.path.isdir(input_path):
-            result = processor.process_directory(input_path)
-            print(f"Processing result: {result['success']}, {len(result['results']['success'])} succeeded, {len(result['results']['failed'])} failed")
-        else:
-            print(f"Invalid input path: {input_path}")
+        if "--dry-run" in sys.argv and os.path.isdir(input_path):
+            print(format_plan(processor.process_directory(input_path, dry_run=True)))
+            sys.exit(0)
+        # Export metrics while unattended, if metrics_port or metrics_textfile are set
+        with MetricsExporter():
+            if is_archive(input_path) and os.path.isfile(input_path):
+                result = processor.process_archive(input_path)
+                print(f"Processing result: {result['success']}, {len(result['results']['success'])} succeeded, {len(result['results']['failed'])} failed")
+            elif os.path.isfile(input_path):
+                result = processor.process_image(input_path)
+                print(f"Processing result: {result['success']}")
+            elif os.path.isdir(input_path) and "--stream" in sys.argv:
+                # One line per file as it finishes, nothing kept but the totals
+                stream = processor.iter_directory(input_path)
+                for record in stream:
+                    print(record)
+                result = stream.finish()
+                print(f"Processing result: {result['succeeded']} succeeded, {result['failed']} failed, "
+                      f"{result['files_per_second']:.2f} files/s")
+            elif os.path.isdir(input_path):
+                result = processor.process_directory(input_path)
+                print(f"Processing result: {result['success']}, {len(result['results']['success'])} succeeded, {len(result['results']['failed'])} failed")
+            else:
+                print(f"Invalid input path: {input_path}")
     else:
-        print("Usage: python texture_processor.py <input_path>")
-        print("  <input_path> can be a file or directory") 
\ No newline at end of file
+        print("Usage: python texture_processor.py <input_path> [--dry-run] [--stream]")
+        print("  <input_path> can be a file, directory, or zip/tar archive")
+        print("  --dry-run plans a directory from its headers without processing it")
+        print("  --stream reports a directory file by file as it goes, keeping only the totals")
@@ -0,0 +1,119 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import threading
+from src.config import config
+
+# Guess used until we've timed at least one image with similar settings
+DEFAULT_PIXELS_PER_SECOND = 10_000_000
+
+# How quickly old timings fade out, closer to 1 remembers longer
+DECAY = 0.97
+
+def settings_key(settings):
+    """
+    Get the throughput model key for a settings snapshot.
+
+    # Speed depends on which maps are on and the kernel size (or sizes, when
+    # sweeping), and on the AO filter quality when AO is on. Nothing else
+    # matters enough to track.
+    """
+    maps = settings.enabled_maps()
+    kernels = ",".join(str(size) for size in settings.normal_map_kernel_sizes())
+    key = f"{'+'.join(maps) or 'none'}|k{kernels}"
+    if "ao_roughness" in maps:
+        key += f"|{settings.ao_quality}"
+    return key
+
+class ThroughputModel:
+    """
+    Learns how long images take to process from the ones already done.
+
+    # Fits seconds = overhead + pixels / rate for every combination of
+    # settings, with older samples slowly forgotten. Way better than
+    # "3 of 10 files done" when one of the remaining files is 16K.
+    """
+
+    def __init__(self, state=None):
+        """Initialize the model, optionally from a saved state."""
+        self.lock = threading.Lock()
+        # Decayed sums per key: n, sum x, sum y, sum x^2, sum xy (x = megapixels, y = seconds)
+        self.sums = {}
+        if state:
+            for key, values in state.items():
+                if isinstance(values, list) and len(values) == 5:
+                    self.sums[key] = [float(value) for value in values]
+
+    @classmethod
+    def from_config(cls):
+        """Load the model saved in the configuration."""
+        return cls(config.get("throughput_model", {}))
+
+    def save(self):
+        """Save the model to the configuration."""
+        return config.set("throughput_model", self.to_dict())
+
+    def to_dict(self):
+        """Get the model state as a plain dictionary."""
+        with self.lock:
+            return {key: list(values) for key, values in self.sums.items()}
+
+    def record(self, key, pixels, seconds):
+        """Record how long an image of a given size took."""
+        if pixels <= 0 or seconds <= 0:
+            return
+        x = pixels / 1e6
+        with self.lock:
+            sums = self.sums.setdefault(key, [0.0] * 5)
+            for index, value in enumerate((1.0, x, seconds, x * x, x * seconds)):
+                sums[index] = sums[index] * DECAY + value
+
+    def _coefficients(self, key):
+        """
+        Get (overhead seconds, seconds per megapixel) for a key.
+
+        # With a spread of image sizes this is a proper least squares line.
+        # With only one size there's no way to tell overhead from per-pixel
+        # cost, so it's all blamed on the pixels.
+        """
+        sums = self.sums.get(key)
+        if sums is None:
+            # Borrow the average speed of everything else we've seen
+            known = [self._coefficients(other) for other in self.sums]
+            if not known:
+                return 0.0, 1e6 / DEFAULT_PIXELS_PER_SECOND
+            return (sum(overhead for overhead, _ in known) / len(known),
+                    sum(slope for _, slope in known) / len(known))
+
+        n, sum_x, sum_y, sum_xx, sum_xy = sums
+        variance = n * sum_xx - sum_x * sum_x
+        if n >= 2 and variance > 1e-9 * max(1.0, n * sum_xx):
+            slope = (n * sum_xy - sum_x * sum_y) / variance
+            overhead = (sum_y - slope * sum_x) / n
+            if slope > 0 and overhead >= 0:
+                return overhead, slope
+        return 0.0, sum_y / sum_x if sum_x > 0 else 1e6 / DEFAULT_PIXELS_PER_SECOND
+
+    def estimate_seconds(self, key, pixels, count=1):
+        """Estimate the seconds needed for count images totalling the given pixels."""
+        with self.lock:
+            overhead, slope = self._coefficients(key)
+        return overhead * count + slope * pixels / 1e6
+
+    def pixels_per_second(self, key):
+        """Get the learned processing rate for a key, ignoring the per-image overhead."""
+        with self.lock:
+            _, slope = self._coefficients(key)
+        return 1e6 / slope if slope > 0 else DEFAULT_PIXELS_PER_SECOND
+
+def format_duration(seconds):
+    """Format a duration in seconds as something like '1h 02m' or '45s'."""
+    seconds = max(0, int(round(seconds)))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
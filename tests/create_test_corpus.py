@@ -0,0 +1,229 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+from PIL import Image, ImageDraw
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import logger from src directory
+from src.logger import logger
+
+# What the corpus mixes by default
+DEFAULT_SIZES = (256, 512, 1024, 2048)
+DEFAULT_MODES = ("L", "RGB", "RGBA")
+DEFAULT_FORMATS = ("png",)
+DEFAULT_NOISE_LEVELS = (0.0, 0.02, 0.08)
+
+# Every mode we can make, "I;16" being 16-bit grayscale
+MODES = ("L", "RGB", "RGBA", "I;16")
+
+# File extension for each format, and the modes each format can actually store
+FORMAT_EXTENSIONS = {"png": ".png", "jpg": ".jpg", "bmp": ".bmp", "tiff": ".tiff"}
+FORMAT_MODES = {
+    "png": ("L", "RGB", "RGBA", "I;16"),
+    "jpg": ("L", "RGB"),
+    "bmp": ("L", "RGB", "RGBA"),
+    "tiff": ("L", "RGB", "RGBA", "I;16")
+}
+
+def _value_noise(rng, height, width, detail):
+    """
+    Fractal value noise in 0-1, built from upscaled random grids.
+
+    # One cv2.resize per octave instead of a Python loop per pixel, which
+    # is the difference between milliseconds and "go get a coffee" at 8K.
+    """
+    noise = np.zeros((height, width), dtype=np.float32)
+    cell = max(height, width) / 4
+    amplitude = 1.0
+    total = 0.0
+    for _ in range(detail):
+        cell_size = max(2, int(cell))
+        grid = rng.random((height // cell_size + 2, width // cell_size + 2), dtype=np.float32)
+        layer = cv2.resize(grid, (grid.shape[1] * cell_size, grid.shape[0] * cell_size), interpolation=cv2.INTER_CUBIC)
+        noise += amplitude * layer[:height, :width]
+        total += amplitude
+        amplitude *= 0.5
+        cell /= 2
+    return np.clip(noise / total, 0.0, 1.0)
+
+def generate_texture(seed, size, mode="RGB", detail=4, noise=0.02):
+    """
+    Generate one deterministic synthetic texture.
+
+    # A tilted gradient, a few octaves of value noise, some hard-edged shapes
+    # for the Sobel filter to chew on, and optional per-pixel grain. The same
+    # seed and arguments always give the same pixels.
+
+    Args:
+        seed: Seed for everything random about the texture
+        size: (width, height) in pixels
+        mode: "L", "RGB", "RGBA" or "I;16"
+        detail: Noise octaves and shape count, 1 (smooth) and up
+        noise: Standard deviation of the per-pixel grain, as a fraction of full scale
+
+    Returns:
+        PIL image
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unsupported mode: {mode}")
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    detail = max(1, int(detail))
+
+    # Gradient at a random angle, broadcast instead of looped
+    angle = rng.uniform(0, 2 * np.pi)
+    x = np.linspace(-0.5, 0.5, width, dtype=np.float32)
+    y = np.linspace(-0.5, 0.5, height, dtype=np.float32)[:, None]
+    gradient = (x * np.cos(angle) + y * np.sin(angle)) / np.sqrt(0.5) + 0.5
+
+    pattern = 0.35 * gradient + 0.65 * _value_noise(rng, height, width, detail)
+
+    # Shapes are drawn on an 8-bit mask with PIL, which does it in C
+    shapes = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(shapes)
+    for _ in range(2 * detail):
+        x0, x1 = sorted(rng.integers(0, width, 2))
+        y0, y1 = sorted(rng.integers(0, height, 2))
+        shade = int(rng.integers(1, 256))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=shade)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=shade)
+    shapes = np.asarray(shapes, dtype=np.float32) / 255
+    pattern = np.where(shapes > 0, 0.5 * pattern + 0.5 * shapes, pattern)
+
+    channels = 1 if mode in ("L", "I;16") else 3
+    if channels == 3:
+        tint = rng.uniform(0.6, 1.0, 3).astype(np.float32)
+        pattern = pattern[:, :, None] * tint
+    if noise > 0:
+        pattern = pattern + noise * rng.standard_normal(pattern.shape, dtype=np.float32)
+    pattern = np.clip(pattern, 0.0, 1.0)
+
+    if mode == "I;16":
+        return Image.fromarray((pattern * 65535 + 0.5).astype(np.uint16))
+
+    pixels = (pattern * 255 + 0.5).astype(np.uint8)
+    if mode == "RGBA":
+        alpha = (_value_noise(rng, height, width, 2) * 255 + 0.5).astype(np.uint8)
+        pixels = np.dstack((pixels, alpha))
+    return Image.fromarray(pixels)
+
+def plan_corpus(count, seed=0, sizes=DEFAULT_SIZES, modes=DEFAULT_MODES, formats=DEFAULT_FORMATS,
+                noise_levels=DEFAULT_NOISE_LEVELS, details=(2, 4, 6)):
+    """
+    Decide what every texture in a corpus looks like, without drawing any.
+
+    # Each texture gets its own seed derived from the corpus seed and its
+    # index, so texture 1234 is the same whether you make 2,000 or 20,000,
+    # and whichever worker happens to draw it.
+
+    Returns:
+        List of dicts with filename, seed, size, mode, format, detail and noise
+    """
+    # Formats that can't store any of the requested modes are left out
+    formats = [image_format for image_format in formats if set(modes) & set(FORMAT_MODES[image_format])]
+    if not formats:
+        raise ValueError(f"None of the formats can store any of the modes {modes}")
+
+    rng = np.random.default_rng(seed)
+    width = len(str(max(count - 1, 0)))
+    specs = []
+    for index in range(count):
+        image_format = formats[int(rng.integers(len(formats)))]
+        allowed = [mode for mode in modes if mode in FORMAT_MODES[image_format]]
+        mode = allowed[int(rng.integers(len(allowed)))]
+        side = int(sizes[int(rng.integers(len(sizes)))])
+        # Not everything in a texture library is square
+        aspect = (1, 1) if rng.random() < 0.75 else ((2, 1) if rng.random() < 0.5 else (1, 2))
+        size = (max(8, side // aspect[1]), max(8, side // aspect[0]))
+        specs.append({
+            "filename": f"texture_{index:0{width}d}_{size[0]}x{size[1]}_{mode.replace(';', '')}{FORMAT_EXTENSIONS[image_format]}",
+            "seed": int(rng.integers(2 ** 32)),
+            "size": size,
+            "mode": mode,
+            "format": image_format,
+            "detail": int(details[int(rng.integers(len(details)))]),
+            "noise": float(noise_levels[int(rng.integers(len(noise_levels)))])
+        })
+    return specs
+
+def _write_texture(output_dir, spec):
+    """Draw and save one planned texture (runs in a worker process)."""
+    image = generate_texture(spec["seed"], spec["size"], spec["mode"], spec["detail"], spec["noise"])
+    output_path = os.path.join(output_dir, spec["filename"])
+    if spec["format"] == "jpg":
+        image.save(output_path, quality=92)
+    else:
+        image.save(output_path)
+    return os.path.getsize(output_path)
+
+def create_corpus(output_dir, count, seed=0, sizes=DEFAULT_SIZES, modes=DEFAULT_MODES, formats=DEFAULT_FORMATS,
+                  noise_levels=DEFAULT_NOISE_LEVELS, details=(2, 4, 6), workers=None):
+    """
+    Write a corpus of synthetic textures to a directory, in parallel.
+
+    # Also writes corpus.json describing every texture, so a benchmark can
+    # say exactly what it ran on and anybody can make the same corpus again.
+
+    Returns:
+        Path of the manifest
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    specs = plan_corpus(count, seed, sizes, modes, formats, noise_levels, details)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and count > 1:
+        # Spawned, not forked: a fork after Numba's TBB pool has started leaves
+        # this process hanging in TBB's shutdown when it exits
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            file_sizes = list(executor.map(_write_texture, [output_dir] * count, specs, chunksize=max(1, count // (workers * 8))))
+    else:
+        file_sizes = [_write_texture(output_dir, spec) for spec in specs]
+
+    for spec, file_size in zip(specs, file_sizes):
+        spec["bytes"] = file_size
+
+    manifest_path = os.path.join(output_dir, "corpus.json")
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            "seed": seed,
+            "count": count,
+            "total_pixels": sum(spec["size"][0] * spec["size"][1] for spec in specs),
+            "total_bytes": sum(file_sizes),
+            "textures": specs
+        }, f, indent=1)
+
+    logger.info(f"Created {count} test textures ({sum(file_sizes) / (1024 * 1024):.1f} MB) in {output_dir}")
+    return manifest_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a deterministic corpus of synthetic test textures.")
+    parser.add_argument("output_dir", nargs="?", default="./import/corpus/", help="Where to write the textures")
+    parser.add_argument("--count", type=int, default=100, help="Number of textures")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed, the same seed makes the same corpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Longest side of each texture")
+    parser.add_argument("--modes", nargs="+", default=list(DEFAULT_MODES), choices=MODES, help="Image modes, I;16 is 16-bit grayscale")
+    parser.add_argument("--formats", nargs="+", default=list(DEFAULT_FORMATS), choices=list(FORMAT_EXTENSIONS), help="File formats")
+    parser.add_argument("--noise", type=float, nargs="+", default=list(DEFAULT_NOISE_LEVELS), help="Grain levels (0-1)")
+    parser.add_argument("--detail", type=int, nargs="+", default=[2, 4, 6], help="Detail levels (noise octaves)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to CPU count)")
+    args = parser.parse_args()
+
+    create_corpus(args.output_dir, args.count, args.seed, args.sizes, args.modes, args.formats,
+                  args.noise, args.detail, args.workers)
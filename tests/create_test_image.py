@@ -29,11 +29,9 @@ def create_test_image(filename="test_texture.png", size=(512, 512)):
     # This function creates a test image. It's not rocket science.
     # Just a gradient with some shapes slapped on top. Art critics, look away.
     """
-    # Create a gradient background
-    gradient = np.zeros((size[1], size[0]), dtype=np.uint8)
-    for y in range(size[1]):
-        for x in range(size[0]):
-            gradient[y, x] = int(255 * (x / size[0]))
+    # Create a gradient background, one row worth of maths broadcast down the image
+    row = (255 * (np.arange(size[0]) / size[0])).astype(np.uint8)
+    gradient = np.ascontiguousarray(np.broadcast_to(row, (size[1], size[0])))
             
     # Convert to PIL Image
     image = Image.fromarray(gradient)
@@ -0,0 +1,112 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import tarfile
+import zipfile
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.archive_input import ArchiveReader, MappedMemberReader
+from src.texture_processor import processor
+from src.logger import logger
+
+def _make_textures(directory, count=3):
+    """Write a few small random textures and return their paths."""
+    paths = []
+    for index in range(count):
+        pixels = np.random.default_rng(index).integers(0, 255, (64, 80, 3), dtype=np.uint8)
+        path = os.path.join(directory, f"texture_{index}.png")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+def test_members_decode_without_extracting():
+    """Test that every archive flavour yields the same pixels as the loose files."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _make_textures(temp_dir)
+        expected = {os.path.basename(path): np.array(Image.open(path)) for path in paths}
+
+        archives = {
+            "stored.zip": zipfile.ZIP_STORED,
+            "deflated.zip": zipfile.ZIP_DEFLATED,
+        }
+        for name, compression in archives.items():
+            with zipfile.ZipFile(os.path.join(temp_dir, name), "w", compression) as archive:
+                for path in paths:
+                    archive.write(path, f"pack/{os.path.basename(path)}")
+        for name, mode in (("plain.tar", "w"), ("compressed.tar.gz", "w:gz")):
+            with tarfile.open(os.path.join(temp_dir, name), mode) as archive:
+                for path in paths:
+                    archive.add(path, f"pack/{os.path.basename(path)}")
+
+        for name in ("stored.zip", "deflated.zip", "plain.tar", "compressed.tar.gz"):
+            # A zero threshold sends every uncompressed member through the memory map
+            reader = ArchiveReader(os.path.join(temp_dir, name), mmap_threshold=0)
+            assert reader.streaming == name.endswith(".gz")
+            members = list(reader.iter_streamed())
+            assert len(members) == len(paths)
+            for member in members:
+                stream = member.open()
+                if name in ("stored.zip", "plain.tar"):
+                    assert isinstance(stream, MappedMemberReader)
+                with Image.open(stream) as image:
+                    assert np.array_equal(np.array(image), expected[os.path.basename(member.name)])
+            reader.close()
+
+def test_process_archive():
+    """Test that process_archive produces the same maps as processing loose files."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _make_textures(temp_dir)
+        archive_path = os.path.join(temp_dir, "pack.zip")
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for path in paths:
+                archive.write(path, os.path.basename(path))
+
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True)
+        loose = processor.process_image(paths[0], os.path.join(temp_dir, "loose"), settings)
+        result = processor.process_archive(archive_path, os.path.join(temp_dir, "archived"), settings=settings)
+
+        assert result["success"]
+        assert len(result["results"]["success"]) == len(paths)
+        archived = next(item for item in result["results"]["success"]
+                        if item["input_path"].name == os.path.basename(paths[0]))
+        for map_name, map_path in loose["results"].items():
+            assert np.array_equal(np.array(Image.open(map_path)), np.array(Image.open(archived["results"][map_name])))
+
+def test_same_names_in_folders():
+    """Test that members with the same file name in different folders get outputs of their own."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _make_textures(temp_dir, 2)
+        archive_path = os.path.join(temp_dir, "bricks.zip")
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            archive.write(paths[0], "Brick01/albedo.png")
+            archive.write(paths[1], "Brick02/albedo.png")
+
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False)
+        output_dir = os.path.join(temp_dir, "out")
+        result = processor.process_archive(archive_path, output_dir, settings=settings)
+        assert len(result["results"]["success"]) == 2 and not result["results"]["failed"]
+        assert sorted(os.listdir(output_dir)) == ["Brick01_albedo", "Brick02_albedo"]
+
+        normal_maps = {}
+        for item in result["results"]["success"]:
+            normal_map = item["results"]["normal_map"]
+            assert os.path.isfile(normal_map) and os.path.basename(normal_map).startswith(os.path.basename(item["output_dir"]))
+            normal_maps[item["input_path"].name] = np.array(Image.open(normal_map))
+        assert not np.array_equal(normal_maps["Brick01/albedo.png"], normal_maps["Brick02/albedo.png"])
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_members_decode_without_extracting, test_process_archive, test_same_names_in_folders):
+        test()
+        logger.info(f"{test.__name__} succeeded")
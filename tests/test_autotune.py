@@ -0,0 +1,115 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import tempfile
+import cv2
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the corpus generator from the tests directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from create_test_corpus import create_corpus
+from src.config import config
+from src.autotune import candidate_splits, tune, machine_key, size_class, tuned_serial_threads, tuned_split
+from src.texture_processor import processor
+from src.logger import logger
+
+def test_candidate_splits():
+    """Test that the splits cover the corners without oversubscribing anything but the workers."""
+    splits = candidate_splits(8, "processes")
+    assert (1, 8) in splits and (8, 1) in splits and (2, 4) in splits and (16, 1) in splits
+    assert all(workers * threads <= 8 for workers, threads in splits if workers <= 8)
+    assert candidate_splits(1) == [(1, 1), (2, 1)]
+    # Worker threads share OpenCV's one thread count, so they get workers or threads, not both
+    threaded = candidate_splits(8)
+    assert (1, 8) in threaded and (8, 1) in threaded and (16, 1) in threaded
+    assert all(workers == 1 or threads == 1 for workers, threads in threaded)
+    assert [size_class(pixels) for pixels in (512 * 512, 4096 * 4096, 16384 * 16384)] == ["small", "medium", "large"]
+
+def test_tune_and_apply():
+    """Test that tuning picks a split per size class, and batches and single images pick it up."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        create_corpus(input_dir, 4, seed=6, sizes=(64, 128), modes=("RGB",), workers=1)
+        os.remove(os.path.join(input_dir, "corpus.json"))
+        paths = [os.path.join(input_dir, name) for name in os.listdir(input_dir)]
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=False)
+
+        result = tune(paths, settings, trial_seconds=0.05, splits=[(1, 1), (2, 1)], save=False)
+        assert result["success"] and result["machine"] == machine_key()
+        small = result["classes"]["small"]
+        assert len(small["trials"]) == 2 and all(trial["megapixels_per_second"] > 0 for trial in small["trials"])
+        assert (small["workers"], small["opencv_threads"]) in [(1, 1), (2, 1)]
+        assert result["engine"] == small["engine"] == "threads"
+
+        # Pretend the machine was tuned, without touching config.json
+        saved = {key: config.config.get(key) for key in ("autotune", "autotune_apply", "max_workers")}
+        config.config["autotune"] = {machine_key(): {"small": dict(small, workers=2, opencv_threads=1)}}
+        config.config["autotune_apply"] = True
+        config.config["max_workers"] = 0
+        threads = cv2.getNumThreads()
+        try:
+            tuned = processor.process_directory(input_dir, os.path.join(temp_dir, "tuned"), settings=settings)
+            assert tuned["autotune"] == {"workers": 2, "opencv_threads": 1}
+            assert len(tuned["results"]["success"]) == 4
+            assert cv2.getNumThreads() == threads
+            assert tuned_serial_threads(64 * 64) == small["serial_opencv_threads"]
+            assert tuned_serial_threads(8192 * 8192) is None
+
+            # Picking the workers yourself, or turning it off, leaves the tuning alone
+            chosen = processor.process_directory(input_dir, os.path.join(temp_dir, "chosen"), max_workers=1, settings=settings)
+            config.config["autotune_apply"] = False
+            off = processor.process_directory(input_dir, os.path.join(temp_dir, "off"), settings=settings)
+            assert "autotune" not in chosen and "autotune" not in off
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    config.config.pop(key, None)
+                else:
+                    config.config[key] = value
+
+def test_tune_process_engine():
+    """Test that the process engine is tuned on worker processes and its split only applies to it."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        create_corpus(input_dir, 2, seed=7, sizes=(64,), modes=("RGB",), workers=1)
+        os.remove(os.path.join(input_dir, "corpus.json"))
+        paths = [os.path.join(input_dir, name) for name in os.listdir(input_dir)]
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False)
+
+        threads = cv2.getNumThreads()
+        result = tune(paths, settings, trial_seconds=0.05, splits=[(1, 2)], save=False, engine="processes")
+        small = result["classes"]["small"]
+        assert result["success"] and small["engine"] == "processes"
+        assert (small["workers"], small["opencv_threads"]) == (1, 2) and small["megapixels_per_second"] > 0
+        assert cv2.getNumThreads() == threads
+
+        saved = {key: config.config.get(key) for key in ("autotune", "autotune_apply", "max_workers", "batch_engine")}
+        config.config["autotune"] = {machine_key(): {"small": small}}
+        config.config["autotune_apply"] = True
+        config.config["max_workers"] = 0
+        try:
+            assert tuned_split(paths, "processes") == (1, 2) and tuned_split(paths) is None
+            config.config["batch_engine"] = "processes"
+            tuned = processor.process_directory(input_dir, os.path.join(temp_dir, "tuned"), settings=settings)
+            assert tuned["autotune"] == {"workers": 1, "opencv_threads": 2}
+            # Set in the worker process, this one's count is left alone
+            assert len(tuned["results"]["success"]) == 2 and cv2.getNumThreads() == threads
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    config.config.pop(key, None)
+                else:
+                    config.config[key] = value
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_candidate_splits, test_tune_and_apply, test_tune_process_engine):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,110 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.batch_results import FileResult, BatchSummary, ResultStream
+from src.texture_processor import processor
+from src.logger import logger
+
+def _make_inputs(directory, count=6):
+    """Write a few small textures, one of them copied, plus one that isn't an image."""
+    rng = np.random.default_rng(3)
+    for index in range(count):
+        Image.fromarray(rng.integers(0, 255, (48, 48), dtype=np.uint8)).save(os.path.join(directory, f"tex_{index}.png"))
+    shutil.copyfile(os.path.join(directory, "tex_0.png"), os.path.join(directory, "tex_copy.png"))
+    with open(os.path.join(directory, "broken.png"), 'wb') as f:
+        f.write(b"not a png")
+
+def test_stream_matches_process_directory():
+    """Test that streaming a directory gives compact records and the totals process_directory gives."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        _make_inputs(input_dir)
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True)
+
+        seen = []
+        stream = processor.iter_directory(input_dir, os.path.join(temp_dir, "streamed"), settings=settings,
+                                          deduplicate=True, callback=seen.append)
+        records = list(stream)
+        summary = stream.finish()
+        expected = processor.process_directory(input_dir, os.path.join(temp_dir, "kept"), settings=settings,
+                                               deduplicate=True)
+
+        assert seen == records
+        assert all(isinstance(record, FileResult) and not hasattr(record, "__dict__") for record in records)
+        assert summary["files"] == len(records) == 8
+        assert summary["succeeded"] == len(expected["results"]["success"]) == 7
+        assert summary["failed"] == len(expected["results"]["failed"]) == 1
+        assert summary["duplicates"] == 1
+        assert summary["errors"][0][0].endswith("broken.png")
+        assert summary["dedup"]["duplicate_inputs"] == 1
+        for record in records:
+            for map_name, location in record.outputs:
+                assert os.path.exists(location), map_name
+
+def test_stopping_early():
+    """Test that a stream can be abandoned halfway and the batch still finishes."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        _make_inputs(input_dir)
+
+        stream = processor.iter_directory(input_dir, os.path.join(temp_dir, "output"), deduplicate=False)
+        for record in stream:
+            break
+        summary = stream.finish()
+        assert summary["files"] == 1
+        assert len(os.listdir(os.path.join(temp_dir, "output"))) == 7
+        try:
+            list(stream)
+            assert False, "A stream iterated twice should complain"
+        except RuntimeError:
+            pass
+
+    try:
+        processor.iter_directory(os.path.join(tempfile.gettempdir(), "no_such_directory_here"))
+        assert False, "A missing directory should raise"
+    except FileNotFoundError:
+        pass
+
+def test_summary_counts():
+    """Test that revised records move a file from succeeded to failed without counting it twice."""
+    summary = BatchSummary()
+    summary.add(FileResult("a.png", True, outputs=(("normal", "a_normal.png"),)))
+    summary.add(FileResult("b.png", True, outputs=(("normal", "b_normal.png"),), duplicate_of="a.png"))
+    summary.add(FileResult("c.png", False, error="broken"))
+    summary.add(FileResult("a.png", False, error="not written", revised=True))
+    summary.finish()
+    totals = summary.to_dict()
+    assert (totals["files"], totals["succeeded"], totals["failed"], totals["duplicates"]) == (3, 1, 2, 1)
+    assert totals["errors"] == [("c.png", "broken"), ("a.png", "not written")]
+
+    # A stream reports the failure of the batch itself instead of ending quietly
+    def run(on_result):
+        on_result({"success": True, "input_path": "a.png", "results": {}})
+        raise ValueError("batch fell over")
+    try:
+        list(ResultStream(run))
+        assert False, "The batch's error should reach the consumer"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_stream_matches_process_directory, test_stopping_early, test_summary_counts):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,193 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import numpy as np
+import cv2
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.cancellation import CancelToken, ProcessingCancelled
+from src.config import config
+from src.height_field import integrate_gradients_tiled
+from src.output_sink import ArchiveSink, load_archive_index
+from src.shm_pipeline import SharedMemoryPipeline
+from src.texture_processor import processor, AO_BAND_ROWS
+from src.logger import logger
+
+class _CancelAfter(CancelToken):
+    """Token that cancels itself at a given checkpoint, and counts the checkpoints."""
+
+    def __init__(self, checks=None):
+        super().__init__()
+        self.checks = 0
+        self.cancel_at = checks
+
+    def check(self):
+        self.checks += 1
+        if self.cancel_at is not None and self.checks >= self.cancel_at:
+            self.cancel()
+        super().check()
+
+def _make_tall_image(path):
+    """Write a texture tall enough for the AO filter to run in several bands."""
+    rng = np.random.default_rng(5)
+    noise = rng.integers(0, 255, (AO_BAND_ROWS * 2 + 100, 96), dtype=np.uint8)
+    Image.fromarray(cv2.GaussianBlur(noise, (0, 0), 2)).save(path)
+
+def test_token():
+    """Test that a paused token holds a checkpoint until resumed, and a cancelled one raises."""
+    token = CancelToken()
+    token.pause()
+    passed = threading.Event()
+    worker = threading.Thread(target=lambda: (token.check(), passed.set()))
+    worker.start()
+    assert not passed.wait(0.2)
+    token.resume()
+    assert passed.wait(2)
+    worker.join()
+
+    token.pause()
+    token.cancel()
+    assert token.cancelled and not token.paused and not token.wait()
+    try:
+        token.check()
+        assert False, "A cancelled token should raise"
+    except ProcessingCancelled:
+        pass
+
+def test_banded_filter_matches():
+    """Test that the AO filter in cancellable bands gives exactly the one-call result."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "tall.png")
+        _make_tall_image(path)
+        image = np.array(Image.open(path))
+    token = _CancelAfter()
+    assert np.array_equal(processor._bilateral_filter(image, token), cv2.bilateralFilter(image, 9, 75, 75))
+    assert token.checks == 3
+
+    # The height solve stops between tiles too
+    gradients = np.zeros((600, 600), dtype=np.float32)
+    try:
+        integrate_gradients_tiled(gradients, gradients, tile_size=256, cancel=_CancelAfter(2))
+        assert False, "A cancelled height solve should raise"
+    except ProcessingCancelled:
+        pass
+
+def test_cancel_cleans_up():
+    """Test that a file cancelled halfway leaves none of its outputs behind, committed or not."""
+    settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True,
+                                      ao_quality="quality", output_mode="separate")
+    previous = config.config.get("fsync_batch_size")
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "tall.png")
+            _make_tall_image(path)
+
+            # Count the checkpoints of a full run, then cancel inside the AO bands
+            counter = _CancelAfter()
+            assert processor.process_image(path, os.path.join(temp_dir, "full"), settings, cancel=counter)["success"]
+            for batch_size in (1, 64):
+                # One commits every output straight away, 64 leaves them all pending
+                config.config["fsync_batch_size"] = batch_size
+                output_dir = os.path.join(temp_dir, f"cancelled_{batch_size}")
+                result = processor.process_image(path, output_dir, settings, cancel=_CancelAfter(counter.checks - 2))
+                assert result["cancelled"] and not result["success"]
+                assert os.listdir(output_dir) == []
+
+            # Archive output can't take the bytes back, but the index forgets them
+            sink = ArchiveSink(os.path.join(temp_dir, "archive"), archive_name="cancelled")
+            processor.process_image(path, settings=settings, sink=sink, cancel=_CancelAfter(counter.checks - 2))
+            processor.process_image(path, settings=settings, sink=sink)
+            members = load_archive_index(sink.close())["members"]
+            assert sorted(members) == sorted(f"tall/tall_{name}.png" for name in
+                                             ("original", "normal_map", "bump_map", "ao_roughness"))
+    finally:
+        if previous is None:
+            config.config.pop("fsync_batch_size", None)
+        else:
+            config.config["fsync_batch_size"] = previous
+
+def test_pause_and_cancel_batch():
+    """Test that a paused batch starts nothing until resumed, and a cancelled one starts nothing at all."""
+    settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        os.makedirs(input_dir)
+        for index in range(4):
+            Image.new("L", (32, 32), index * 40).save(os.path.join(input_dir, f"tex_{index}.png"))
+
+        token = CancelToken()
+        token.pause()
+        finished = {}
+        output_dir = os.path.join(temp_dir, "paused")
+        worker = threading.Thread(target=lambda: finished.update(processor.process_directory(
+            input_dir, output_dir, max_workers=2, settings=settings, deduplicate=False, cancel=token)))
+        worker.start()
+        time.sleep(0.3)
+        assert not finished and not os.path.exists(output_dir)
+        token.resume()
+        worker.join(30)
+        assert len(finished["results"]["success"]) == 4
+        assert "cancelled" not in finished
+
+        token = CancelToken()
+        token.cancel()
+        result = processor.process_directory(input_dir, os.path.join(temp_dir, "cancelled"), settings=settings,
+                                             deduplicate=False, cancel=token)
+        assert result["cancelled"]
+        assert len(result["results"]["failed"]) == 4
+        assert all(item["cancelled"] for item in result["results"]["failed"])
+
+def test_cancel_process_engine():
+    """Test that worker processes hold a file while paused and drop its outputs when cancelled."""
+    settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True,
+                                      ao_quality="quality", output_mode="separate")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = [os.path.join(temp_dir, f"tall_{index}.png") for index in range(2)]
+        for path in paths:
+            _make_tall_image(path)
+
+        # Paused before the files go out, so each worker holds at its first checkpoint inside the file
+        token = CancelToken()
+        token.pause()
+        output_dir = os.path.join(temp_dir, "export")
+        with SharedMemoryPipeline.for_batch(paths, output_dir, settings, 1, cancel=token) as pipeline:
+            results = {}
+            worker = threading.Thread(target=lambda: results.update(resumed=pipeline.process(paths[0])))
+            worker.start()
+            time.sleep(1.0)
+            assert worker.is_alive() and not os.path.exists(os.path.join(output_dir, "tall_0"))
+            token.resume()
+            worker.join(60)
+            assert results["resumed"]["success"]
+
+            token.pause()
+            worker = threading.Thread(target=lambda: results.update(cancelled=pipeline.process(paths[1])))
+            worker.start()
+            time.sleep(1.0)
+            assert worker.is_alive()
+            token.cancel()
+            worker.join(60)
+            assert results["cancelled"]["cancelled"] and not results["cancelled"]["success"]
+
+        assert len(os.listdir(os.path.join(output_dir, "tall_0"))) == 4
+        assert not os.path.exists(os.path.join(output_dir, "tall_1"))
+        assert pipeline.stats["writes"] == 4
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_token, test_banded_filter_matches, test_cancel_cleans_up, test_pause_and_cancel_batch,
+                 test_cancel_process_engine):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,52 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the corpus generator from the tests directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from create_test_corpus import create_corpus, generate_texture
+from src.logger import logger
+
+def test_corpus_is_deterministic():
+    """Test that the same seed makes the same corpus, in parallel or not."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        options = dict(seed=7, sizes=(32, 64), modes=("L", "RGB", "RGBA", "I;16"), formats=("png", "tiff", "jpg"))
+        serial = create_corpus(os.path.join(temp_dir, "serial"), 12, workers=1, **options)
+        parallel = create_corpus(os.path.join(temp_dir, "parallel"), 12, workers=2, **options)
+
+        with open(serial, 'r') as f:
+            manifest = json.load(f)
+        assert len(manifest["textures"]) == 12
+
+        for spec in manifest["textures"]:
+            first = Image.open(os.path.join(temp_dir, "serial", spec["filename"]))
+            second = Image.open(os.path.join(temp_dir, "parallel", spec["filename"]))
+            assert first.mode == spec["mode"] and first.size == tuple(spec["size"])
+            assert np.array_equal(np.array(first), np.array(second))
+
+def test_texture_modes():
+    """Test that every mode comes out with the right shape and type."""
+    expected = {"L": ((48, 40), np.uint8), "RGB": ((48, 40, 3), np.uint8),
+                "RGBA": ((48, 40, 4), np.uint8), "I;16": ((48, 40), np.uint16)}
+    for mode, (shape, dtype) in expected.items():
+        pixels = np.array(generate_texture(3, (40, 48), mode, detail=3, noise=0.05))
+        assert pixels.shape == shape and pixels.dtype == dtype
+        assert pixels.std() > 0
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_corpus_is_deterministic, test_texture_modes):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,78 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.dedup import find_duplicates
+from src.texture_processor import processor
+from src.logger import logger
+
+def _make_library(directory):
+    """Write one texture copied three times plus a unique texture with the same size."""
+    brick = np.random.default_rng(1).integers(0, 255, (64, 64), dtype=np.uint8)
+    Image.fromarray(brick).save(os.path.join(directory, "brick.png"))
+    shutil.copyfile(os.path.join(directory, "brick.png"), os.path.join(directory, "brick_copy.png"))
+    shutil.copyfile(os.path.join(directory, "brick.png"), os.path.join(directory, "wall.png"))
+
+    # Same byte count as the bricks, different pixels
+    with open(os.path.join(directory, "brick.png"), 'rb') as f:
+        data = bytearray(f.read())
+    data[-20] ^= 0xFF
+    with open(os.path.join(directory, "broken.png"), 'wb') as f:
+        f.write(data)
+
+def test_find_duplicates():
+    """Test that only identical contents are grouped together."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _make_library(temp_dir)
+        paths = [os.path.join(temp_dir, name) for name in sorted(os.listdir(temp_dir))]
+        unique, duplicates = find_duplicates(paths)
+
+        assert len(unique) == 2
+        assert sum(len(group) for group in duplicates.values()) == 2
+        assert os.path.join(temp_dir, "broken.png") in unique
+
+def test_duplicates_get_linked_outputs():
+    """Test that duplicates are not processed again but still get every output."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "input")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(input_dir)
+        _make_library(input_dir)
+        os.remove(os.path.join(input_dir, "broken.png"))
+
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True)
+        result = processor.process_directory(input_dir, output_dir, settings=settings, deduplicate=True)
+
+        assert result["success"]
+        assert len(result["results"]["success"]) == 3
+        assert result["dedup"]["unique_inputs"] == 1
+        assert result["dedup"]["duplicate_inputs"] == 2
+
+        primary = next(item for item in result["results"]["success"] if "duplicate_of" not in item)
+        primary_base = os.path.splitext(os.path.basename(primary["input_path"]))[0]
+        for item in result["results"]["success"]:
+            base = os.path.splitext(os.path.basename(item["input_path"]))[0]
+            for map_name, path in item["results"].items():
+                assert os.path.basename(path) == f"{base}_{map_name}.png"
+                with open(path, 'rb') as f, open(primary["results"][map_name], 'rb') as g:
+                    assert f.read() == g.read()
+            assert os.path.exists(os.path.join(output_dir, base, f"{base}_original.png"))
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_find_duplicates, test_duplicates_get_linked_outputs):
+        test()
+        logger.info(f"{test.__name__} succeeded")
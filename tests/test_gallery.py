@@ -0,0 +1,138 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.gallery import ThumbnailCache, scan_results, visible_rows, make_thumbnail
+from src.logger import logger
+
+def _write(path, size=(256, 128), mode="RGB", seed=0):
+    """Write a random image."""
+    channels = {"L": 1, "RGB": 3, "RGBA": 4}[mode]
+    pixels = np.random.default_rng(seed).integers(0, 255, (size[1], size[0], channels), dtype=np.uint8)
+    Image.fromarray(pixels.squeeze(), mode).save(path)
+
+def test_scan_results():
+    """Test that the export folder is listed one texture per folder, maps in a sensible order."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, "brick")
+        os.makedirs(folder)
+        for map_name in ("bump_map", "normal_map_k3", "original", "normal_map_k9", "custom"):
+            _write(os.path.join(folder, f"brick_{map_name}.png"), (8, 8))
+        # A write in progress, somebody else's file and an empty folder are all left out
+        with open(os.path.join(folder, "brick_ao_roughness.png.abc123.tmp"), 'wb') as f:
+            f.write(b"half a png")
+        _write(os.path.join(folder, "notes.png"), (8, 8))
+        os.makedirs(os.path.join(temp_dir, "empty"))
+        _write(os.path.join(temp_dir, "Apple.png"), (8, 8))
+        os.makedirs(os.path.join(temp_dir, "apple"))
+        _write(os.path.join(temp_dir, "apple", "apple_packed.png"), (8, 8))
+
+        textures = scan_results(temp_dir)
+        assert [texture["name"] for texture in textures] == ["apple", "brick"]
+        assert [name for name, _ in textures[1]["maps"]] == ["original", "normal_map_k3", "normal_map_k9",
+                                                              "bump_map", "custom"]
+        assert all(os.path.isfile(path) for texture in textures for _, path in texture["maps"])
+    assert scan_results(os.path.join(tempfile.gettempdir(), "no_such_export_here")) == []
+
+def test_visible_rows():
+    """Test that only the rows in the viewport (and one either side) are drawn, however many there are."""
+    assert visible_rows(0, 500, 100, 20000) == range(0, 7)
+    assert visible_rows(150, 500, 100, 20000, overscan=0) == range(1, 7)
+    assert visible_rows(1999950, 500, 100, 20000) == range(19998, 20000)
+    assert len(visible_rows(1000000, 700, 154, 20000)) <= 8
+    assert visible_rows(0, 500, 100, 0) == range(0)
+    assert visible_rows(0, 500, 100, 3) == range(0, 3)
+
+def test_thumbnail_cache():
+    """Test the memory LRU, the disk cache, invalidation on change and unreadable files."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index, (size, mode) in enumerate((((2048, 1024), "RGB"), ((300, 600), "L"), ((64, 64), "RGBA"))):
+            path = os.path.join(temp_dir, f"map_{index}.png")
+            _write(path, size, mode, index)
+            paths.append(path)
+        jpeg_path = os.path.join(temp_dir, "photo.jpg")
+        Image.fromarray(np.zeros((3000, 4000, 3), dtype=np.uint8)).save(jpeg_path)
+        broken_path = os.path.join(temp_dir, "broken.png")
+        with open(broken_path, 'wb') as f:
+            f.write(b"not a png")
+
+        cache_dir = os.path.join(temp_dir, "cache")
+        cache = ThumbnailCache(cache_dir, size=64, memory_items=2, disk_mb=16)
+        thumbnails = [cache.load(path) for path in paths]
+        assert [thumbnail.size for thumbnail in thumbnails] == [(64, 32), (32, 64), (64, 64)]
+        assert [thumbnail.mode for thumbnail in thumbnails] == ["RGB", "L", "RGBA"]
+        assert cache.stats["decoded"] == 3
+        # Only the two most recent stay in memory
+        assert cache.get(paths[0]) is None and cache.get(paths[2]) is not None
+        assert max(make_thumbnail(jpeg_path, 64).size) == 64
+
+        # A new session finds them on disk, until a file changes
+        cache = ThumbnailCache(cache_dir, size=64, memory_items=2, disk_mb=16)
+        assert cache.load(paths[0]).size == (64, 32)
+        assert cache.stats["disk_hits"] == 1 and cache.stats["decoded"] == 0
+        _write(paths[1], (600, 300), "L", 9)
+        os.utime(paths[1], ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        assert cache.load(paths[1]).size == (64, 32)
+        assert cache.stats["decoded"] == 1
+
+        assert cache.load(broken_path) is None and cache.unreadable(broken_path)
+        assert cache.prune() == 0
+        cache.disk_bytes = 1
+        assert cache.prune() >= 3
+
+def test_background_requests():
+    """Test that a new request replaces what's still pending, so scrolled-away rows aren't decoded."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index in range(6):
+            path = os.path.join(temp_dir, f"map_{index}.png")
+            _write(path, (64, 64), "RGB", index)
+            paths.append(path)
+
+        cache = ThumbnailCache(os.path.join(temp_dir, "cache"), size=32, disk_mb=0)
+        delivered = []
+        first = threading.Event()
+        release = threading.Event()
+        done = threading.Event()
+
+        def callback(path, image):
+            delivered.append((path, image.size))
+            if len(delivered) == 1:
+                first.set()
+                release.wait(10)
+            elif path == paths[5]:
+                done.set()
+
+        try:
+            cache.request(paths[:5], callback)
+            assert first.wait(10)
+            # Scrolled while the first was being delivered, the other four are dropped
+            cache.request([paths[5]], callback)
+            release.set()
+            assert done.wait(10)
+            time.sleep(0.1)
+            assert delivered == [(paths[0], (32, 32)), (paths[5], (32, 32))]
+            assert not os.path.exists(os.path.join(temp_dir, "cache"))
+        finally:
+            cache.close()
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_scan_results, test_visible_rows, test_thumbnail_cache, test_background_requests):
+        test()
+        logger.info(f"{test.__name__} succeeded")
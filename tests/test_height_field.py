@@ -0,0 +1,84 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import cv2
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.height_field import integrate_gradients, integrate_gradients_tiled, height_to_image
+from src.scheduler import estimate_peak_memory
+from src.texture_processor import processor
+from src.logger import logger
+
+def _surface(shape, seed):
+    """Make a smooth random height field and its Sobel gradients."""
+    rng = np.random.default_rng(seed)
+    height = cv2.GaussianBlur(rng.normal(0, 1, shape).astype(np.float32), (0, 0), 6)
+    sobelx = cv2.Sobel(height, cv2.CV_32F, 1, 0, ksize=5)
+    sobely = cv2.Sobel(height, cv2.CV_32F, 0, 1, ksize=5)
+    return height, sobelx, sobely
+
+def test_recovers_height():
+    """Test that integrating the gradients of a surface gives the surface back."""
+    height, sobelx, sobely = _surface((192, 256), 1)
+    recovered = integrate_gradients(sobelx, sobely, "mirror")
+    assert recovered.dtype == np.float32 and recovered.shape == height.shape
+    assert np.corrcoef(recovered.ravel(), height.ravel())[0, 1] > 0.999
+
+    # A texture that tiles comes back tiling with periodic edges
+    y, x = np.mgrid[0:96, 0:128].astype(np.float32)
+    tiling = np.sin(2 * np.pi * 2 * x / 128) * np.cos(2 * np.pi * 3 * y / 96) + 0.5 * np.sin(2 * np.pi * (5 * x / 128 + y / 96))
+    surrounded = np.tile(tiling, (3, 3))
+    sobelx = cv2.Sobel(surrounded, cv2.CV_32F, 1, 0, ksize=5)[96:192, 128:256]
+    sobely = cv2.Sobel(surrounded, cv2.CV_32F, 0, 1, ksize=5)[96:192, 128:256]
+    recovered = integrate_gradients(sobelx, sobely, "periodic")
+    assert np.corrcoef(recovered.ravel(), tiling.ravel())[0, 1] > 0.999
+    assert np.abs(recovered[:, 0] - recovered[:, -1]).max() < 0.1 * np.ptp(recovered)
+
+def test_tiled_matches_single_solve():
+    """Test that the tiled solve is within a grey level of solving the whole image at once."""
+    _, sobelx, sobely = _surface((768, 1024), 2)
+    for boundary in ("mirror", "periodic"):
+        whole = height_to_image(integrate_gradients(sobelx, sobely, boundary)).astype(np.int16)
+        tiled = height_to_image(integrate_gradients_tiled(sobelx, sobely, boundary, 256)).astype(np.int16)
+        assert np.abs(whole - tiled).mean() < 0.5
+
+    # Memory is estimated for one tile's solve, not the whole image's
+    small = estimate_peak_memory(2048, 2048, "L", ["height_map"]) - estimate_peak_memory(2048, 2048, "L", [])
+    large = estimate_peak_memory(8192, 8192, "L", ["height_map"]) - estimate_peak_memory(8192, 8192, "L", [])
+    assert large < 8 * small
+
+def test_height_map_output():
+    """Test that the processor writes a height map from the normal map's gradients, quickly."""
+    height, _, _ = _surface((2048, 2048), 3)
+    gray_image = cv2.normalize(height, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, "height.png")
+        Image.fromarray(gray_image).save(input_path)
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False,
+                                          enable_height_map=True, height_tile_size=512)
+        started = time.perf_counter()
+        result = processor.process_image(input_path, os.path.join(temp_dir, "export"), settings)
+        assert time.perf_counter() - started < 20
+
+        assert result["success"] and set(result["results"]) == {"normal_map", "height_map"}
+        height_map = np.array(Image.open(result["results"]["height_map"]))
+        assert height_map.dtype == np.uint8 and height_map.min() == 0 and height_map.max() == 255
+        assert np.corrcoef(height_map.ravel(), gray_image.ravel())[0, 1] > 0.99
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_recovers_height, test_tiled_matches_single_solve, test_height_map_output):
+        test()
+        logger.info(f"{test.__name__} succeeded")
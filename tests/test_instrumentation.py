@@ -0,0 +1,90 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import socket
+import tempfile
+import urllib.request
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.instrumentation import monitor, compute_rates
+from src.metrics_exporter import MetricsExporter
+from src.texture_processor import processor
+from src.logger import logger
+
+def test_monitor_counts_work():
+    """Test that processing feeds the monitor's stages, pixels and written bytes."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "texture.png")
+        Image.fromarray(np.random.default_rng(0).integers(0, 255, (96, 128, 3), dtype=np.uint8)).save(path)
+
+        before = monitor.snapshot()
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=False)
+        result = processor.process_image(path, os.path.join(temp_dir, "export"), settings)
+        after = monitor.snapshot()
+
+        assert result["success"]
+        assert after["files_processed"] - before["files_processed"] == 1
+        assert after["pixels_processed"] - before["pixels_processed"] == 96 * 128
+        assert after["active_jobs"] == before["active_jobs"]
+
+        # Every byte written to the export directory was counted
+        written = sum(os.path.getsize(output) for output in [result["original"]] + list(result["results"].values()))
+        assert after["bytes_written"] - before["bytes_written"] == written
+
+        rates = compute_rates(before, after)
+        assert set(rates["stage_share"]) <= {"decode", "grayscale", "normal_map", "bump_map", "save"}
+        assert abs(sum(rates["stage_share"].values()) - 1) < 1e-6
+        assert 0 < rates["utilisation"] <= 1
+        assert rates["megapixels_per_second"] > 0
+
+def _metric_value(text, line_start):
+    """Find the value of the sample line that starts with line_start."""
+    for line in text.splitlines():
+        if line.startswith(line_start + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"No sample {line_start} in the metrics")
+
+def test_metrics_export():
+    """Test that the endpoint and the textfile both serve consistent Prometheus metrics."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "texture.png")
+        Image.fromarray(np.random.default_rng(1).integers(0, 255, (32, 32), dtype=np.uint8)).save(path)
+        processor.process_image(path, os.path.join(temp_dir, "export"))
+
+        textfile = os.path.join(temp_dir, "prom", "texturenormaliser.prom")
+        with MetricsExporter(port=port, textfile_path=textfile, interval=60):
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                scraped = response.read().decode("utf-8")
+
+        with open(textfile, "r", encoding="utf-8") as f:
+            written = f.read()
+
+        for text in (scraped, written):
+            processed = _metric_value(text, "texturenormaliser_files_processed_total")
+            assert processed >= 1
+            assert _metric_value(text, 'texturenormaliser_image_duration_seconds_bucket{le="+Inf"}') >= processed
+            decodes = _metric_value(text, 'texturenormaliser_stage_duration_seconds_count{stage="decode"}')
+            assert decodes == _metric_value(text, 'texturenormaliser_stage_duration_seconds_bucket{stage="decode",le="+Inf"}')
+            assert decodes >= processed
+        assert not [name for name in os.listdir(os.path.dirname(textfile)) if name.endswith(".tmp")]
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_monitor_counts_work, test_metrics_export):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,143 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import unittest
+import warnings
+import tempfile
+import importlib.util
+import numpy as np
+import cv2
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src import kernels
+from src.config import config
+from src.texture_processor import processor
+from src.logger import logger
+
+def _reference_normal_map(gray_image, kernel_size):
+    """The normal map exactly as it was computed before the kernel backends."""
+    sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=kernel_size)
+    sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=kernel_size)
+    sobelx = sobelx / np.max(np.abs(sobelx)) * 0.5 + 0.5
+    sobely = sobely / np.max(np.abs(sobely)) * 0.5 + 0.5
+    normal_map = np.zeros((gray_image.shape[0], gray_image.shape[1], 3), dtype=np.float32)
+    normal_map[:, :, 0] = sobelx
+    normal_map[:, :, 1] = sobely
+    normal_map[:, :, 2] = 1.0
+    return (normal_map * 255).astype(np.uint8)
+
+def test_kernels_match_reference():
+    """Test that the selected backend gives exactly the maps the old NumPy code did."""
+    rng = np.random.default_rng(2)
+    for shape in ((64, 64), (129, 77), (300, 511)):
+        gray_image = rng.integers(0, 256, shape, dtype=np.uint8)
+        for kernel_size in (3, 5, 7):
+            assert np.array_equal(processor._generate_normal_map(gray_image, kernel_size),
+                                  _reference_normal_map(gray_image, kernel_size))
+        assert np.array_equal(kernels.invert_image(gray_image), 255 - gray_image)
+
+    # Both backends agree on gradients that aren't contiguous or aren't float32
+    sobelx = rng.normal(0, 100, (200, 300)).astype(np.float32)
+    sobely = rng.normal(0, 100, (300, 200)).astype(np.float32).T
+    assert np.array_equal(kernels.normal_map_from_gradients(sobelx, sobely), kernels.normal_map_numpy(sobelx, sobely))
+    assert np.array_equal(kernels.normal_map_from_gradients(sobelx.astype(np.float64), sobely),
+                          kernels.normal_map_numpy(sobelx.astype(np.float64), sobely))
+
+def test_flat_image():
+    """Test that a flat image gives a flat normal map instead of dividing by zero."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        normal_map = processor._generate_normal_map(np.full((32, 32), 90, dtype=np.uint8), 5)
+    assert (normal_map == (127, 127, 255)).all()
+
+def test_backend_selection():
+    """Test that asking for NumPy gets NumPy, and anything else still gets a working backend."""
+    assert select_names("numpy") == "numpy"
+    assert select_names("no_such_backend") == kernels.backend
+    logger.info(f"Kernel backend in use: {kernels.backend}")
+
+def test_numba_matches_numpy():
+    """Test that the Numba kernels, when forced, give the same bytes as NumPy."""
+    # Numba is optional (requirements-test.txt has it), without it there's nothing to compare
+    if importlib.util.find_spec("numba") is None:
+        raise unittest.SkipTest("Numba isn't installed")
+    normal_map_function, invert_function, name = kernels.select_backend("numba")
+    assert name.startswith("numba"), name
+
+    rng = np.random.default_rng(3)
+    for shape in ((2, 3), (37, 53), (129, 77), (512, 300)):
+        sobelx = rng.normal(0, 100, shape).astype(np.float32)
+        sobely = rng.normal(0, 100, shape).astype(np.float32)
+        assert np.array_equal(normal_map_function(sobelx, sobely), kernels.normal_map_numpy(sobelx, sobely))
+        # Strided views and flat planes too
+        assert np.array_equal(normal_map_function(sobelx[::2, ::3], sobely[::2, ::3]),
+                              kernels.normal_map_numpy(sobelx[::2, ::3], sobely[::2, ::3]))
+        flat = np.zeros(shape, dtype=np.float32)
+        assert np.array_equal(normal_map_function(flat, sobely), kernels.normal_map_numpy(flat, sobely))
+
+        gray_image = rng.integers(0, 256, shape, dtype=np.uint8)
+        assert np.array_equal(invert_function(gray_image), kernels.invert_numpy(gray_image))
+        assert np.array_equal(invert_function(gray_image[:, ::2]), kernels.invert_numpy(gray_image[:, ::2]))
+
+    # And on real Sobel gradients, against the original code
+    gray_image = rng.integers(0, 256, (300, 511), dtype=np.uint8)
+    for kernel_size in (3, 5, 7):
+        sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=kernel_size)
+        sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=kernel_size)
+        assert np.array_equal(normal_map_function(sobelx, sobely), _reference_normal_map(gray_image, kernel_size))
+
+def test_numba_cache():
+    """Test that the Numba kernels are cached on disk, and a second load uses the cache and still matches."""
+    if importlib.util.find_spec("numba") is None:
+        raise unittest.SkipTest("Numba isn't installed")
+    previous = config.config.get("kernel_cache_directory")
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config.config["kernel_cache_directory"] = temp_dir
+            kernels.select_backend("numba")
+            cached = {}
+            for folder, _, names in os.walk(temp_dir):
+                for name in names:
+                    path = os.path.join(folder, name)
+                    cached[path] = os.stat(path).st_mtime_ns
+            assert any(path.endswith(".nbc") for path in cached), cached
+
+            # A load from the cache writes nothing, a compile would write the files again
+            normal_map_function, invert_function, name = kernels.select_backend("numba")
+            assert name.startswith("numba"), name
+            for path, modified in cached.items():
+                assert os.stat(path).st_mtime_ns == modified, path
+            rng = np.random.default_rng(4)
+            sobelx = rng.normal(0, 100, (64, 48)).astype(np.float32)
+            sobely = rng.normal(0, 100, (64, 48)).astype(np.float32)
+            assert np.array_equal(normal_map_function(sobelx, sobely), kernels.normal_map_numpy(sobelx, sobely))
+            gray_image = rng.integers(0, 256, (64, 48), dtype=np.uint8)
+            assert np.array_equal(invert_function(gray_image), kernels.invert_numpy(gray_image))
+    finally:
+        if previous is None:
+            config.config.pop("kernel_cache_directory", None)
+        else:
+            config.config["kernel_cache_directory"] = previous
+
+def select_names(requested):
+    """Get the name of the backend select_backend picks for a request."""
+    return kernels.select_backend(requested)[2]
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_kernels_match_reference, test_flat_image, test_backend_selection, test_numba_matches_numpy,
+                 test_numba_cache):
+        try:
+            test()
+        except unittest.SkipTest as e:
+            logger.info(f"{test.__name__} skipped: {e}")
+            continue
+        logger.info(f"{test.__name__} succeeded")
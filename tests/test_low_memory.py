@@ -0,0 +1,138 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import tracemalloc
+import numpy as np
+import cv2
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.scheduler import MemoryBudgetScheduler, estimate_peak_memory
+from src.instrumentation import get_rss_bytes
+from src.texture_processor import processor, LOW_MEMORY_BAND_ROWS
+from src.logger import logger
+
+# Most NumPy memory a low-memory run may hold at once, in multiples of the decoded RGB image
+LOW_MEMORY_PEAK_MULTIPLE = 2.5
+
+def _make_texture(path, size, channels=3):
+    """Write a smooth random texture."""
+    noise = np.random.default_rng(4).integers(0, 255, (size[1], size[0], channels), dtype=np.uint8)
+    Image.fromarray(cv2.GaussianBlur(noise, (0, 0), 2).squeeze()).save(path)
+
+def _outputs(result):
+    """Read every map a run wrote, by map name."""
+    return {name: np.array(Image.open(path)) for name, path in result["results"].items()}
+
+def test_same_outputs():
+    """Test that low-memory mode writes exactly the maps the default mode does."""
+    runs = (
+        {"enable_ao_roughness": True, "enable_curvature": True, "enable_cavity": True, "enable_height_map": True},
+        {"enable_ao_roughness": True, "kernel_sweep": [3, 7]},
+        {"output_mode": "packed", "packed_layout": ["normal_x", "ao_roughness", "bump_map", "normal_y"]},
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for channels in (1, 3, 4):
+            path = os.path.join(temp_dir, f"texture_{channels}.png")
+            _make_texture(path, (300, LOW_MEMORY_BAND_ROWS * 2 + 37), channels)
+            for index, overrides in enumerate(runs):
+                results = []
+                for low_memory in (False, True):
+                    settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True,
+                                                      low_memory=low_memory, **overrides)
+                    result = processor.process_image(path, os.path.join(temp_dir, f"{index}_{low_memory}"), settings)
+                    assert result["success"], result.get("error")
+                    results.append(_outputs(result))
+                assert results[0].keys() == results[1].keys()
+                for name in results[0]:
+                    assert np.array_equal(results[0][name], results[1][name]), (channels, name)
+
+def test_banded_normal_map():
+    """Test that the banded normal map matches the whole-image one for every kernel reach."""
+    rng = np.random.default_rng(6)
+    for rows in (5, LOW_MEMORY_BAND_ROWS, LOW_MEMORY_BAND_ROWS + 1, LOW_MEMORY_BAND_ROWS * 3 - 2):
+        gray_image = cv2.GaussianBlur(rng.integers(0, 256, (rows, 71), dtype=np.uint8), (0, 0), 1.5)
+        for kernel_size in (3, 5, 9, 31):
+            assert np.array_equal(processor._generate_normal_map_in_bands(gray_image, kernel_size),
+                                  processor._generate_normal_map(gray_image, kernel_size))
+    flat = np.full((LOW_MEMORY_BAND_ROWS + 10, 20), 77, dtype=np.uint8)
+    assert np.array_equal(processor._generate_normal_map_in_bands(flat, 5), processor._generate_normal_map(flat, 5))
+
+def test_peak_memory():
+    """Test that a low-memory run holds under LOW_MEMORY_PEAK_MULTIPLE times the decoded image at its peak."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "texture.png")
+        _make_texture(path, (1024, 1024))
+        decoded_bytes = 1024 * 1024 * 3
+
+        peaks = {}
+        for low_memory in (False, True):
+            settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True,
+                                              output_mode="separate", low_memory=low_memory)
+            tracemalloc.start()
+            try:
+                result = processor.process_image(path, os.path.join(temp_dir, str(low_memory)), settings)
+                peaks[low_memory] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            assert result["success"]
+
+        logger.info(f"Peak traced memory: {peaks[False] / decoded_bytes:.2f}x the decoded image by default, "
+                    f"{peaks[True] / decoded_bytes:.2f}x in low-memory mode")
+        assert peaks[True] <= LOW_MEMORY_PEAK_MULTIPLE * decoded_bytes
+        assert peaks[True] * 2 <= peaks[False]
+
+def test_budget_enforced_on_rss():
+    """Test that low-memory estimates are smaller and the scheduler holds jobs back on real resident memory."""
+    maps = ["normal_map", "bump_map", "ao_roughness"]
+    assert estimate_peak_memory(4096, 4096, "RGB", maps, True) * 2 < estimate_peak_memory(4096, 4096, "RGB", maps, False)
+
+    rss = get_rss_bytes()
+    if rss is None:
+        logger.info("Resident memory can't be read here, skipping the budget check")
+        return
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index in range(4):
+            path = os.path.join(temp_dir, f"image_{index}.png")
+            Image.new("L", (16, 16)).save(path)
+            paths.append(path)
+
+        # Room for every estimate, but not next to what this process already has resident
+        budget_mb = rss / (1024 * 1024) / 2
+        concurrency = {}
+        for low_memory in (False, True):
+            active = []
+            most = [0]
+            lock = threading.Lock()
+
+            def job(path):
+                with lock:
+                    active.append(path)
+                    most[0] = max(most[0], len(active))
+                time.sleep(0.05)
+                with lock:
+                    active.remove(path)
+                return {"success": True, "input_path": path}
+
+            MemoryBudgetScheduler(budget_mb, max_workers=4, low_memory=low_memory).run(paths, job, maps)
+            concurrency[low_memory] = most[0]
+        assert concurrency[False] > 1
+        assert concurrency[True] == 1
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_same_outputs, test_banded_normal_map, test_peak_memory, test_budget_enforced_on_rss):
+        test()
+        logger.info(f"{test.__name__} succeeded")
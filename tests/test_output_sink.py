@@ -0,0 +1,134 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import io
+import os
+import sys
+import tarfile
+import zipfile
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.output_sink import ArchiveSink, DirectorySink, TEMP_SUFFIX, load_archive_index, read_archive_member, temp_path_for
+from src.texture_processor import processor
+from src.logger import logger
+
+def _check_archive(archive_format, shard_size_mb):
+    """Process a few images into an archive and read every member back."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sink = ArchiveSink(temp_dir, archive_format, shard_size_mb, archive_name="batch")
+        expected = []
+        for index in range(5):
+            pixels = np.random.default_rng(index).integers(0, 255, (96, 96), dtype=np.uint8)
+            input_path = os.path.join(temp_dir, f"input_{index}.png")
+            Image.fromarray(pixels).save(input_path)
+            result = processor.process_image(input_path, temp_dir, sink=sink)
+            assert result["success"]
+            expected.extend(result["results"].values())
+
+        index_path = sink.close()
+        index = load_archive_index(index_path)
+
+        # Every map plus the original copies is in the index and decodes from a direct seek
+        assert len(index["members"]) == len(expected) + 5
+        for member in expected:
+            data = read_archive_member(index_path, member, index)
+            Image.open(io.BytesIO(data)).verify()
+
+        # The archives are also readable by the standard tools
+        for shard in index["shards"]:
+            shard_path = os.path.join(temp_dir, shard)
+            if archive_format == "tar":
+                with tarfile.open(shard_path) as archive:
+                    assert archive.getnames()
+            else:
+                with zipfile.ZipFile(shard_path) as archive:
+                    assert archive.testzip() is None
+        return index
+
+def test_tar_archive():
+    """Test streaming maps into a single tar archive."""
+    index = _check_archive("tar", 0)
+    assert len(index["shards"]) == 1
+
+def test_sharded_zip_archive():
+    """Test streaming maps into several small zip shards."""
+    index = _check_archive("zip", 0.02)
+    assert len(index["shards"]) > 1
+
+def test_atomic_directory_writes():
+    """Test that outputs only get their real names once their batch is flushed."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sink = DirectorySink(temp_dir, fsync_batch_size=3, fsync_interval=3600)
+        image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (32, 32), dtype=np.uint8))
+        durable = []
+
+        first = sink.save_image(os.path.join("texture", "texture_a.png"), image)
+        second = sink.save_image(os.path.join("texture", "texture_b.png"), image)
+        sink.on_durable(lambda: durable.append(True))
+
+        # Written, but nothing under a final name yet and the input must not be touched
+        folder = os.path.join(temp_dir, "texture")
+        assert not os.path.exists(first) and not os.path.exists(second)
+        assert len([name for name in os.listdir(folder) if name.endswith(TEMP_SUFFIX)]) == 2
+        assert not durable
+
+        # A failed write leaves nothing behind
+        try:
+            sink.save_image(os.path.join("texture", "texture_c.png"), "not an image")
+            assert False, "saving a string should fail"
+        except AttributeError:
+            pass
+        assert len(os.listdir(folder)) == 2
+
+        # The third output fills the batch, which commits everything
+        third = sink.save_image(os.path.join("texture", "texture_c.png"), image)
+        assert durable == [True]
+        assert sorted(os.listdir(folder)) == ["texture_a.png", "texture_b.png", "texture_c.png"]
+        assert np.array_equal(np.array(Image.open(third)), np.array(image))
+        sink.close()
+
+def test_stale_temp_files():
+    """Test that opening a folder removes old temp files of ours, once, and leaves everything else."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = os.path.join(temp_dir, "texture")
+        os.makedirs(folder)
+        old = time.time() - 3600
+
+        def touch(path, mtime=None):
+            with open(path, 'wb') as f:
+                f.write(b"half a png")
+            if mtime is not None:
+                os.utime(path, (mtime, mtime))
+            return path
+
+        stale = touch(temp_path_for(os.path.join(folder, "texture_normal_map.png")), old)
+        fresh = touch(temp_path_for(os.path.join(folder, "texture_bump_map.png")))
+        others = [touch(os.path.join(folder, "notes.tmp"), old),
+                  touch(os.path.join(folder, "texture_ao.png.ABCDEF123456.tmp"), old),
+                  touch(os.path.join(folder, "texture_original.png"), old)]
+
+        DirectorySink(temp_dir).close()
+        assert not os.path.exists(stale)
+        # Possibly another process's batch in progress, and files that aren't ours
+        assert os.path.exists(fresh) and all(os.path.exists(path) for path in others)
+
+        # Swept once per process, not on every sink
+        again = touch(temp_path_for(os.path.join(folder, "texture_cavity.png")), old)
+        DirectorySink(temp_dir).close()
+        assert os.path.exists(again)
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_tar_archive, test_sharded_zip_archive, test_atomic_directory_writes, test_stale_temp_files):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,94 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the corpus generator from the tests directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from create_test_corpus import create_corpus, generate_texture
+from src.scheduler import read_png_header
+from src.batch_planner import plan_batch, format_plan
+from src.texture_processor import processor
+from src.logger import logger
+
+def test_png_header_matches_pil():
+    """Test that the fast PNG header reader agrees with PIL on every mode."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        images = [generate_texture(index, (40, 24), mode) for index, mode in enumerate(("L", "RGB", "RGBA", "I;16"))]
+        images += [Image.new("1", (9, 7)), Image.new("P", (5, 3)), Image.new("LA", (6, 2))]
+        for index, image in enumerate(images):
+            path = os.path.join(temp_dir, f"image_{index}.png")
+            image.save(path)
+            with Image.open(path) as reference:
+                assert read_png_header(path) == {"width": reference.size[0], "height": reference.size[1],
+                                                 "mode": reference.mode, "format": "PNG"}
+
+        # Anything that isn't a PNG is left to PIL
+        image.convert("RGB").save(os.path.join(temp_dir, "image.bmp"))
+        assert read_png_header(os.path.join(temp_dir, "image.bmp")) is None
+
+def test_dry_run_plan():
+    """Test that a dry run flags bad files, writes nothing, and estimates close to the real thing."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        output_dir = os.path.join(temp_dir, "export")
+        create_corpus(input_dir, 8, seed=3, sizes=(64, 128), modes=("L", "RGB", "RGBA"), workers=1)
+        os.remove(os.path.join(input_dir, "corpus.json"))
+        with open(os.path.join(input_dir, "broken.png"), 'wb') as f:
+            f.write(b"not a png at all")
+        # Subfolders aren't walked into, the plan says so
+        os.makedirs(os.path.join(input_dir, "nested"))
+        Image.new("L", (16, 16)).save(os.path.join(input_dir, "nested", "inside.png"))
+
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True)
+        plan = processor.process_directory(input_dir, output_dir, settings=settings, dry_run=True)
+
+        assert plan["success"] and plan["file_count"] == 9 and not os.path.exists(output_dir)
+        assert [os.path.basename(entry["input_path"]) for entry in plan["unreadable"]] == ["broken.png"]
+        assert plan["total_pixels"] == sum(entry.get("pixels", 0) for entry in plan["files"])
+        assert plan["estimated_seconds"] > 0 and plan["fits_on_disk"]
+        assert plan["skipped_folders"] == ["nested"]
+        assert "1 subfolders not included: nested" in format_plan(plan)
+
+        # A budget smaller than the largest image flags it
+        readable = [entry["input_path"] for entry in plan["files"] if "error" not in entry]
+        tight = plan_batch(readable, settings, output_dir, memory_budget_mb=1)
+        assert len(tight["oversized"]) == 8 and all(entry["flags"] == ["exceeds_budget"] for entry in tight["oversized"])
+
+        # The output estimate lands in the right ballpark of what actually gets written
+        processor.process_directory(input_dir, output_dir, settings=settings)
+        written = sum(os.path.getsize(os.path.join(folder, name))
+                      for folder, _, names in os.walk(output_dir) for name in names)
+        assert 0.5 * written < plan["output_bytes"] < 2 * written
+
+def test_plan_is_fast():
+    """Test that planning thousands of files takes a moment, not minutes."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "texture.png")
+        generate_texture(0, (64, 64), "RGB").save(source)
+        paths = []
+        for index in range(5000):
+            paths.append(os.path.join(temp_dir, f"texture_{index}.png"))
+            shutil.copyfile(source, paths[-1])
+
+        started = time.perf_counter()
+        plan = plan_batch(paths, output_dir=temp_dir)
+        assert plan["file_count"] == 5000 and plan["total_pixels"] == 5000 * 64 * 64
+        assert time.perf_counter() - started < 10
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_png_header_matches_pil, test_dry_run_plan, test_plan_is_fast):
+        test()
+        logger.info(f"{test.__name__} succeeded")
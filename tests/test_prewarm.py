@@ -0,0 +1,71 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import threading
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.prewarm import Prewarmer, process_start_time
+from src.texture_processor import processor
+from src.logger import logger
+
+def test_prewarm_in_background():
+    """Test that prewarming loads and warms up off the calling thread, and work submitted after runs on the warm thread."""
+    loaded = []
+    prewarmer = Prewarmer(lambda: loaded.append(threading.current_thread().name))
+    try:
+        prewarmer.start()
+        assert prewarmer.wait_for_imports(60)
+        assert prewarmer.ready.wait(60)
+        assert prewarmer.error is None
+        assert loaded and loaded[0] != threading.current_thread().name
+
+        # Work queued for processing lands on the thread that did the warm-up
+        assert prewarmer.submit(lambda: threading.current_thread().name).result(10) == loaded[0]
+        for step in ("import cv2", "normal_map", "normal_map_bands", "curvature", "cavity", "height_map",
+                     "bump_map", "ao_roughness", "ao_roughness_fast", "pack", "encode"):
+            assert step in prewarmer.timings, step
+        assert prewarmer.milestones["imported"] <= prewarmer.milestones["ready"]
+        assert "ready after" in prewarmer.summary()
+    finally:
+        prewarmer.shutdown(wait=True)
+
+def test_load_failure():
+    """Test that a failed load is reported instead of leaving the caller waiting."""
+    def load():
+        raise ImportError("no OpenCV here")
+    prewarmer = Prewarmer(load, warm_up=False)
+    try:
+        prewarmer.start()
+        assert prewarmer.ready.wait(60)
+        assert not prewarmer.wait_for_imports(60)
+        assert isinstance(prewarmer.error, ImportError)
+    finally:
+        prewarmer.shutdown(wait=True)
+
+def test_warm_up_and_start_time():
+    """Test that warm-up runs every generator without touching disk, and the process start time is sane."""
+    before = set(os.listdir("."))
+    timings = processor.warm_up(size=16)
+    assert set(os.listdir(".")) == before
+    assert all(seconds >= 0 for seconds in timings.values())
+
+    started = process_start_time()
+    if started is None:
+        logger.info("Process start time can't be read here, skipping its check")
+        return
+    assert time.time() - 24 * 3600 < started <= time.time()
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_prewarm_in_background, test_load_failure, test_warm_up_and_start_time):
+        test()
+        logger.info(f"{test.__name__} succeeded")
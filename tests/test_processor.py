@@ -37,6 +37,185 @@ def test_processor():
         logger.error(f"Test failed: {result.get('error', 'Unknown error')}")
         return False
 
+def test_fast_ao_error_bound():
+    """Test that the fast AO filter stays within its documented error bound."""
+    import numpy as np
+    import cv2
+    
+    # A smooth noisy texture plus a few hard edges
+    rng = np.random.default_rng(0)
+    texture = cv2.GaussianBlur(rng.normal(128, 40, (512, 512)).astype(np.float32), (0, 0), 3)
+    texture = np.clip((texture - texture.mean()) * 4 + 128, 0, 255).astype(np.uint8)
+    texture[100:300, 100:300] = 220
+    inverted = 255 - texture
+    
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    exact = clahe.apply(cv2.bilateralFilter(inverted, 9, 75, 75)).astype(np.int16)
+    fast = clahe.apply(processor._fast_bilateral_filter(inverted)).astype(np.int16)
+    
+    error = np.abs(fast - exact)
+    assert fast.shape == exact.shape
+    assert error.mean() < 4
+    assert np.percentile(error, 99) <= 8
+
+def test_settings_bound_per_job():
+    """Test that concurrent jobs with different settings don't step on each other."""
+    import tempfile
+    import threading
+    import numpy as np
+    from PIL import Image
+    from src.processing_context import get_context
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sizes = [3, 5, 7, 9]
+        expected = {}
+        for size in sizes:
+            settings = processor.get_settings(kernel_size=size, enable_bump_map=False, enable_ao_roughness=True)
+            result = processor.process_image("./import/test_texture.png", os.path.join(temp_dir, f"serial_{size}"), settings)
+            expected[size] = np.array(Image.open(result["results"]["normal_map"]))
+            
+        contexts = []
+        matches = []
+        
+        def job(size):
+            settings = processor.get_settings(kernel_size=size, enable_bump_map=False, enable_ao_roughness=True)
+            result = processor.process_image("./import/test_texture.png", os.path.join(temp_dir, f"thread_{size}"), settings)
+            matches.append(np.array_equal(np.array(Image.open(result["results"]["normal_map"])), expected[size]))
+            contexts.append(get_context())
+            
+        threads = [threading.Thread(target=job, args=(size,)) for size in sizes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+            
+        assert matches == [True] * len(sizes)
+        
+        # Every thread got its own context
+        assert len(set(map(id, contexts))) == len(sizes)
+
+def test_packed_output():
+    """Test that packed mode writes one image with the configured channel layout."""
+    import tempfile
+    import numpy as np
+    from PIL import Image
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        separate = processor.process_image(
+            "./import/test_texture.png", os.path.join(temp_dir, "separate"),
+            processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True)
+        )
+        packed = processor.process_image(
+            "./import/test_texture.png", os.path.join(temp_dir, "packed"),
+            processor.get_settings(enable_normal_map=False, output_mode="packed",
+                                   packed_layout=("ao_roughness", "bump_map", "normal_x", "white"))
+        )
+        
+        assert packed["success"]
+        assert set(packed["results"]) == {"packed"}
+        
+        channels = np.array(Image.open(packed["results"]["packed"]))
+        assert channels.shape[2] == 4
+        assert np.array_equal(channels[:, :, 0], np.array(Image.open(separate["results"]["ao_roughness"])))
+        assert np.array_equal(channels[:, :, 1], np.array(Image.open(separate["results"]["bump_map"])))
+        assert np.array_equal(channels[:, :, 2], np.array(Image.open(separate["results"]["normal_map"]))[:, :, 0])
+        assert (channels[:, :, 3] == 255).all()
+
+def test_kernel_sweep():
+    """Test that a kernel sweep decodes once and writes a normal map per kernel size."""
+    import tempfile
+    import numpy as np
+    from PIL import Image
+    from src.config import config
+    from src.instrumentation import monitor
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        kernel_size = config.get("sobel_kernel_size", 5)
+        before = monitor.snapshot()
+        swept = processor.process_image(
+            "./import/test_texture.png", os.path.join(temp_dir, "sweep"),
+            processor.get_settings(enable_bump_map=False, enable_ao_roughness=False, kernel_sweep=[3, 5, 7, 9, 5, 4])
+        )
+        after = monitor.snapshot()
+        
+        assert swept["success"]
+        assert set(swept["results"]) == {"normal_map_k3", "normal_map_k5", "normal_map_k7", "normal_map_k9"}
+        assert sum(after["stage_histograms"]["decode"]) - sum(before["stage_histograms"]["decode"]) == 1
+        assert sum(after["stage_histograms"]["normal_map"]) - sum(before["stage_histograms"]["normal_map"]) == 4
+        
+        # Every variant matches a normal single-kernel run, and config.json wasn't touched
+        for size in (3, 5, 7, 9):
+            single = processor.process_image(
+                "./import/test_texture.png", os.path.join(temp_dir, f"single_{size}"),
+                processor.get_settings(kernel_size=size, enable_bump_map=False, enable_ao_roughness=False)
+            )
+            assert os.path.basename(swept["results"][f"normal_map_k{size}"]) == f"test_texture_normal_map_k{size}.png"
+            assert np.array_equal(np.array(Image.open(swept["results"][f"normal_map_k{size}"])),
+                                  np.array(Image.open(single["results"]["normal_map"])))
+        assert config.get("sobel_kernel_size", 5) == kernel_size
+
+def test_curvature_and_cavity():
+    """Test that curvature and cavity come out of the normal map's gradients and point the right way."""
+    import tempfile
+    import numpy as np
+    from PIL import Image
+    
+    # A bump on the left, a dent on the right, flat everywhere else
+    y, x = np.mgrid[0:128, 0:256].astype(np.float64)
+    bump = lambda centre: 100 * np.exp(-((x - centre) ** 2 + (y - 64) ** 2) / (2 * 12 ** 2))
+    height = np.rint(128 + bump(64) - bump(192)).astype(np.uint8)
+    
+    calls = []
+    compute_gradients = processor._compute_gradients
+    processor._compute_gradients = lambda *args: calls.append(args[1:]) or compute_gradients(*args)
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, "height.png")
+            Image.fromarray(height).save(input_path)
+            settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False,
+                                              enable_curvature=True, enable_cavity=True)
+            result = processor.process_image(input_path, os.path.join(temp_dir, "export"), settings)
+            
+            assert result["success"]
+            assert set(result["results"]) == {"normal_map", "curvature", "cavity"}
+            curvature = np.array(Image.open(result["results"]["curvature"]))
+            cavity = np.array(Image.open(result["results"]["cavity"]))
+    finally:
+        del processor._compute_gradients
+        
+    # One Sobel pass for the normal map, curvature and cavity together
+    assert calls == [(settings.kernel_size,)]
+    assert curvature[64, 64] > 200 and curvature[64, 192] < 50 and curvature[5, 5] == 127
+    assert cavity[64, 64] == 255 and cavity[64, 192] < 50 and cavity[5, 5] == 255
+    assert "curvature" in settings.enabled_maps() and "cavity" in settings.enabled_maps()
+
+def test_16_bit_grayscale():
+    """Test that 16-bit grayscale images are processed as their 8-bit equivalent."""
+    import tempfile
+    import numpy as np
+    from PIL import Image
+    
+    rng = np.random.default_rng(7)
+    gray_image = rng.integers(0, 256, (96, 128), dtype=np.uint8)
+    settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = {}
+        for name, image in (("gray8", Image.fromarray(gray_image)),
+                            ("gray16", Image.fromarray(gray_image.astype(np.uint16) * 257))):
+            paths[name] = os.path.join(temp_dir, f"{name}.png")
+            image.save(paths[name])
+        assert Image.open(paths["gray16"]).mode == "I;16"
+        
+        expected = processor.process_image(paths["gray8"], os.path.join(temp_dir, "export"), settings)["results"]
+        for low_memory in (False, True):
+            result = processor.process_image(paths["gray16"], os.path.join(temp_dir, f"export_{low_memory}"),
+                                             processor.get_settings(low_memory=low_memory, enable_normal_map=True,
+                                                                    enable_bump_map=True, enable_ao_roughness=True))
+            assert result["success"], result.get("error")
+            assert set(result["results"]) == set(expected) == {"normal_map", "bump_map", "ao_roughness"}
+            for map_name, path in result["results"].items():
+                assert np.array_equal(np.array(Image.open(path)), np.array(Image.open(expected[map_name])))
+
 if __name__ == "__main__":
     # Run the test
     success = test_processor()
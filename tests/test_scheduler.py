@@ -0,0 +1,89 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.scheduler import MemoryBudgetScheduler, estimate_peak_memory, read_image_header
+from src.logger import logger
+
+def test_estimate_grows_with_maps():
+    """Test that enabling more maps never lowers the memory estimate."""
+    bump_only = estimate_peak_memory(1024, 1024, "RGBA", ["bump_map"])
+    everything = estimate_peak_memory(1024, 1024, "RGBA", ["normal_map", "bump_map", "ao_roughness"])
+    assert everything > bump_only
+    assert estimate_peak_memory(2048, 2048, "RGBA", ["bump_map"]) > bump_only
+
+def test_header_only():
+    """Test that headers are read without decoding the image."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "header.png")
+        Image.new("RGBA", (64, 32)).save(path)
+        header = read_image_header(path)
+        assert (header["width"], header["height"], header["mode"]) == (64, 32, "RGBA")
+
+def test_budget_respected():
+    """Test that the scheduler never runs more than the budget allows."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index, size in enumerate([512, 64, 64, 256, 64, 64, 512, 64]):
+            path = os.path.join(temp_dir, f"image_{index}.png")
+            Image.new("L", (size, size)).save(path)
+            paths.append(path)
+
+        maps = ["normal_map", "bump_map"]
+        big = estimate_peak_memory(512, 512, "L", maps)
+        budget_mb = (big * 1.5) / (1024 * 1024)
+        scheduler = MemoryBudgetScheduler(memory_budget_mb=budget_mb, max_workers=4)
+
+        active = []
+        lock = threading.Lock()
+        overbudget = []
+
+        def job(path):
+            with lock:
+                active.append(path)
+                if scheduler.memory_in_use > scheduler.memory_budget and len(active) > 1:
+                    overbudget.append(path)
+            time.sleep(0.01)
+            with lock:
+                active.remove(path)
+            return {"success": True, "input_path": path}
+
+        results = scheduler.run(paths, job, enabled_maps=maps)
+
+        assert len(results) == len(paths)
+        assert not overbudget
+        assert scheduler.peak_memory_in_use <= scheduler.memory_budget
+
+def test_results_not_kept():
+    """Test that a batch can report through the callback alone without the scheduler keeping results."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index in range(5):
+            path = os.path.join(temp_dir, f"image_{index}.png")
+            Image.new("L", (32, 32)).save(path)
+            paths.append(path)
+
+        done = []
+        scheduler = MemoryBudgetScheduler(max_workers=2)
+        job = lambda path: {"success": True, "input_path": path}
+        assert scheduler.run(paths, job, callback=done.append, keep_results=False) is None
+        assert sorted(result["input_path"] for result in done) == paths
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_estimate_grows_with_maps, test_header_only, test_budget_respected, test_results_not_kept):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,129 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.config import config
+from src.instrumentation import monitor
+from src.shm_pipeline import SharedMemoryPipeline, job_output_bytes
+from src.scheduler import MemoryBudgetScheduler, read_image_header
+from src.texture_processor import processor
+from src.logger import logger
+
+def _make_inputs(input_dir):
+    """Write a few random textures, one of them a palette image that can't go through a slot."""
+    os.makedirs(input_dir)
+    rng = np.random.default_rng(5)
+    for index, shape in enumerate([(64, 96, 3), (48, 48), (80, 40, 4)]):
+        Image.fromarray(rng.integers(0, 255, shape, dtype=np.uint8)).save(os.path.join(input_dir, f"texture_{index}.png"))
+    Image.fromarray(rng.integers(0, 255, (32, 32, 3), dtype=np.uint8)).quantize(16).save(os.path.join(input_dir, "palette.png"))
+
+def _read_outputs(output_dir):
+    """Read every output file under a directory, by relative path."""
+    outputs = {}
+    for folder, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as f:
+                outputs[os.path.relpath(path, output_dir)] = f.read()
+    return outputs
+
+def test_process_engine_matches_threads():
+    """Test that the process engine writes the same files as threads, through shared memory."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        _make_inputs(input_dir)
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=True)
+
+        threaded = processor.process_directory(input_dir, os.path.join(temp_dir, "threads"), max_workers=2, settings=settings)
+        engine = config.config.get("batch_engine")
+        config.config["batch_engine"] = "processes"
+        try:
+            before = monitor.snapshot()
+            processed = processor.process_directory(input_dir, os.path.join(temp_dir, "processes"), max_workers=2, settings=settings)
+            after = monitor.snapshot()
+        finally:
+            config.config["batch_engine"] = engine
+
+        assert len(processed["results"]["success"]) == 4 and not processed["results"]["failed"]
+        assert _read_outputs(os.path.join(temp_dir, "threads")) == _read_outputs(os.path.join(temp_dir, "processes"))
+        assert "ipc" not in threaded
+
+        # Only the palette image was pickled, the maps all went through the slots
+        ipc = processed["ipc"]
+        assert ipc["jobs"] == 4 and ipc["writes"] == 16
+        assert ipc["shared_bytes"] > 10 * ipc["ipc_bytes"]
+
+        # The workers' stages and the writer's bytes reached this process's monitor
+        outputs = _read_outputs(os.path.join(temp_dir, "processes"))
+        assert after["bytes_written"] - before["bytes_written"] == sum(len(data) for data in outputs.values())
+        for stage, writes in (("decode", 4), ("normal_map", 4), ("save", 16), ("write", 16)):
+            assert sum(after["stage_histograms"][stage]) - sum(before["stage_histograms"].get(stage, [0])) == writes, stage
+            assert after["stage_seconds"][stage] > before["stage_seconds"].get(stage, 0.0)
+
+def test_slot_backpressure():
+    """Test that a single slot is recycled for every image, and undersized slots fall back to pickling."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        _make_inputs(input_dir)
+        paths = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir))
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False)
+
+        for slot_bytes, shared in ((1024 * 1024, True), (256, True)):
+            output_dir = os.path.join(temp_dir, f"export_{slot_bytes}")
+            with SharedMemoryPipeline(output_dir, settings, 2, slot_bytes, slot_count=1, shared=shared) as pipeline:
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    results = list(executor.map(pipeline.process, paths))
+            assert all(result["success"] for result in results)
+            assert pipeline.stats["writes"] == 8 and len(_read_outputs(output_dir)) == 8
+            if slot_bytes == 256:
+                assert pipeline.stats["shared_bytes"] == 0
+
+def test_slots_within_budget():
+    """Test that the slot ring stays within its share of the budget and bigger images are pickled instead."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        _make_inputs(input_dir)
+        paths = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir))
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=False, enable_ao_roughness=False)
+        sizes = {path: job_output_bytes(read_image_header(path), settings) for path in paths}
+
+        # Four slots (two workers plus two) from a quarter of the budget, only the biggest image doesn't fit
+        slot_bytes = sorted(sizes.values())[-2]
+        fraction = config.config.get("shm_budget_fraction")
+        config.config["shm_budget_fraction"] = 0.25
+        try:
+            scheduler = MemoryBudgetScheduler(max_workers=2)
+            scheduler.memory_budget = slot_bytes * 16
+            output_dir = os.path.join(temp_dir, "export")
+            with SharedMemoryPipeline.for_batch(paths, output_dir, settings, 2,
+                                                memory_budget=scheduler.memory_budget) as pipeline:
+                assert pipeline.oversized == {max(sizes, key=sizes.get)}
+                assert slot_bytes * 4 <= pipeline.ring_bytes <= scheduler.memory_budget // 4 + 4 * 4096
+                scheduler.reserve(pipeline.ring_bytes)
+                assert scheduler.memory_budget == slot_bytes * 16 - pipeline.ring_bytes
+                results = scheduler.run(paths, pipeline.process, settings.enabled_maps())
+        finally:
+            config.config["shm_budget_fraction"] = fraction
+
+        assert all(result["success"] for result in results)
+        assert pipeline.stats["unshared_jobs"] == 1 and pipeline.stats["writes"] == 8
+        assert len(_read_outputs(output_dir)) == 8
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_process_engine_matches_threads, test_slot_backpressure, test_slots_within_budget):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,99 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.throughput import ThroughputModel, format_duration
+from src.job_queue import JobQueue
+from src.logger import logger
+
+def test_model_learns_overhead_and_rate():
+    """Test that the model recovers a known overhead and per-pixel cost."""
+    model = ThroughputModel()
+    # 0.05s per image plus 0.2s per megapixel
+    for megapixels in (0.25, 1, 4, 16, 1, 0.25, 4):
+        model.record("maps", megapixels * 1e6, 0.05 + 0.2 * megapixels)
+
+    assert abs(model.estimate_seconds("maps", 64e6) - (0.05 + 0.2 * 64)) < 1e-6
+    assert abs(model.estimate_seconds("maps", 8e6, count=4) - (0.2 + 0.2 * 8)) < 1e-6
+
+    # Unknown settings borrow from the known ones, and the state survives a round trip
+    restored = ThroughputModel(model.to_dict())
+    assert abs(restored.estimate_seconds("other", 1e6) - model.estimate_seconds("maps", 1e6)) < 1e-6
+    assert format_duration(3725) == "1h 02m" and format_duration(65) == "1m 05s"
+
+def test_queue_order_and_pinning():
+    """Test that the queue hands out pinned files first, then by the chosen order."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for name, size in (("medium", 64), ("large", 128), ("small", 16)):
+            path = os.path.join(temp_dir, f"{name}.png")
+            Image.fromarray(np.zeros((size, size), dtype=np.uint8)).save(path)
+            paths.append(path)
+
+        queue = JobQueue("smallest_first")
+        assert queue.add(paths) == 3
+        assert queue.remaining_pixels() == 64 * 64 + 128 * 128 + 16 * 16
+        assert [os.path.basename(entry["source"]) for entry in queue.snapshot()] == ["small.png", "medium.png", "large.png"]
+
+        queue.pin([paths[1]])
+        assert os.path.basename(queue.pop_next()["source"]) == "large.png"
+        queue.set_order("largest_first")
+        assert os.path.basename(queue.pop_next()["source"]) == "medium.png"
+        assert os.path.basename(queue.pop_next()["source"]) == "small.png"
+        assert queue.pop_next() is None and not queue
+
+def test_queue_scales_and_requeues():
+    """Test that a big queue drains fast, pins follow the path and a put-back entry goes first."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for index, size in enumerate((48, 16, 32, 64, 8)):
+            path = os.path.join(temp_dir, f"texture_{index}.png")
+            Image.fromarray(np.zeros((size, size), dtype=np.uint8)).save(path)
+            paths.append(path)
+
+        queue = JobQueue("smallest_first")
+        queue.add(paths * 4000)
+        started = time.perf_counter()
+        sizes = []
+        while queue:
+            sizes.append(queue.pop_next()["pixels"])
+        assert time.perf_counter() - started < 2.0
+        assert len(sizes) == 20000 and sizes == sorted(sizes) and queue.remaining_pixels() == 0
+
+        # A pin is about the file, not about which string object names it
+        queue.add(paths)
+        queue.pin([os.path.join(temp_dir, ".", "texture_3.png")])
+        assert queue.is_pinned(paths[3]) and queue.head(1)[0]["source"] == paths[3]
+        entry = queue.pop_next()
+        assert entry["source"] == paths[3] and not queue.is_pinned(paths[3])
+
+        # Cancelled halfway, it comes back to the front whatever the order says
+        queue.push_front(dict(entry))
+        assert queue.snapshot()[0]["source"] == paths[3]
+        assert queue.pop_next()["source"] == paths[3]
+        assert [entry["pixels"] for entry in queue.head(10)] == [64, 256, 1024, 2304]
+
+        # Headers read off the GUI thread are queued later without reading again
+        entries = JobQueue.read_entries(paths[:2])
+        assert len(queue) == 4 and [entry["pixels"] for entry in entries] == [2304, 256]
+        assert queue.add_entries(entries) == 2 and len(queue) == 6
+        assert queue.head(1)[0]["pixels"] == 64 and queue.remaining_pixels() == 64 + 256 * 2 + 1024 + 2304 * 2
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_model_learns_overhead_and_rate, test_queue_order_and_pinning, test_queue_scales_and_requeues):
+        test()
+        logger.info(f"{test.__name__} succeeded")
@@ -0,0 +1,77 @@
+# ---
+# KazLabs Media Group
+# Made with ♥ by Liam Sorensen - AI Assisted by Cursor.AI.
+# Version 0.1.4 - 2025-03-03
+# ---
+
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import from src directory
+from src.tracer import tracer
+from src.texture_processor import processor
+from src.logger import logger
+
+def test_trace_timeline():
+    """Test that a traced batch writes well-formed, sampled Chrome trace spans."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "import")
+        os.makedirs(input_dir)
+        for index in range(6):
+            pixels = np.random.default_rng(index).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(os.path.join(input_dir, f"texture_{index}.png"))
+
+        # Only the first two images are traced, none of the rest
+        assert tracer.start(sample_rate=0.0, full_jobs=2, max_events=10000)
+        assert not tracer.start()
+        settings = processor.get_settings(enable_normal_map=True, enable_bump_map=True, enable_ao_roughness=False)
+        result = processor.process_directory(input_dir, os.path.join(temp_dir, "export"), max_workers=2, settings=settings)
+        trace_path = tracer.stop(os.path.join(temp_dir, "trace.json"))
+
+        assert result["success"] and len(result["results"]["success"]) == 6
+        with open(trace_path, 'r') as f:
+            events = json.load(f)["traceEvents"]
+
+        jobs = [event for event in events if event["name"] == "process_image"]
+        waits = [event for event in events if event["name"] == "queue_wait"]
+        assert len(jobs) == 2 and len(waits) == 2
+
+        # Every stage span sits inside a traced image on the same worker lane
+        stages = [event for event in events if event.get("cat") == "stage"]
+        assert {event["name"] for event in stages} >= {"decode", "normal_map", "bump_map", "save"}
+        for stage in stages:
+            assert any(job["tid"] == stage["tid"] and job["ts"] <= stage["ts"]
+                       and stage["ts"] + stage["dur"] <= job["ts"] + job["dur"] + 1 for job in jobs)
+
+        # Every lane is named
+        named = {event["tid"] for event in events if event["name"] == "thread_name"}
+        assert {event["tid"] for event in jobs} <= named
+
+def test_trace_event_cap():
+    """Test that the event cap bounds the trace."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tracer.start(sample_rate=1.0, full_jobs=0, max_events=5)
+        tracer.begin_job("image")
+        for index in range(20):
+            tracer.record("save", index, index + 0.5)
+        tracer.end_job()
+        tracer.record("ignored", 0, 1)
+        trace_path = tracer.stop(os.path.join(temp_dir, "trace.json"))
+
+        with open(trace_path, 'r') as f:
+            trace = json.load(f)
+        assert len([event for event in trace["traceEvents"] if event["ph"] == "X"]) == 5
+        assert trace["otherData"]["dropped_events"] == 15
+
+if __name__ == "__main__":
+    # Run the tests
+    for test in (test_trace_timeline, test_trace_event_cap):
+        test()
+        logger.info(f"{test.__name__} succeeded")